@@ -1,11 +1,16 @@
 from flask import Flask
 from flask_cors import CORS
 from .routes import register_routes
+from .uploads import UploadRequest
 from config import Config
+from clients import init_client_registry
+from rag.ingestion import IngestionQueue
 
 
 def create_app():
     app = Flask(__name__, instance_relative_config=True)
+    # Uploaded files are streamed straight to UPLOAD_FOLDER instead of a spooled temp file
+    app.request_class = UploadRequest
     
     # Load configuration
     app.config.from_object(Config)
@@ -13,6 +18,14 @@ def create_app():
     # Enable CORS
     CORS(app, origins=Config.CORS_ORIGINS)
     
+    # Shared Supabase/OpenAI clients with keep-alive connection pools
+    app.extensions['clients'] = init_client_registry()
+    
+    # Background worker pool for the RAG ingestion pipeline
+    ingestion_queue = IngestionQueue(max_workers=Config.INGESTION_WORKERS)
+    ingestion_queue.resume_queued_jobs()
+    app.extensions['ingestion_queue'] = ingestion_queue
+    
     # Register routes
     register_routes(app)
 
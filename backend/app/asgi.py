@@ -0,0 +1,184 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from config import Config
+from clients import AsyncClientRegistry
+from sb.async_database_service import AsyncDocumentService
+from . import create_app
+from rag.query_cache import get_query_embedding_cache
+from .routes.chat import (answer_cache_for, build_chat_messages, cached_answer_body, cached_answer_events,
+                          format_sources, load_chat_history, parse_search_request, record_turn, search_response,
+                          sse_event)
+
+
+async def chat_endpoint(request):
+    try:
+        started = time.perf_counter()
+        data = await request.json()
+        user_message = data.get('message', '')
+
+        if not user_message.strip():
+            return JSONResponse({"error": "Message cannot be empty"}, status_code=400)
+
+        # Session state lives in SQLite; stateless requests skip the thread hop
+        history = await asyncio.to_thread(load_chat_history, data) if 'session_id' in data else load_chat_history(data)
+        if history is None:
+            return JSONResponse({"error": "Chat session not found or expired"}, status_code=404)
+        session_id, chat_history, summary, summary_tokens = history
+
+        clients = request.app.state.clients
+        streaming = data.get('stream') or 'text/event-stream' in request.headers.get('accept', '')
+        answer_cache = answer_cache_for(chat_history, summary)
+        # Retrieval starts alongside the answer cache lookup (both share one query
+        # embedding) and is cancelled if the cache answers
+        retrieval = asyncio.ensure_future(AsyncDocumentService(clients).search_similar_chunks(user_message, top_k=5))
+        if answer_cache is not None:
+            try:
+                query_embedding = await get_query_embedding_cache().get_embedding_async(user_message, clients.openai)
+                cached, corpus_version = await asyncio.to_thread(answer_cache.lookup, query_embedding)
+            except BaseException:
+                retrieval.cancel()
+                raise
+            if cached is not None:
+                retrieval.cancel()
+                if session_id:
+                    await asyncio.to_thread(record_turn, session_id, user_message, cached['answer'])
+                answer_cache.observe(True, time.perf_counter() - started)
+                if streaming:
+                    return StreamingResponse(
+                        cached_answer_events(cached, session_id, started),
+                        media_type="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+                    )
+                return JSONResponse(cached_answer_body(cached, session_id))
+
+        relevant_chunks = await retrieval
+        retrieval_seconds = time.perf_counter() - started
+        messages, used_chunks, prompt = build_chat_messages(user_message, chat_history, relevant_chunks, summary, summary_tokens)
+        sources = format_sources(used_chunks)
+
+        def finish(bot_response):
+            record_turn(session_id, user_message, bot_response)
+            if answer_cache is not None:
+                answer_cache.put(query_embedding, user_message, bot_response, sources, corpus_version)
+                answer_cache.observe(False, time.perf_counter() - started)
+
+        # Session and answer cache writes touch SQLite; turns with neither skip the thread hop
+        on_complete = finish if session_id or answer_cache is not None else None
+
+        if streaming:
+            return StreamingResponse(
+                stream_chat(clients.openai, messages, sources, prompt, retrieval_seconds, started, session_id,
+                            on_complete),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+        response = await clients.openai.chat.completions.create(
+            model=Config.CHAT_MODEL,
+            messages=messages
+        )
+        bot_response = response.choices[0].message.content
+        if on_complete is not None:
+            await asyncio.to_thread(on_complete, bot_response)
+        return JSONResponse({
+            "response": bot_response,
+            "sources": sources,
+            "prompt": prompt,
+            "session_id": session_id
+        })
+
+    except Exception as e:
+        return JSONResponse({"error": f"Chat failed: {str(e)}"}, status_code=500)
+
+
+async def stream_chat(openai_client, messages, sources, prompt, retrieval_seconds, started, session_id=None,
+                      on_complete=None):
+    """Same event sequence as the WSGI streaming mode: sources, deltas, done"""
+    yield sse_event("sources", {
+        "sources": sources, "prompt": prompt, "session_id": session_id,
+        "retrieval_ms": round(retrieval_seconds * 1000, 1)
+    })
+    parts = []
+    first_token_at = None
+    usage = None
+    try:
+        stream = await openai_client.chat.completions.create(
+            model=Config.CHAT_MODEL,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage.model_dump()
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(delta)
+                yield sse_event("delta", {"content": delta})
+    except Exception as e:
+        yield sse_event("error", {"error": f"Chat failed: {str(e)}"})
+        return
+
+    if on_complete is not None:
+        await asyncio.to_thread(on_complete, "".join(parts))
+    yield sse_event("done", {
+        "response": "".join(parts),
+        "session_id": session_id,
+        "usage": usage,
+        "time_to_first_token_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+
+
+async def search_endpoint(request):
+    try:
+        try:
+            query, top_k = parse_search_request(await request.json())
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        service = AsyncDocumentService(request.app.state.clients)
+        if isinstance(query, list):
+            results = await service.search_similar_chunks_many(query, top_k=top_k)
+        else:
+            results = await service.search_similar_chunks(query, top_k=top_k)
+        return JSONResponse(search_response(query, results))
+
+    except Exception as e:
+        return JSONResponse({"error": f"Search failed: {str(e)}"}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.clients = await AsyncClientRegistry().start()
+    try:
+        yield
+    finally:
+        await app.state.clients.close()
+
+
+def create_asgi_app():
+    """
+    ASGI entry point: chat and search run natively on asyncio with async
+    OpenAI/Supabase clients; every other route is served by the Flask app
+    mounted underneath.
+    """
+    cors = [Middleware(CORSMiddleware, allow_origins=Config.CORS_ORIGINS, allow_methods=["*"], allow_headers=["*"])]
+    flask_app = create_app()
+    routes = [
+        Route("/api/chat/chat", chat_endpoint, methods=["POST", "OPTIONS"], middleware=cors),
+        Route("/api/chat/search", search_endpoint, methods=["POST", "OPTIONS"], middleware=cors),
+        Mount("/", app=WSGIMiddleware(flask_app, workers=Config.ASGI_WSGI_THREADS))
+    ]
+    return Starlette(routes=routes, lifespan=lifespan)
@@ -1,87 +1,335 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import sys
 sys.path.append('..')
 from sb.database_service import DocumentService
+from sb.chunk_writer import get_chunk_writer
 from config import Config
-from openai import OpenAI
+from clients import get_client_registry
+from rag.query_cache import get_query_embedding_cache
+from rag.retrieval_cache import get_retrieval_cache
+from rag.vector_index import get_vector_index
+from rag.lexical_index import get_lexical_index
+from rag.prompt_budget import get_prompt_budget
+from rag.session_store import get_session_store
+from rag.answer_cache import get_answer_cache
 import json
 import os
+import time
 
 chat = Blueprint("chat", __name__)
 
-# Initialize OpenAI client
+# Shared OpenAI client (pooled connections)
 def get_openai_client():
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable is required")
-    return OpenAI(api_key=api_key)
+    return get_client_registry().openai
+
+
+SYSTEM_PROMPT = """You are a helpful AI assistant with access to a knowledge base. 
+Use the following context to answer the user's question. If the context doesn't contain relevant information, 
+say so and provide a general helpful response.
+
+Context:
+{context}
+
+Please provide a helpful and accurate response based on the available information."""
+
+
+def build_chat_messages(user_message, chat_history, relevant_chunks, summary='', summary_tokens=0):
+    """Assemble the system prompt (with retrieved context), history and user turn
+    within the prompt token budget. Returns (messages, chunks used, token accounting)."""
+    return get_prompt_budget().build(SYSTEM_PROMPT, user_message, chat_history, relevant_chunks, summary, summary_tokens)
+
+
+def load_chat_history(data):
+    """History for a chat request as (session_id, messages, summary, summary_tokens).
+    A `session_id` key selects a server-side session (null starts one) and
+    `chat_history` is then ignored. None when the session is unknown or expired."""
+    if 'session_id' not in data:
+        return None, data.get('chat_history', []), '', 0
+    store = get_session_store()
+    session_id = data.get('session_id') or store.create()
+    state = store.history(session_id)
+    if state is None:
+        return None
+    session, turns = state
+    return session['id'], turns, session['summary'], session['summary_tokens']
+
+
+def record_turn(session_id, user_message, response):
+    """Append a completed exchange to its session, if any"""
+    if not session_id:
+        return
+    try:
+        get_session_store().append(session_id, [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": response}
+        ])
+    except Exception as e:
+        # The answer was produced; losing the turn must not fail the request
+        print(f"Error recording chat turn: {str(e)}")
+
+
+def answer_cache_for(chat_history, summary):
+    """The answer cache when this turn may use it: a follow-up depends on the
+    conversation before it, so only turns without history are looked up or stored"""
+    cache = get_answer_cache()
+    return cache if cache is not None and not chat_history and not summary else None
+
+
+def cached_answer_body(cached, session_id):
+    return {
+        "response": cached['answer'],
+        "sources": cached['sources'],
+        "prompt": None,
+        "session_id": session_id,
+        "cached": {"similarity": cached['similarity'], "question": cached['question']}
+    }
+
+
+def cached_answer_events(cached, session_id, started):
+    """The streaming event sequence for a cache hit: sources, one delta, done"""
+    body = cached_answer_body(cached, session_id)
+    yield sse_event("sources", {
+        "sources": body['sources'], "prompt": None, "session_id": session_id, "cached": body['cached']
+    })
+    yield sse_event("delta", {"content": body['response']})
+    yield sse_event("done", {
+        "response": body['response'],
+        "session_id": session_id,
+        "usage": None,
+        "cached": body['cached'],
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+
+
+def format_sources(relevant_chunks):
+    return [
+        {
+            "document_id": chunk.get('document_id'),
+            "document_name": chunk.get('document_name', 'Unknown'),
+            "document_type": chunk.get('document_type', ''),
+            "similarity": chunk.get('similarity', 0),
+            "source_link": chunk.get('source_link', '')
+        }
+        for chunk in relevant_chunks
+    ] if relevant_chunks else []
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def wants_stream(data):
+    return bool(data.get('stream')) or 'text/event-stream' in (request.headers.get('Accept') or '')
+
+
+def stream_chat_response(messages, sources, prompt, retrieval_seconds, started, session_id=None, on_complete=None):
+    """Server-sent events: sources first, then token deltas, then a summary.
+    `on_complete` receives the full answer before the final event."""
+    def generate():
+        yield sse_event("sources", {
+            "sources": sources, "prompt": prompt, "session_id": session_id,
+            "retrieval_ms": round(retrieval_seconds * 1000, 1)
+        })
+        parts = []
+        first_token_at = None
+        usage = None
+        try:
+            stream = get_openai_client().chat.completions.create(
+                model=Config.CHAT_MODEL,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage.model_dump()
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(delta)
+                    yield sse_event("delta", {"content": delta})
+        except Exception as e:
+            yield sse_event("error", {"error": f"Chat failed: {str(e)}"})
+            return
+
+        if on_complete is not None:
+            on_complete("".join(parts))
+        yield sse_event("done", {
+            "response": "".join(parts),
+            "session_id": session_id,
+            "usage": usage,
+            "time_to_first_token_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # keep proxies from buffering the stream
+    })
+
 
 @chat.route("/chat", methods=["POST"])
 def chat_endpoint():
     try:
+        started = time.perf_counter()
         data = request.get_json()
         user_message = data.get('message', '')
-        chat_history = data.get('chat_history', [])
-        
+
         if not user_message.strip():
             return jsonify({"error": "Message cannot be empty"}), 400
-        
+
+        history = load_chat_history(data)
+        if history is None:
+            return jsonify({"error": "Chat session not found or expired"}), 404
+        session_id, chat_history, summary, summary_tokens = history
+
+        # Paraphrases of a question already answered are served from the answer cache
+        answer_cache = answer_cache_for(chat_history, summary)
+        if answer_cache is not None:
+            query_embedding = get_query_embedding_cache().get_embedding(user_message)
+            cached, corpus_version = answer_cache.lookup(query_embedding)
+            if cached is not None:
+                record_turn(session_id, user_message, cached['answer'])
+                answer_cache.observe(True, time.perf_counter() - started)
+                if wants_stream(data):
+                    return Response(cached_answer_events(cached, session_id, started), mimetype="text/event-stream",
+                                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+                return jsonify(cached_answer_body(cached, session_id)), 200
+
         # Get relevant document chunks using vector similarity search
         db_service = DocumentService()
         relevant_chunks = db_service.search_similar_chunks(user_message, top_k=5)
-        
-        # Prepare context from retrieved chunks
-        context = ""
-        if relevant_chunks:
-            context = "\n\n".join([chunk['content'] for chunk in relevant_chunks])
-        
-        # Prepare messages for OpenAI
-        messages = []
-        
-        # Add system message with context
-        system_message = f"""You are a helpful AI assistant with access to a knowledge base. 
-Use the following context to answer the user's question. If the context doesn't contain relevant information, 
-say so and provide a general helpful response.
+        retrieval_seconds = time.perf_counter() - started
 
-Context:
-{context}
+        messages, used_chunks, prompt = build_chat_messages(user_message, chat_history, relevant_chunks, summary, summary_tokens)
+        sources = format_sources(used_chunks)
+
+        def finish(bot_response):
+            record_turn(session_id, user_message, bot_response)
+            if answer_cache is not None:
+                answer_cache.put(query_embedding, user_message, bot_response, sources, corpus_version)
+                answer_cache.observe(False, time.perf_counter() - started)
+
+        if wants_stream(data):
+            return stream_chat_response(messages, sources, prompt, retrieval_seconds, started, session_id, finish)
 
-Please provide a helpful and accurate response based on the available information."""
-        
-        messages.append({"role": "system", "content": system_message})
-        
-        # Add chat history
-        for msg in chat_history:
-            messages.append({
-                "role": msg.get("role", "user"),
-                "content": msg.get("content", "")
-            })
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
         # Get response from OpenAI
         client = get_openai_client()
         response = client.chat.completions.create(
-            model="gpt-5",
+            model=Config.CHAT_MODEL,
             messages=messages
         )
-        
+
         bot_response = response.choices[0].message.content
-        
+        finish(bot_response)
+
         return jsonify({
             "response": bot_response,
-            "sources": [
-                {
-                    "document_id": chunk.get('document_id'),
-                    "document_name": chunk.get('document_name', 'Unknown'),
-                    "document_type": chunk.get('document_type', ''),
-                    "similarity": chunk.get('similarity', 0),
-                    "source_link": chunk.get('source_link', '')
-                }
-                for chunk in relevant_chunks
-            ] if relevant_chunks else []
+            "sources": sources,
+            "prompt": prompt,
+            "session_id": session_id
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Chat failed: {str(e)}"}), 500
+
+
+def parse_search_request(data):
+    """(query or list of queries, top_k) for /search, or a ValueError to answer with 400.
+    `queries` asks for a batch and takes precedence over `query`."""
+    top_k = min(max(int(data.get('top_k', 5)), 1), 50)
+    if 'queries' not in data:
+        query = data.get('query', '')
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("Query cannot be empty")
+        return query, top_k
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("queries must be a non-empty list")
+    if len(queries) > Config.SEARCH_BATCH_MAX_QUERIES:
+        raise ValueError(f"At most {Config.SEARCH_BATCH_MAX_QUERIES} queries per request")
+    if any(not isinstance(query, str) or not query.strip() for query in queries):
+        raise ValueError("Queries cannot be empty")
+    return queries, top_k
+
+
+def search_response(query, results):
+    if isinstance(query, list):
+        return {"results": [{"query": text, "results": chunks} for text, chunks in zip(query, results)]}
+    return {"query": query, "results": results}
+
+
+@chat.route("/search", methods=["POST"])
+def search_endpoint():
+    try:
+        try:
+            query, top_k = parse_search_request(request.get_json() or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        db_service = DocumentService()
+        if isinstance(query, list):
+            results = db_service.search_similar_chunks_many(query, top_k=top_k)
+        else:
+            results = db_service.search_similar_chunks(query, top_k=top_k)
+        return jsonify(search_response(query, results)), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Search failed: {str(e)}"}), 500
+
+
+@chat.route("/sessions/<session_id>", methods=["GET"])
+def get_chat_session(session_id):
+    try:
+        store = get_session_store()
+        session = store.get(session_id)
+        if session is None:
+            return jsonify({"error": "Chat session not found or expired"}), 404
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        before = request.args.get('before', type=int)
+        return jsonify({
+            "session_id": session['id'],
+            "created_at": session['created_at'],
+            "updated_at": session['updated_at'],
+            "turn_count": session['turn_count'],
+            "summary": session['summary'],
+            "turns": store.turns(session['id'], limit, before)
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to get chat session: {str(e)}"}), 500
+
+
+@chat.route("/sessions/<session_id>", methods=["DELETE"])
+def delete_chat_session(session_id):
+    try:
+        if not get_session_store().delete(session_id):
+            return jsonify({"error": "Chat session not found"}), 404
+        return jsonify({"message": "Chat session deleted"}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to delete chat session: {str(e)}"}), 500
+
+
+@chat.route("/metrics", methods=["GET"])
+def chat_metrics():
+    try:
+        vector_index = get_vector_index()
+        lexical_index = get_lexical_index()
+        answer_cache = get_answer_cache()
+        return jsonify({
+            "query_embedding_cache": get_query_embedding_cache().stats(),
+            "retrieval_cache": get_retrieval_cache().stats(),
+            "vector_index": vector_index.stats() if vector_index else None,
+            "lexical_index": lexical_index.stats() if lexical_index else None,
+            "chunk_writer": get_chunk_writer().stats(),
+            "prompt_budget": get_prompt_budget().stats(),
+            "chat_sessions": get_session_store().stats(),
+            "answer_cache": answer_cache.stats() if answer_cache else None
         }), 200
-        
     except Exception as e:
-        return jsonify({"error": f"Chat failed: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Failed to get metrics: {str(e)}"}), 500
@@ -1,21 +1,17 @@
 from flask import Blueprint, request, jsonify
 import os
-import uuid
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import mimetypes
 import sys
 sys.path.append('..')
 from sb.database_service import DocumentService
+from sb.job_service import JobService
 from config import Config
-from flask import send_file
-import fitz  # PyMuPDF
-import docx2txt
-from openai import OpenAI
-import re
-import io
-from PIL import Image
-import pytesseract
-import edoc
+from ..uploads import APP_DIR, accepts_archives, content_matches_extension, is_archive, iter_archive_members
+import tarfile
+import uuid
+import zipfile
+from flask import send_file, current_app
 document = Blueprint("document", __name__)
 
 # Configure upload settings from config
@@ -27,88 +23,343 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_file_size(file):
-    file.seek(0, 2)  # Seek to end
-    size = file.tell()
-    file.seek(0)  # Reset to beginning
-    return size
+def validate_file(filename, head):
+    """Return an error message for an unacceptable file, or None"""
+    if filename == '':
+        return "No file selected"
+    if not allowed_file(filename):
+        return "File type not allowed"
+    if not content_matches_extension(filename.rsplit('.', 1)[1].lower(), head):
+        return "File content does not match its extension"
+    return None
+
+def validate_upload(file):
+    """Return an error message for an unacceptable upload, or None"""
+    return validate_file(file.filename, file.stream.head)
+
+def keep_stream(filename, stream):
+    """Keep a file UploadRequest already streamed to UPLOAD_FOLDER (with its size and
+    hash taken on the way). Returns the document fields for it plus `full_path`, the
+    absolute path handed to the ingestion worker."""
+    stream.kept = True
+    return {
+        "name": stream.filename,
+        "original_name": stream.filename,
+        "file_path": stream.file_path,
+        "file_size": stream.size,  # bytes (BIGINT)
+        "file_type": filename.rsplit('.', 1)[1].upper(),
+        "content_hash": stream.content_hash,
+        "full_path": stream.full_path
+    }
+
+def save_upload(file):
+    """keep_stream for an uploaded FileStorage"""
+    return keep_stream(file.filename, file.stream)
+
+def get_upload(name='file'):
+    """The uploaded file in form field `name` (None if absent) and an error message.
+    Reading request.files parses the whole body, so oversized files fail here."""
+    try:
+        file = request.files.get(name)
+    except RequestEntityTooLarge:
+        return None, f"File too large. Maximum size is {MAX_FILE_SIZE >> 20}MB"
+    if file is None:
+        return None, "No file provided"
+    return file, validate_upload(file)
+
+def remove_stored_file(file_path):
+    """Best-effort removal of a file under backend/app"""
+    try:
+        app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        full_path = os.path.join(app_dir, file_path)
+        if file_path and os.path.exists(full_path):
+            os.remove(full_path)
+    except Exception:
+        pass
 
 @document.route("/upload", methods=["POST"])
 def upload_document():
     try:
-        if 'file' not in request.files:
-            return jsonify({"error": "No file provided"}), 400
+        file, error = get_upload()
+        if error:
+            return jsonify({"error": error}), 400
         
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({"error": "File type not allowed"}), 400
-        
-        # Check file size
-        file_size = get_file_size(file)
-        if file_size > MAX_FILE_SIZE:
-            return jsonify({"error": "File too large. Maximum size is 50MB"}), 400
-        
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        file_extension = filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        # Save file
-        file.save("app/" + file_path)
+        db_service = DocumentService()
+
+        # Same bytes uploaded before: reuse that document and its chunks, skipping extraction
+        # and embedding (the streamed copy is dropped when the request closes)
+        existing = db_service.get_document_by_hash(file.stream.content_hash)
+        if existing:
+            job = JobService().get_latest_job_for_document(existing['id'])
+            return jsonify({
+                "message": "File already uploaded",
+                "document": existing,
+                "duplicate": True,
+                "job_id": job['id'] if job else None,
+                "status_url": f"/api/document/status/{job['id']}" if job else None
+            }), 200
+
+        # Keep the file streamed to UPLOAD_FOLDER under its unique name
+        upload = save_upload(file)
         
         # Create document record (store numeric bytes and one file_type)
         document_data = {
-            "name": filename,
-            "original_name": filename,
-            "file_path": file_path,
-            "file_size": file_size,  # bytes (BIGINT)
-            "file_type": file_extension.upper(),
-            "status": "uploaded"
+            "name": upload['name'],
+            "original_name": upload['original_name'],
+            "file_path": upload['file_path'],
+            "file_size": upload['file_size'],
+            "file_type": upload['file_type'],
+            "content_hash": upload['content_hash'],
+            "status": "queued"
         }
         
         # Save to Supabase
-        db_service = DocumentService()
         saved_document = db_service.create_document(document_data)
         
-        # RAG pipeline: extract text -> chunk -> embed -> save chunks
+        # Queue the RAG pipeline (extract -> chunk -> embed -> save chunks) for the worker pool
         try:
-            abs_app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend/app -> backend
-            full_path = os.path.join(abs_app_dir, file_path)
-            text_content = extract_text(full_path, file_extension.upper())
-            chunks = chunk_text(text_content)
-            
-            if chunks:
-                embeddings = embed_chunks_openai(chunks)
-                chunk_rows = [
-                    { 'chunk_index': idx, 'content': chunks[idx], 'embedding': embeddings[idx] }
-                    for idx in range(len(chunks))
-                ]
-                db_service.insert_document_chunks(saved_document['id'], chunk_rows)
-                
+            job = JobService().create_job(saved_document['id'], upload['full_path'], upload['file_type'])
+            current_app.extensions['ingestion_queue'].enqueue(job)
         except Exception as e:
-            # Do not fail upload if RAG pipeline errors; report warning in response
+            db_service.delete_document(saved_document['id'])
+            return jsonify({"error": f"Failed to queue document processing: {str(e)}"}), 500
+
+        return jsonify({
+            "message": "File uploaded, processing queued",
+            "document": saved_document,
+            "job_id": job['id'],
+            "status_url": f"/api/document/status/{job['id']}"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({"error": f"Upload failed: {str(e)}"}), 500
+
+
+@document.route("/replace/<document_id>", methods=["PUT"])
+def replace_document(document_id):
+    """Upload a new version of a document. The worker re-chunks it and diffs chunk
+    hashes against the stored chunks, so only changed chunks are embedded and written."""
+    try:
+        file, error = get_upload()
+        if error:
+            return jsonify({"error": error}), 400
+
+        db_service = DocumentService()
+        existing = db_service.get_document_by_id(document_id)
+        if not existing:
+            return jsonify({"error": "Document not found"}), 404
+        if existing.get('status') in ('queued', 'processing'):
+            return jsonify({"error": "Document is still being processed"}), 409
+
+        # A failed document is re-ingested even from the same bytes
+        if file.stream.content_hash == existing.get('content_hash') and existing.get('status') != 'failed':
+            return jsonify({"message": "File unchanged", "document": existing, "job_id": None}), 200
+
+        upload = save_upload(file)
+        file_fields = ('name', 'original_name', 'file_path', 'file_size', 'file_type', 'content_hash')
+        # The document keeps its current file until the worker has replaced its chunks
+        replacement = {
+            "document": {key: upload[key] for key in file_fields},
+            "previous_file_path": os.path.join(APP_DIR, existing['file_path']) if existing.get('file_path') else None,
+            "previous_status": existing.get('status')
+        }
+        queued_document = db_service.update_document_status(document_id, 'queued')
+
+        try:
+            job = JobService().create_job(document_id, upload['full_path'], upload['file_type'],
+                                          kind='replace', replacement=replacement)
+            current_app.extensions['ingestion_queue'].enqueue(job)
+        except Exception as e:
+            # Keep serving the previous version
+            db_service.update_document_status(document_id, existing.get('status'))
+            remove_stored_file(upload['file_path'])
+            return jsonify({"error": f"Failed to queue document processing: {str(e)}"}), 500
+
+        return jsonify({
+            "message": "File replaced, processing queued",
+            "document": queued_document,
+            "job_id": job['id'],
+            "status_url": f"/api/document/status/{job['id']}"
+        }), 202
+
+    except Exception as e:
+        return jsonify({"error": f"Replace failed: {str(e)}"}), 500
+
+
+def iter_bulk_files(parts):
+    """Yield (name, stream, error) for each uploaded file and each member of the
+    uploaded archives, streaming members to UPLOAD_FOLDER one at a time"""
+    for part in parts:
+        if not is_archive(part.filename):
+            yield part.filename, part.stream, None
+            continue
+        try:
+            for name, size, member in iter_archive_members(part.stream.full_path):
+                filename = os.path.basename(name)
+                if not allowed_file(filename):
+                    yield name, None, "File type not allowed"
+                elif size > MAX_FILE_SIZE:
+                    yield name, None, f"File too large. Maximum size is {MAX_FILE_SIZE >> 20}MB"
+                else:
+                    try:
+                        yield name, request.stream_archive_member(name, member), None
+                    except RequestEntityTooLarge:
+                        # Declared size was wrong (or forged); stopped at the limit
+                        yield name, None, f"File too large. Maximum size is {MAX_FILE_SIZE >> 20}MB"
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+            yield part.filename, None, f"Unreadable archive: {str(e)}"
+        finally:
+            part.stream.discard()
+
+@document.route("/bulk-upload", methods=["POST"])
+@accepts_archives
+def bulk_upload_documents():
+    """Upload many files at once: any number of `files` parts, each a document or a
+    zip/tar archive of documents. Every file is checked and deduplicated like a
+    single upload; the accepted ones are queued as one batch that the worker ingests
+    together. Responds with the status of each file."""
+    try:
+        try:
+            parts = request.files.getlist('files') + request.files.getlist('file')
+        except RequestEntityTooLarge as e:
+            return jsonify({"error": e.description}), 400
+        if not parts:
+            return jsonify({"error": "No files provided"}), 400
+
+        results = []
+        accepted = []  # (result, filename, stream)
+        total_bytes = 0
+        for name, stream, error in iter_bulk_files(parts):
+            if error is None:
+                error = validate_file(os.path.basename(name), stream.head)
+            if error is None and len(accepted) >= Config.BULK_UPLOAD_MAX_FILES:
+                error = f"Too many files. Maximum is {Config.BULK_UPLOAD_MAX_FILES} per upload"
+            if error is None and total_bytes + stream.size > Config.BULK_UPLOAD_MAX_BYTES:
+                error = f"Upload too large. Maximum is {Config.BULK_UPLOAD_MAX_BYTES >> 20}MB in total"
+            result = {"name": name, "status": "rejected" if error else "queued", "error": error}
+            results.append(result)
+            if error:
+                if stream is not None:
+                    stream.discard()
+                continue
+            total_bytes += stream.size
+            accepted.append((result, os.path.basename(name), stream))
+
+        # Duplicates of stored documents, or of another file in this upload
+        db_service = DocumentService()
+        existing = db_service.get_documents_by_hashes([stream.content_hash for _, _, stream in accepted])
+        new_files = []
+        first_in_batch = {}  # content hash -> result of the file kept for it
+        batch_duplicates = []  # (result, result of the kept file), resolved once documents exist
+        for result, filename, stream in accepted:
+            if stream.content_hash in existing or stream.content_hash in first_in_batch:
+                result['status'] = "duplicate"
+                if stream.content_hash in existing:
+                    result['document_id'] = existing[stream.content_hash]['id']
+                else:
+                    batch_duplicates.append((result, first_in_batch[stream.content_hash]))
+                stream.discard()
+                continue
+            first_in_batch[stream.content_hash] = result
+            new_files.append((result, keep_stream(filename, stream)))
+
+        batch_id = str(uuid.uuid4()) if new_files else None
+        if new_files:
+            created = db_service.create_documents([
+                {key: upload[key] for key in ('name', 'original_name', 'file_path', 'file_size', 'file_type', 'content_hash')}
+                | {"status": "queued"}
+                for _, upload in new_files
+            ])
+            by_path = {saved['file_path']: saved for saved in created}
+            saved_documents = [by_path[upload['file_path']] for _, upload in new_files]
             try:
-                db_service.delete_document(saved_document['id'])
-                return jsonify({
-                    "message": "File uploaded, processing had issues",
-                    "processing_error": str(e)
-                }), 200
+                jobs = JobService().create_jobs([
+                    {"document_id": saved['id'], "file_path": upload['full_path'], "file_type": upload['file_type']}
+                    for saved, (_, upload) in zip(saved_documents, new_files)
+                ], batch_id)
+                current_app.extensions['ingestion_queue'].enqueue_batch(jobs)
             except Exception as e:
-                jsonify({
-                    "message": "File uploaded, processing had issues",
-                    "processing_error": str(e)
-                }), 200
+                db_service.delete_multiple_documents([saved['id'] for saved in saved_documents])
+                for _, upload in new_files:
+                    remove_stored_file(upload['file_path'])
+                return jsonify({"error": f"Failed to queue document processing: {str(e)}"}), 500
+            job_ids = {job['document_id']: job['id'] for job in jobs}
+            for saved, (result, _) in zip(saved_documents, new_files):
+                result.update(document_id=saved['id'], job_id=job_ids[saved['id']])
+            for result, kept in batch_duplicates:
+                result['document_id'] = kept['document_id']
+
+        counts = {status: sum(1 for result in results if result['status'] == status)
+                  for status in ('queued', 'duplicate', 'rejected')}
+        return jsonify({
+            "message": f"{counts['queued']} files queued, {counts['duplicate']} duplicates, {counts['rejected']} rejected",
+            "batch_id": batch_id,
+            "status_url": f"/api/document/batch/{batch_id}" if batch_id else None,
+            "counts": counts,
+            "files": results
+        }), 202 if batch_id else 200
 
+    except Exception as e:
+        return jsonify({"error": f"Bulk upload failed: {str(e)}"}), 500
+
+
+@document.route("/batch/<batch_id>", methods=["GET"])
+def batch_status(batch_id):
+    """Processing status of every file queued by one bulk upload"""
+    try:
+        jobs = JobService().get_batch_jobs(batch_id)
+        if not jobs:
+            return jsonify({"error": "Batch not found"}), 404
+
+        counts = {}
+        for job in jobs:
+            counts[job['status']] = counts.get(job['status'], 0) + 1
         return jsonify({
-            "message": "File uploaded successfully",
-            "document": saved_document
+            "batch_id": batch_id,
+            "total": len(jobs),
+            "counts": counts,
+            "done": counts.get('queued', 0) + counts.get('processing', 0) == 0,
+            "jobs": [
+                {
+                    "job_id": job['id'],
+                    "document_id": job['document_id'],
+                    "status": job['status'],
+                    "chunk_count": job.get('chunk_count'),
+                    "error": job.get('error'),
+                    "updated_at": job.get('updated_at')
+                }
+                for job in jobs
+            ]
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Failed to get batch status: {str(e)}"}), 500
+
+
+@document.route("/status/<job_id>", methods=["GET"])
+def document_status(job_id):
+    try:
+        job = JobService().get_job(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        # Document status is the source of truth; the worker updates it as it runs
+        document = DocumentService().get_document_by_id(job['document_id'])
+        if not document:
+            return jsonify({"error": "Document not found"}), 404
+        
+        return jsonify({
+            "job_id": job['id'],
+            "document_id": job['document_id'],
+            "status": document.get('status'),
+            "attempts": job.get('attempts', 0),
+            "chunk_count": job.get('chunk_count'),
+            "error": job.get('error'),
+            "updated_at": document.get('updated_at')
         }), 200
         
     except Exception as e:
-        return jsonify({"error": f"Upload failed: {str(e)}"}), 500
+        return jsonify({"error": f"Failed to get document status: {str(e)}"}), 500
 
 
 @document.route("/list", methods=["GET"])
@@ -124,9 +375,12 @@ def list_documents():
         if per_page < 1 or per_page > 100:  # Limit max items per page
             per_page = 5
         
-        # Get documents from Supabase with pagination
+        # Get documents from Supabase; `cursor` (next_cursor of the previous page) reads by keyset
         db_service = DocumentService()
-        result = db_service.get_documents_paginated(page, per_page)
+        try:
+            result = db_service.get_documents_paginated(page, per_page, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Format documents for frontend
         formatted_documents = []
@@ -148,7 +402,8 @@ def list_documents():
             "total": result['total'],
             "page": page,
             "per_page": per_page,
-            "total_pages": result['total_pages']
+            "total_pages": result['total_pages'],
+            "next_cursor": result['next_cursor']
         }), 200
         
     except Exception as e:
@@ -282,118 +537,3 @@ def download_document(document_id):
         )
     except Exception as e:
         return jsonify({"error": f"Failed to download document: {str(e)}"}), 500
-
-
-# ========== RAG Processing Helpers ==========
-def ocr_pdf_from_bytes_pymupdf(pdf_bytes):
-    """
-    Run OCR on a PDF given as bytes using PyMuPDF to render pages as images.
-    No Poppler required.
-    """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    text = ""
-    for i, page in enumerate(doc, start=1):
-        # Render page to an image (RGB)
-        pix = page.get_pixmap(dpi=300)
-        img = Image.open(io.BytesIO(pix.tobytes("png")))
-        
-        # Run OCR
-        page_text = pytesseract.image_to_string(img, lang="eng")
-        text += f"\n--- OCR Page {i} ---\n{page_text}"
-    return text
-
-
-def extract_pdf_text_from_bytes(pdf_bytes, min_chars_threshold=20):
-    """
-    Extract text from PDF bytes. If not enough text, run OCR using PyMuPDF.
-    """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    extracted_text = ""
-
-    for page in doc:
-        page_text = page.get_text()
-        extracted_text += page_text
-    
-    if len(extracted_text) > min_chars_threshold:
-        print("✅ PDF is text-based. Extracting directly.")
-        return extracted_text
-    else:
-        print("⚠️ PDF is image-based. Running OCR fallback.")
-        return ocr_pdf_from_bytes_pymupdf(pdf_bytes)
-    
-def extract_text(file_path: str, file_type: str) -> str:
-    """Extract text from supported file types."""
-    try:
-        ft = (file_type or '').upper()
-        if ft == 'PDF':
-            with open(file_path, "rb") as f:
-                pdf_bytes = f.read()
-            text = extract_pdf_text_from_bytes(pdf_bytes)
-            return text
-        if ft =='DOCX':
-            # docx2txt handles .docx; .doc may fail
-            return docx2txt.process(file_path) or ''
-        if ft == 'DOC':
-            return edoc.extraxt_txt(file_path)
-        # Plain-text like files
-        if ft in ['TXT', 'MD', 'JS', 'TS', 'TSX', 'JSX', 'SQL', 'YAML', 'YML', 'CSV']:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-        # Fallback: try utf-8 read
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            return f.read()
-    except Exception:
-        return ''
-
-
-def chunk_text(text: str, max_chars: int = 500, overlap: int = 50) -> list[str]:
-    """
-    Split text into overlapping chunks of at most `max_chars` characters.
-    Tries to break at sentence or word boundaries. Ensures no text loss or duplication.
-    """
-    if not text:
-        return []
-
-    # Normalize whitespace but preserve paragraph breaks
-    text = re.sub(r"[ \t]+", " ", text).strip()
-
-    chunks = []
-    start = 0
-    n = len(text)
-
-    while start < n:
-        end = min(n, start + max_chars)
-        window = text[start:end]
-
-        # Try to cut near the end of a sentence or word boundary
-        cut = max(window.rfind(". "), window.rfind(" "), window.rfind("\n"))
-        if cut == -1 or cut < max_chars * 0.5:
-            cut = len(window)
-
-        chunk = window[:cut].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        # Move start forward by (cut - overlap), but never backward or beyond text
-        next_start = start + cut - overlap
-        if next_start <= start:
-            next_start = start + cut  # avoid infinite loops when cut < overlap
-
-        start = min(next_start, n)
-
-    return chunks
-
-
-def embed_chunks_openai(chunks: list) -> list:
-    """Create embeddings for chunks using OpenAI text-embedding-3-large."""
-    if not chunks:
-        return []
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    model = "text-embedding-3-small"
-    # OpenAI API supports batching inputs
-    resp = client.embeddings.create(model=model, input=chunks)
-    vectors = [data.embedding for data in resp.data]
-    return vectors
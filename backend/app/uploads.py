@@ -0,0 +1,144 @@
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import uuid
+import zipfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from config import Config
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # backend/app
+SNIFF_BYTES = 4096
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Leading bytes of the binary formats; every other allowed extension is read as text
+FILE_SIGNATURES = {
+    'pdf': (b'%PDF-',),
+    'docx': (b'PK\x03\x04',),
+    'pptx': (b'PK\x03\x04',),
+    'xlsx': (b'PK\x03\x04',),
+    'doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    'ppt': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    'xls': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+}
+_BINARY_SIGNATURES = tuple({signature for signatures in FILE_SIGNATURES.values() for signature in signatures})
+_UTF16_BOMS = (b'\xff\xfe', b'\xfe\xff')
+
+
+def content_matches_extension(extension, head):
+    """Whether the first bytes of a file are plausible for its extension"""
+    signatures = FILE_SIGNATURES.get(extension)
+    if signatures:
+        return head.startswith(signatures)
+    if head.startswith(_BINARY_SIGNATURES):
+        return False
+    return b'\x00' not in head or head.startswith(_UTF16_BOMS)
+
+
+def is_archive(filename):
+    return (filename or '').lower().endswith(Config.ARCHIVE_EXTENSIONS)
+
+
+def accepts_archives(view):
+    """Mark a route whose archive uploads may be up to BULK_UPLOAD_MAX_BYTES; on any
+    other route an archive is just a file limited to MAX_FILE_SIZE"""
+    view.accepts_archives = True
+    return view
+
+
+def iter_archive_members(path):
+    """Yield (name, declared size, file object) for each regular file in a zip or tar
+    archive. Members are decompressed one at a time as they are read; tars are read
+    sequentially in stream mode, without an index pass."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, info.file_size, member
+        return
+    with tarfile.open(path, 'r|*') as archive:
+        for info in archive:
+            if info.isfile():
+                yield info.name, info.size, archive.extractfile(info)
+
+
+class UploadStream(io.FileIO):
+    """Destination of one multipart file part: the bytes go straight to their final
+    path under UPLOAD_FOLDER while size, SHA-256 and the leading bytes are taken on
+    the way, and the part is rejected as soon as it passes MAX_FILE_SIZE."""
+
+    def __init__(self, filename, max_size=None):
+        self.filename = secure_filename(filename or '')
+        self.max_size = max_size or Config.MAX_FILE_SIZE
+        self.file_path = os.path.join(Config.UPLOAD_FOLDER, f"{uuid.uuid4()}_{self.filename}")
+        self.full_path = os.path.join(APP_DIR, self.file_path)
+        os.makedirs(os.path.dirname(self.full_path), exist_ok=True)
+        super().__init__(self.full_path, 'w+')
+        self.size = 0
+        self.head = b''
+        self.digest = hashlib.sha256()
+        self.kept = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise RequestEntityTooLarge(f"File too large. Maximum size is {self.max_size >> 20}MB")
+        if len(self.head) < SNIFF_BYTES:
+            self.head += bytes(data[:SNIFF_BYTES - len(self.head)])
+        self.digest.update(data)
+        return super().write(data)
+
+    def discard(self):
+        """Close and delete the file now instead of when the request ends"""
+        self.close()
+        if os.path.exists(self.full_path):
+            os.remove(self.full_path)
+
+    @property
+    def content_hash(self):
+        return self.digest.hexdigest()
+
+
+class UploadRequest(Request):
+    """Request whose uploaded files are streamed to UPLOAD_FOLDER in a single pass.
+    Files a route did not keep (rejected, duplicate, failed) are removed when the
+    request closes."""
+
+    def accepts_archives(self):
+        view = current_app.view_functions.get(self.endpoint) if self.endpoint else None
+        return getattr(view, 'accepts_archives', False)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        archive = is_archive(filename) and self.accepts_archives()
+        max_size = Config.BULK_UPLOAD_MAX_BYTES if archive else Config.MAX_FILE_SIZE
+        if content_length is not None and content_length > max_size:
+            raise RequestEntityTooLarge(f"File too large. Maximum size is {max_size >> 20}MB")
+        return self.open_upload_stream(filename, max_size)
+
+    def open_upload_stream(self, filename, max_size=None):
+        """A new UploadStream cleaned up with this request unless kept"""
+        stream = UploadStream(filename, max_size)
+        self.__dict__.setdefault('upload_streams', []).append(stream)
+        return stream
+
+    def stream_archive_member(self, name, member):
+        """Copy an archive member to its own upload file (sized, hashed and sniffed
+        like a multipart part). Raises RequestEntityTooLarge past MAX_FILE_SIZE."""
+        stream = self.open_upload_stream(os.path.basename(name))
+        shutil.copyfileobj(member, stream, COPY_BLOCK_SIZE)
+        return stream
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for stream in self.__dict__.get('upload_streams', []):
+                if stream.kept:
+                    stream.close()
+                else:
+                    stream.discard()
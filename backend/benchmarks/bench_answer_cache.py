@@ -0,0 +1,121 @@
+"""
+Benchmark: chat traffic dominated by a few questions asked in different words,
+against the ASGI app with the answer cache off and on. The OpenAI stub runs
+with --semantic embeddings (cosine similarity tracks word overlap), so
+paraphrases that reorder or add a word land close to each other while
+questions that differ in a content word ("annual" vs "monthly") do not. A hit
+whose stored question belongs to another group counts as a false hit. Halfway
+through, the corpus version is bumped as a document upload would:
+
+    python benchmarks/bench_answer_cache.py --requests 300 --threshold 0.9
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import httpx
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test_chat import free_port, start_server, start_stub
+
+# Each group is one question and its paraphrases; neighbouring groups differ in one content word
+GROUPS = [
+    ["What is the refund policy for annual plans?", "what is the refund policy for annual plans",
+     "For annual plans, what is the refund policy?", "What exactly is the refund policy for annual plans?"],
+    ["What is the refund policy for monthly plans?", "For monthly plans what is the refund policy?",
+     "what is the refund policy for monthly plans please"],
+    ["How do I reset my account password?", "how do i reset my account password",
+     "How do I reset the password of my account?", "My account password: how do I reset it?"],
+    ["Which regions store customer invoices?", "Customer invoices are stored in which regions?",
+     "which regions store customer invoices today"],
+    ["How long does support take to answer a ticket?", "How long does support take to answer a ticket usually?",
+     "support: how long does it take to answer a ticket?"],
+    ["Can I export my data to CSV?", "can I export my data to csv", "Can I export all my data to CSV?"],
+]
+
+
+def run(port, traffic, bump_at, corpus_version):
+    latencies = {'hit': [], 'miss': []}
+    false_hits = 0
+    with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=30) as client:
+        for i, (group, question) in enumerate(traffic):
+            if i == bump_at and corpus_version is not None:
+                corpus_version.bump()
+            start = time.perf_counter()
+            response = client.post('/api/chat/chat', json={'message': question})
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            cached = response.json().get('cached')
+            latencies['hit' if cached else 'miss'].append(elapsed)
+            if cached and group is not None and not any(cached['question'] == q for q in GROUPS[group]):
+                false_hits += 1
+        metrics = client.get('/api/chat/metrics').json()['answer_cache']
+    return latencies, false_hits, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--unique', type=float, default=0.2, help='share of one-off questions')
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--openai-latency', type=float, default=0.05, help='stub seconds per embeddings/chat call')
+    parser.add_argument('--token-latency', type=float, default=0.02, help='stub seconds per generated token')
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    traffic = []
+    for i in range(args.requests):
+        if rng.random() < args.unique:
+            traffic.append((None, f"Unrelated question number {i} about topic {rng.randrange(10 ** 6)}?"))
+        else:
+            # A few questions carry most of the traffic
+            group = min(int(rng.expovariate(0.6)), len(GROUPS) - 1)
+            traffic.append((group, rng.choice(GROUPS[group])))
+
+    openai_stub, openai_url = start_stub('stub_openai.py', free_port(), '--dims', 256, '--semantic',
+                                         '--latency', args.openai_latency, '--token-latency', args.token_latency)
+    supabase_stub, supabase_url = start_stub('stub_supabase.py', free_port(), '--latency', 0.01)
+    try:
+        for enabled in (False, True):
+            cache_dir = tempfile.mkdtemp(prefix='answer-cache-bench-')
+            env = dict(os.environ,
+                       OPENAI_API_KEY='stub', OPENAI_BASE_URL=openai_url,
+                       SUPABASE_URL=supabase_url, SUPABASE_ANON_KEY='stub',
+                       EMBEDDING_CACHE_PATH=os.path.join(cache_dir, 'embeddings.sqlite3'),
+                       CORPUS_VERSION_PATH=os.path.join(cache_dir, 'corpus_version.sqlite3'),
+                       ANSWER_CACHE_ENABLED=str(enabled), ANSWER_CACHE_THRESHOLD=str(args.threshold))
+            port = free_port()
+            proc = start_server('asgi', port, env, 4)
+            try:
+                # Imported after the server created the file, and with its path
+                os.environ['CORPUS_VERSION_PATH'] = env['CORPUS_VERSION_PATH']
+                from rag.retrieval_cache import CorpusVersion
+                corpus_version = CorpusVersion(env['CORPUS_VERSION_PATH']) if enabled else None
+                started = time.perf_counter()
+                latencies, false_hits, metrics = run(port, traffic, args.requests // 2, corpus_version)
+                elapsed = time.perf_counter() - started
+            finally:
+                proc.terminate()
+                proc.wait()
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+            everything = sorted(latencies['hit'] + latencies['miss'])
+            p50 = everything[len(everything) // 2] * 1000
+            avg = lambda values: sum(values) * 1000 / len(values) if values else float('nan')
+            print(f"cache {'on ' if enabled else 'off'}: {elapsed:6.2f} s for {len(everything)} chats, p50 {p50:6.1f} ms, "
+                  f"hits {len(latencies['hit'])} ({avg(latencies['hit']):.1f} ms avg), "
+                  f"misses {len(latencies['miss'])} ({avg(latencies['miss']):.1f} ms avg), false hits {false_hits}")
+            if metrics:
+                print(f"           server: hit rate {metrics['hit_rate']:.0%}, lookup {metrics['avg_lookup_ms']:.2f} ms, "
+                      f"entries {metrics['entries']}, invalidations {metrics['invalidations']}")
+    finally:
+        for stub in (openai_stub, supabase_stub):
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: an evaluation job retrieving sources for N questions through the
+ASGI app, one /api/chat/search request per question (sequentially, as eval
+scripts do, and 16 at a time) versus batched requests with `queries`. OpenAI
+and Supabase are local stubs with simulated network latency. Then the local
+vector index on its own: N search() calls versus one search_many():
+
+    python benchmarks/bench_batch_search.py --queries 200 --batch-size 100
+    python benchmarks/bench_batch_search.py --rows 200000 --dims 1536
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import httpx
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test_chat import free_port, start_server, start_stub
+from bench_vector_index import clustered_vectors
+from rag.vector_index import VectorIndex
+
+
+async def search_one_by_one(port, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=60) as client:
+        async def search(question):
+            async with semaphore:
+                response = await client.post('/api/chat/search', json={'query': question})
+                response.raise_for_status()
+                return response.json()['results']
+        return await asyncio.gather(*(search(question) for question in questions))
+
+
+def search_batched(port, questions, batch_size):
+    results = []
+    with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=60) as client:
+        for start in range(0, len(questions), batch_size):
+            response = client.post('/api/chat/search', json={'queries': questions[start:start + batch_size]})
+            response.raise_for_status()
+            results.extend(item['results'] for item in response.json()['results'])
+    return results
+
+
+def bench_api(args):
+    openai_stub, openai_url = start_stub('stub_openai.py', free_port(), '--dims', 256, '--latency', args.openai_latency)
+    supabase_stub, supabase_url = start_stub('stub_supabase.py', free_port(), '--latency', args.supabase_latency)
+    cache_dir = tempfile.mkdtemp(prefix='batch-search-')
+    env = dict(os.environ,
+               OPENAI_API_KEY='stub', OPENAI_BASE_URL=openai_url,
+               SUPABASE_URL=supabase_url, SUPABASE_ANON_KEY='stub',
+               EMBEDDING_CACHE_PATH=os.path.join(cache_dir, 'embeddings.sqlite3'),
+               CORPUS_VERSION_PATH=os.path.join(cache_dir, 'corpus_version.sqlite3'))
+    port = free_port()
+    proc = start_server('asgi', port, env, 4)
+    try:
+        runs = [
+            ('one request per query', lambda tag: asyncio.run(search_one_by_one(port, questions(tag), 1))),
+            ('16 requests in flight', lambda tag: asyncio.run(search_one_by_one(port, questions(tag), 16))),
+            (f'batches of {args.batch_size}', lambda tag: search_batched(port, questions(tag), args.batch_size)),
+        ]
+        # Distinct questions per run so the query and retrieval caches stay cold
+        questions = lambda tag: [f"{tag} evaluation question {i}: what does the handbook say?" for i in range(args.queries)]
+        baseline = None
+        for label, run in runs:
+            start = time.perf_counter()
+            results = run(label)
+            elapsed = time.perf_counter() - start
+            assert len(results) == args.queries
+            baseline = baseline or elapsed
+            print(f"{label:>22}: {elapsed:6.2f} s, {args.queries / elapsed:7.1f} queries/s ({baseline / elapsed:.1f}x)")
+    finally:
+        proc.terminate()
+        proc.wait()
+        for stub in (openai_stub, supabase_stub):
+            stub.terminate()
+            stub.wait()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def bench_index(args):
+    rng = np.random.default_rng(42)
+    centers = rng.standard_normal((500, args.dims)).astype(np.float32)
+    path = tempfile.mkdtemp(prefix='batch-search-index-')
+    try:
+        index = VectorIndex(path)
+        for offset in range(0, args.rows, 20000):
+            block = clustered_vectors(rng, centers, min(20000, args.rows - offset), 2.0)
+            index.add([{'id': str(offset + i), 'document_id': 'bench', 'chunk_index': offset + i, 'content': ''}
+                       for i in range(len(block))], block)
+        queries = clustered_vectors(rng, centers, args.queries, 2.0)
+        index.search(queries[0])  # map the files
+
+        start = time.perf_counter()
+        single = [index.search(query, 5) for query in queries]
+        single_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batched = index.search_many(queries, 5)
+        batch_seconds = time.perf_counter() - start
+        same = all([row['id'] for row in a] == [row['id'] for row in b] for a, b in zip(single, batched))
+        print(f"local index, {args.rows} x {args.dims} ({index.stats()['lists']} lists), {args.queries} queries: "
+              f"search() {single_seconds * 1000:.0f} ms, search_many() {batch_seconds * 1000:.0f} ms "
+              f"({single_seconds / batch_seconds:.1f}x), identical results: {same}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--openai-latency', type=float, default=0.1, help='stub seconds per embeddings call')
+    parser.add_argument('--supabase-latency', type=float, default=0.05, help='stub seconds per RPC')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--dims', type=int, default=1536)
+    args = parser.parse_args()
+    bench_api(args)
+    bench_index(args)
+
+
+if __name__ == '__main__':
+    main()
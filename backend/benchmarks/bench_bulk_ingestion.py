@@ -0,0 +1,79 @@
+"""
+Benchmark: ingesting a dump of small documents one by one through
+run_rag_pipeline (what N single uploads cost) versus run_bulk_pipeline (process
+pool extraction, embedding and insert batches shared across documents), against
+the local OpenAI and Supabase stubs with per-request latency and the embedding
+cache off:
+
+    python benchmarks/bench_bulk_ingestion.py --files 300 --latency 0.05 --workers 2
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test_chat import start_stub
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=300)
+    parser.add_argument('--words', type=int, nargs=2, default=[50, 600], help='document length range')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per stub request')
+    parser.add_argument('--workers', type=int, default=0, help='BULK_EXTRACT_WORKERS (0 = one per CPU core)')
+    args = parser.parse_args()
+
+    openai_proc, openai_url = start_stub('stub_openai.py', 8099, '--latency', args.latency)
+    supabase_proc, supabase_url = start_stub('stub_supabase.py', 8100, '--latency', args.latency)
+    os.environ.update(
+        OPENAI_BASE_URL=f"{openai_url}/v1", OPENAI_API_KEY='stub', SUPABASE_URL=supabase_url,
+        SUPABASE_ANON_KEY='stub', EMBEDDING_CACHE_ENABLED='False', BULK_EXTRACT_WORKERS=str(args.workers)
+    )
+    from sb.database_service import DocumentService
+    from rag.processing import run_rag_pipeline
+    from rag.bulk_ingestion import run_bulk_pipeline
+
+    rng = random.Random(3)
+    workdir = tempfile.mkdtemp(prefix='bulk-bench-')
+    paths = []
+    for idx in range(args.files):
+        path = os.path.join(workdir, f"doc{idx}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(' '.join(f"w{rng.randint(0, 20000)}" for _ in range(rng.randint(*args.words))) + f" doc{idx}.")
+        paths.append(path)
+
+    db_service = DocumentService()
+
+    def create_documents():
+        created = db_service.create_documents([
+            {'name': os.path.basename(path), 'original_name': os.path.basename(path), 'file_path': path,
+             'file_size': os.path.getsize(path), 'file_type': 'TXT', 'status': 'queued'}
+            for path in paths
+        ])
+        return [{'document_id': document['id'], 'file_path': document['file_path'], 'file_type': 'TXT'} for document in created]
+
+    try:
+        print(f"{args.files} text documents, {args.latency * 1000:.0f} ms per stub request")
+        documents = create_documents()
+        start = time.perf_counter()
+        chunks = sum(run_rag_pipeline(db_service, doc['document_id'], doc['file_path'], doc['file_type']) for doc in documents)
+        sequential = time.perf_counter() - start
+        print(f"{'one by one':>12}: {sequential:6.1f}s  {chunks} chunks  {args.files / sequential:6.1f} files/s")
+
+        documents = create_documents()
+        failures = []
+        start = time.perf_counter()
+        totals = run_bulk_pipeline(db_service, documents, lambda document, count, error: error and failures.append(error))
+        bulk = time.perf_counter() - start
+        print(f"{'bulk':>12}: {bulk:6.1f}s  {totals['chunks']} chunks  {args.files / bulk:6.1f} files/s  "
+              f"{totals['batches']} embedding batches  {len(failures)} failed")
+    finally:
+        openai_proc.kill()
+        supabase_proc.kill()
+
+
+if __name__ == '__main__':
+    main()
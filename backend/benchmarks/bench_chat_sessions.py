@@ -0,0 +1,82 @@
+"""
+Benchmark: the per-turn history work of a long conversation when the client
+resends the whole chat_history (request body decoded, every message counted
+and packed) versus a server-side session (only the new message is sent; the
+server loads the rolling summary and the unsummarized tail with their stored
+token counts, packs them and appends the new exchange). Retrieval and the
+completion call are the same for both and are left out:
+
+    python benchmarks/bench_chat_sessions.py --turns 200
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routes.chat import SYSTEM_PROMPT
+from rag.prompt_budget import PromptBudget
+from rag.session_store import SessionStore
+
+WORDS = ('policy', 'refund', 'account', 'invoice', 'the', 'customer', 'within', 'days', 'support', 'plan')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--answer-words', type=int, default=180, help='length of each assistant reply')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+
+    def words(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+    budget = PromptBudget()
+    workdir = tempfile.mkdtemp(prefix='session-bench-')
+    store = SessionStore(os.path.join(workdir, 'sessions.sqlite3'), prompt_budget=budget)
+    session_id = store.create()
+    history = []
+    totals = {'stateless': [0, 0.0], 'session': [0, 0.0]}
+    try:
+        print(f"{'turn':>5} {'stateless body':>15} {'ms':>7} {'session body':>13} {'ms':>7} {'tail turns':>11}")
+        for turn in range(1, args.turns + 1):
+            question = f"What does the {rng.choice(WORDS)} section say about {words(6)}?"
+            answer = f"{words(args.answer_words)}."
+
+            body = json.dumps({'message': question, 'chat_history': history}).encode('utf-8')
+            start = time.perf_counter()
+            data = json.loads(body)
+            budget.build(SYSTEM_PROMPT, data['message'], data['chat_history'], [])
+            stateless = time.perf_counter() - start
+            totals['stateless'][0] += len(body)
+            totals['stateless'][1] += stateless
+
+            session_body = json.dumps({'message': question, 'session_id': session_id}).encode('utf-8')
+            start = time.perf_counter()
+            data = json.loads(session_body)
+            session, tail = store.history(data['session_id'])
+            budget.build(SYSTEM_PROMPT, data['message'], tail, [], session['summary'], session['summary_tokens'])
+            store.append(session_id, [{'role': 'user', 'content': question}, {'role': 'assistant', 'content': answer}])
+            with_session = time.perf_counter() - start
+            totals['session'][0] += len(session_body)
+            totals['session'][1] += with_session
+
+            if turn in (1, 10, 50, 100, 200, 500) or turn == args.turns:
+                print(f"{turn:>5} {len(body):>15} {stateless * 1000:7.2f} {len(session_body):>13} "
+                      f"{with_session * 1000:7.2f} {len(tail):>11}")
+            history += [{'role': 'user', 'content': question}, {'role': 'assistant', 'content': answer}]
+
+        for name, (size, seconds) in totals.items():
+            print(f"{name:>10}: {size / 1e6:6.2f} MB sent, {seconds * 1000 / args.turns:6.2f} ms of history work per turn")
+        print(store.stats())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
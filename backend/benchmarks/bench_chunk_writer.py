@@ -0,0 +1,82 @@
+"""
+Benchmark: writing one large document's chunks to document_chunks as a single
+insert versus ChunkWriter's size-bounded, concurrent, retried upserts, against
+the stub PostgREST server with per-request latency, a gateway body limit and
+injected 503s after the write was applied (lost responses):
+
+    python benchmarks/bench_chunk_writer.py --chunks 2000 --latency 0.05 --fail-rate 0.05
+
+Each run checks the stub ends up with exactly one row per chunk.
+"""
+import argparse
+import os
+import sys
+import time
+import httpx
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test_chat import start_stub
+from supabase import create_client
+from rag.vector_codec import format_pgvector, pack_vectors
+from sb.chunk_writer import ChunkWriter
+
+
+def stored_rows(url, document_id):
+    response = httpx.get(f"{url}/rest/v1/document_chunks", params={'select': 'id', 'document_id': f'eq.{document_id}'},
+                         headers={'Prefer': 'count=exact'})
+    return int(response.headers['content-range'].rsplit('/', 1)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=2000)
+    parser.add_argument('--dims', type=int, default=1536)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per stub request')
+    parser.add_argument('--max-body-bytes', type=int, default=8 * 1024 * 1024, help='stub gateway body limit')
+    parser.add_argument('--fail-rate', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--port', type=int, default=8093)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dims)).astype(np.float32)
+    content = ' '.join(['lorem ipsum dolor sit amet'] * 20)
+    encodings = {'text': [format_pgvector(vector) for vector in vectors], 'float32': pack_vectors(vectors, 'float32')}
+
+    proc, url = start_stub('stub_supabase.py', args.port, '--latency', args.latency,
+                           '--max-body-bytes', args.max_body_bytes, '--fail-rate', args.fail_rate)
+    try:
+        supabase = create_client(url, 'stub')
+        print(f"{args.chunks} chunks x {args.dims} dims, {args.latency * 1000:.0f} ms/request, "
+              f"{args.max_body_bytes >> 20} MB body limit, {args.fail_rate:.0%} lost responses")
+
+        def make_rows(document_id, encoding):
+            return [{'document_id': document_id, 'chunk_index': idx, 'content': content, 'embedding': embedding}
+                    for idx, embedding in enumerate(encodings[encoding])]
+
+        start = time.perf_counter()
+        try:
+            supabase.table('document_chunks').insert(make_rows('single', 'text')).execute()
+            outcome = f"{args.chunks / (time.perf_counter() - start):8.0f} rows/s"
+        except Exception as e:
+            outcome = f"failed after {time.perf_counter() - start:.2f}s ({str(e).splitlines()[0][:60]})"
+        print(f"{'single insert':>24}: {outcome}")
+
+        for encoding, packed_width in (('text', None), ('float32', 4)):
+            for concurrency in args.concurrency:
+                document_id = f"{encoding}-{concurrency}"
+                writer = ChunkWriter(supabase, concurrency=concurrency)
+                start = time.perf_counter()
+                stored = writer.write(make_rows(document_id, encoding), packed_width)
+                elapsed = time.perf_counter() - start
+                stats = writer.stats()
+                print(f"{f'{encoding} concurrency={concurrency}':>24}: {len(stored) / elapsed:8.0f} rows/s  "
+                      f"{stats['batches']} batches  {stats['retries']} retries  "
+                      f"{stored_rows(url, document_id)} rows stored")
+    finally:
+        proc.kill()
+
+
+if __name__ == '__main__':
+    main()
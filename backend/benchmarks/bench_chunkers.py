@@ -0,0 +1,84 @@
+"""
+Benchmark: fixed 500-character windows (what every file type used before)
+versus the chunking strategy picked per file type (markdown, code, rows, text)
+on generated multi-MB documents fed in 64 KB segments like iter_text. Reports
+throughput, chunk sizes in tokens of the embedding model (tiktoken, or the
+estimate offline), chunks cut in the middle of a line and chunks changed by
+inserting one line at 30%:
+
+    python benchmarks/bench_chunkers.py --mb 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from rag.chunkers import get_chunk_token_counter, get_chunker, iter_chunks
+from rag.processing import TEXT_BLOCK_BYTES
+
+WORDS = ('data', 'model', 'report', 'value', 'index', 'system', 'user', 'the', 'of', 'and')
+
+
+def make_documents(target_chars, rng):
+    def words(n):
+        return ' '.join(f"{rng.choice(WORDS)}{rng.randint(0, 99)}" for _ in range(n))
+
+    def build(make_part):
+        parts, size = [], 0
+        while size < target_chars:
+            parts.append(make_part(len(parts)))
+            size += len(parts[-1])
+        return ''.join(parts)
+
+    return {
+        'md': build(lambda i: f"# Chapter {i}\n\n{words(40)}.\n\n## Setup {i}\n\n- {words(8)}\n- {words(8)}\n\n"
+                              f"```js\nfunction step{i}() {{\n  return {i};\n}}\n```\n\n{words(rng.randint(10, 250))}.\n\n"),
+        'js': build(lambda i: f"function handler{i}(req, res) {{\n  const value = req.body.v{i}; // {words(5)}\n"
+                              f"  if (value > {i}) {{\n    return res.json({{ ok: true }});\n  }}\n  return null;\n}}\n\n"),
+        'csv': 'id,name,notes\n' + build(lambda i: f'{i},"{words(2)}","{words(rng.randint(1, 20))}"\n'),
+        'txt': build(lambda i: f"{words(rng.randint(20, 200))}.\n\n"),
+    }
+
+
+def segments(text):
+    return [text[i:i + TEXT_BLOCK_BYTES] for i in range(0, len(text), TEXT_BLOCK_BYTES)]
+
+
+def measure(chunk, text, count_tokens):
+    start = time.perf_counter()
+    chunks = list(chunk(segments(text)))
+    seconds = time.perf_counter() - start
+    tokens = [count_tokens(c) for c in chunks]
+    lines = {line.strip() for line in text.splitlines()}
+    mid_line = sum(1 for c in chunks if c.split('\n')[0].strip() not in lines or c.split('\n')[-1].strip() not in lines)
+    pos = text.index('\n', len(text) * 3 // 10) + 1
+    edited = list(chunk(segments(text[:pos] + 'An inserted line of text.\n' + text[pos:])))
+    return {
+        'mb_s': len(text) / 1e6 / seconds, 'chunks': len(chunks), 'mean': sum(tokens) / len(tokens),
+        'max': max(tokens), 'over': sum(1 for t in tokens if t > Config.CHUNK_MAX_TOKENS),
+        'mid_line': mid_line, 'changed': len(set(edited) - set(chunks)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=float, default=5, help='size of each generated document')
+    args = parser.parse_args()
+
+    count_tokens = get_chunk_token_counter()
+    documents = make_documents(int(args.mb * 1e6), random.Random(5))
+    print(f"CHUNK_MAX_TOKENS={Config.CHUNK_MAX_TOKENS}")
+    print(f"{'':>4} {'chunker':>9} {'MB/s':>6} {'chunks':>7} {'mean tok':>8} {'max tok':>7} {'over':>6} {'mid-line':>8} {'changed':>7}")
+    for ext, text in documents.items():
+        chunker = get_chunker(ext)
+        for name, chunk in (('500 char', iter_chunks), (chunker.name, chunker.iter_chunks)):
+            r = measure(chunk, text, count_tokens)
+            print(f"{ext:>4} {name:>9} {r['mb_s']:6.1f} {r['chunks']:7} {r['mean']:8.0f} {r['max']:7} "
+                  f"{r['over']:6} {r['mid_line']:8} {r['changed']:7}")
+
+
+if __name__ == '__main__':
+    main()
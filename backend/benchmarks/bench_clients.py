@@ -0,0 +1,79 @@
+"""
+Benchmark: per-request client construction vs the shared ClientRegistry.
+
+Each simulated request does one Supabase read and one embeddings call, the
+same work a chat turn does before generation, against local stub servers:
+
+    python benchmarks/bench_clients.py --requests 200 --threads 8
+
+Against the real services the gap is larger still, since every fresh client
+also pays DNS, TCP and TLS setup.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_openai import start_stub_server
+from stub_supabase import start_stub_supabase
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(label, do_request, requests, threads):
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        do_request()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>22}: p50 {percentile(latencies, 50) * 1000:6.1f} ms  "
+          f"p95 {percentile(latencies, 95) * 1000:6.1f} ms  {requests / elapsed:7.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    _, _, openai_url = start_stub_server(dims=64)
+    _, _, supabase_url = start_stub_supabase()
+    os.environ.update({
+        'OPENAI_API_KEY': 'stub', 'OPENAI_BASE_URL': openai_url,
+        'SUPABASE_URL': supabase_url, 'SUPABASE_ANON_KEY': 'stub'
+    })
+
+    from openai import OpenAI
+    from supabase import create_client
+    from clients import init_client_registry
+
+    def fresh_clients():
+        # What every route did before: a new client (and connection) per call
+        supabase = create_client(supabase_url, 'stub')
+        supabase.table('documents').select('*').eq('id', 'missing').execute()
+        OpenAI(api_key='stub', base_url=openai_url).embeddings.create(model='stub', input='hello')
+
+    registry = init_client_registry()
+
+    def pooled_clients():
+        registry.supabase.table('documents').select('*').eq('id', 'missing').execute()
+        registry.openai.embeddings.create(model='stub', input='hello')
+
+    pooled_clients()  # build the registry clients once, as create_app does
+    run('new clients per call', fresh_clients, args.requests, args.threads)
+    run('shared registry', pooled_clients, args.requests, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: /api/document/list page cost with the previous queries (an exact
+count of the table, then select * with an offset) versus the cached count and
+a keyset read of LIST_COLUMNS on (created_at, id).
+
+Query cost is modelled on a SQLite copy of the documents table with the same
+(created_at DESC, id DESC) index, since the Supabase stub scans in Python and
+would not show how Postgres handles OFFSET and COUNT. Round trips and bytes
+per page are measured through the stub:
+
+    python benchmarks/bench_document_list.py --rows 1000000 --per-page 20
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test_chat import free_port, start_stub
+
+COLUMNS = ('id', 'name', 'original_name', 'file_path', 'file_size', 'file_type', 'status', 'content_hash',
+           'created_at', 'updated_at')
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_queries(args, workdir):
+    conn = sqlite3.connect(os.path.join(workdir, 'documents.sqlite3'))
+    conn.execute(f"CREATE TABLE documents ({', '.join(COLUMNS)})")
+    conn.execute("CREATE INDEX idx_documents_created_at_id ON documents(created_at DESC, id DESC)")
+    rows = (
+        (str(uuid.UUID(int=i)), f"report-{i}.pdf", f"report-{i}.pdf", f"uploads/{i}/report-{i}.pdf", 12345 + i, 'pdf',
+         'processed', f"{i:064x}", f"2025-01-01T00:00:{i // 1000:09d}.{i % 1000:03d}", f"2025-01-01T00:00:{i:09d}")
+        for i in range(args.rows)
+    )
+    conn.executemany(f"INSERT INTO documents VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+    conn.commit()
+
+    per_page = args.per_page
+    list_columns = 'id, name, file_size, file_type, file_path, status, created_at'
+    print(f"{args.rows} documents, {per_page} per page: ms per page view")
+    print(f"{'page':>8} {'count(*) + offset':>18} {'cached + keyset':>16}")
+    for page in (1, 100, args.rows // per_page // 2, args.rows // per_page):
+        offset = (page - 1) * per_page
+
+        def old():
+            conn.execute("SELECT COUNT(id) FROM documents").fetchone()
+            conn.execute("SELECT * FROM documents ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                         (per_page, offset)).fetchall()
+
+        # The cursor is the last row of the previous page, which the client already has
+        previous = conn.execute("SELECT created_at, id FROM documents ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?",
+                                (max(offset - 1, 0),)).fetchone()
+
+        def new():
+            if page == 1:
+                conn.execute(f"SELECT {list_columns} FROM documents ORDER BY created_at DESC, id DESC LIMIT ?",
+                             (per_page + 1,)).fetchall()
+            else:
+                conn.execute(f"SELECT {list_columns} FROM documents WHERE created_at <= ? AND (created_at < ? OR id < ?)"
+                             " ORDER BY created_at DESC, id DESC LIMIT ?",
+                             (previous[0], previous[0], previous[1], per_page + 1)).fetchall()
+
+        print(f"{page:>8} {timed(old):>18.2f} {timed(new):>16.2f}")
+    conn.close()
+
+
+def bench_wire(args):
+    supabase_stub, supabase_url = start_stub('stub_supabase.py', free_port())
+    try:
+        os.environ.update(SUPABASE_URL=supabase_url, SUPABASE_ANON_KEY='stub',
+                          DOCUMENT_COUNT_PATH=os.path.join(tempfile.mkdtemp(prefix='document-count-'), 'count.sqlite3'))
+        from sb.database_service import DocumentService
+        service = DocumentService()
+        service.create_documents([
+            {'name': f"report-{i}.pdf", 'original_name': f"report-{i}.pdf", 'file_path': f"uploads/{i}/report-{i}.pdf",
+             'file_size': 12345 + i, 'file_type': 'pdf', 'status': 'processed', 'content_hash': f"{i:064x}"}
+            for i in range(200)
+        ])
+        old = service.supabase.table(service.table).select('*').order('created_at', desc=True).range(0, args.per_page - 1).execute()
+        new = service.get_documents_paginated(1, args.per_page)
+        print(f"Supabase response per page: select * {len(json.dumps(old.data))} B in 2 requests, "
+              f"LIST_COLUMNS {len(json.dumps(new['documents']))} B in 1 request (count cached)")
+    finally:
+        supabase_stub.terminate()
+        supabase_stub.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--per-page', type=int, default=20)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix='document-list-')
+    try:
+        bench_queries(args, workdir)
+        bench_wire(args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark: single-request embedding vs the batched, concurrent EmbeddingEngine,
+both against the local stub server (no network or API key needed).
+
+    python benchmarks/bench_embeddings.py --chunks 5000 --latency 0.2 --fail-rate 0.05
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+from rag.embeddings import EmbeddingEngine
+from stub_openai import start_stub_server, fake_embedding
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub seconds per request')
+    parser.add_argument('--fail-rate', type=float, default=0.05)
+    parser.add_argument('--batch-items', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    chunks = [f"chunk {i}: " + ("lorem ipsum dolor sit amet " * 18) for i in range(args.chunks)]
+    server, state, base_url = start_stub_server(dims=64, latency=args.latency, fail_rate=0.0, max_items=2048)
+    client = OpenAI(api_key='stub', base_url=base_url, max_retries=0)
+
+    # Old behaviour: everything in one request (rejected once over the input limit)
+    start = time.perf_counter()
+    try:
+        client.embeddings.create(model='stub', input=chunks)
+        print(f"single request: {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"single request: failed ({e.__class__.__name__})")
+
+    state.fail_rate = args.fail_rate
+    engine = EmbeddingEngine(client=client, model='text-embedding-3-small',
+                             max_batch_items=args.batch_items, concurrency=args.concurrency)
+    before = state.requests
+    start = time.perf_counter()
+    vectors = engine.embed(chunks)
+    elapsed = time.perf_counter() - start
+    batches = len(engine.plan_batches(chunks))
+    print(f"engine: {elapsed:.2f}s for {len(chunks)} chunks in {batches} batches "
+          f"({state.requests - before} requests, {state.failures} injected failures retried)")
+    print(f"throughput: {len(chunks) / elapsed:.0f} chunks/s")
+
+    in_order = all(vectors[i] == fake_embedding(chunks[i], 64) for i in range(0, len(chunks), max(1, len(chunks) // 50)))
+    print(f"order preserved: {in_order}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
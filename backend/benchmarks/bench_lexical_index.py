@@ -0,0 +1,94 @@
+"""
+Benchmark: BM25 query latency of the lexical index on synthetic chunks with a
+Zipf-distributed vocabulary plus identifier-like tokens (error codes, table
+names), and the cost of incremental inserts on top of the merged segment.
+
+    python benchmarks/bench_lexical_index.py --chunks 1000000
+"""
+import argparse
+import os
+import sys
+import shutil
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.lexical_index import LexicalIndex
+
+
+def make_words(rng, vocabulary):
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    return [''.join(rng.choice(letters, rng.integers(3, 10))) for _ in range(vocabulary)]
+
+
+def make_chunks(rng, words, identifiers, count, length, offset):
+    ranks = np.minimum(rng.zipf(1.2, size=(count, length)) - 1, len(words) - 1)
+    chunks = []
+    for i, row in enumerate(ranks):
+        text = ' '.join(words[r] for r in row)
+        if i % 50 == 0:
+            text += ' ' + identifiers[(offset + i) % len(identifiers)]
+        chunks.append({'id': str(offset + i), 'document_id': f'doc-{(offset + i) // 100}', 'chunk_index': i, 'content': text})
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=1000000)
+    parser.add_argument('--length', type=int, default=60, help='words per chunk')
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    words = make_words(rng, args.vocabulary)
+    identifiers = [f"ERR-{code}" for code in range(1000, 3000)] + [f"public.table_{i}" for i in range(2000)]
+    path = tempfile.mkdtemp(prefix='lexical-index-')
+    try:
+        index = LexicalIndex(path)
+        start = time.perf_counter()
+        for offset in range(0, args.chunks, 20000):
+            index.add(make_chunks(rng, words, identifiers, min(20000, args.chunks - offset), args.length, offset), merge=False)
+        loaded = time.perf_counter() - start
+        start = time.perf_counter()
+        index.merge()
+        print(f"build: {loaded:.1f}s load + {time.perf_counter() - start:.1f}s merge for {args.chunks} chunks")
+
+        # Queries: a few ordinary words (Zipf ranks 10..5000), sometimes with an identifier
+        queries = []
+        for i in range(args.queries):
+            picked = [words[r] for r in rng.integers(10, min(5000, args.vocabulary), rng.integers(2, 6))]
+            if i % 3 == 0:
+                picked.append(identifiers[rng.integers(len(identifiers))])
+            queries.append(' '.join(picked))
+        queries += [identifiers[rng.integers(len(identifiers))] for _ in range(args.queries // 3)]
+        index.search(queries[0])  # load the segment
+
+        def measure(label):
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, top_k=20)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+            print(f"{label:>22}: mean {sum(latencies) * 1000 / len(latencies):.2f} ms  "
+                  f"p50 {pct(50):.2f} ms  p95 {pct(95):.2f} ms  p99 {pct(99):.2f} ms")
+
+        measure('merged segment')
+
+        # Incremental inserts land in the delta until the next merge
+        start = time.perf_counter()
+        extra = make_chunks(rng, words, identifiers, 5000, args.length, args.chunks)
+        for i in range(0, len(extra), 100):
+            index.add(extra[i:i + 100])
+        print(f"insert: {(time.perf_counter() - start) * 1000 / 50:.1f} ms per 100-chunk batch")
+        index.search(queries[0])
+        measure('segment + 5k delta')
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: sequential PNG round-trip OCR vs the process-pool OCR engine.
+
+Builds a synthetic image-only PDF (text pages rasterised and re-embedded as
+images, so there is no text layer) and OCRs it both ways.
+
+    python benchmarks/bench_ocr.py --pages 12 --workers 4 --dpi 300
+"""
+import argparse
+import io
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from PIL import Image
+import pytesseract
+from rag.processing import ocr_pdf_from_bytes_pymupdf
+
+SAMPLE_TEXT = (
+    "This Services Agreement is entered into by and between the parties listed below. "
+    "The Supplier shall deliver the services described in Schedule A within thirty days. "
+    "Payment terms are net forty-five days from the date of a valid invoice. "
+)
+
+
+def build_scanned_pdf(pages, scan_dpi=150):
+    """Create an image-only PDF with `pages` pages of rasterised text"""
+    out = fitz.open()
+    for i in range(pages):
+        src = fitz.open()
+        page = src.new_page()
+        body = f"Page {i + 1}\n\n" + (SAMPLE_TEXT * 12)
+        page.insert_textbox(fitz.Rect(54, 54, 558, 738), body, fontsize=11)
+        pix = page.get_pixmap(dpi=scan_dpi)
+        scanned = out.new_page(width=page.rect.width, height=page.rect.height)
+        scanned.insert_image(scanned.rect, stream=pix.tobytes("png"))
+        src.close()
+    data = out.tobytes()
+    out.close()
+    return data
+
+
+def legacy_ocr(pdf_bytes, dpi):
+    """The original implementation: one page at a time, PNG encode + decode"""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    text = ""
+    for i, page in enumerate(doc, start=1):
+        pix = page.get_pixmap(dpi=dpi)
+        img = Image.open(io.BytesIO(pix.tobytes("png")))
+        page_text = pytesseract.image_to_string(img, lang="eng")
+        text += f"\n--- OCR Page {i} ---\n{page_text}"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--dpi', type=int, default=300)
+    args = parser.parse_args()
+
+    pdf_bytes = build_scanned_pdf(args.pages)
+    print(f"Synthetic scanned PDF: {args.pages} pages, {len(pdf_bytes) / 1024:.0f} KB")
+
+    start = time.perf_counter()
+    legacy_text = legacy_ocr(pdf_bytes, args.dpi)
+    legacy_time = time.perf_counter() - start
+    print(f"sequential (PNG round-trip): {legacy_time:.2f}s  ({legacy_time / args.pages:.2f}s/page)")
+
+    # Warm the pool so process start-up is not counted against the engine
+    ocr_pdf_from_bytes_pymupdf(build_scanned_pdf(1), dpi=72, max_workers=args.workers)
+
+    start = time.perf_counter()
+    pooled_text = ocr_pdf_from_bytes_pymupdf(pdf_bytes, dpi=args.dpi, max_workers=args.workers)
+    pooled_time = time.perf_counter() - start
+    print(f"process pool ({args.workers} workers, raw samples): {pooled_time:.2f}s  ({pooled_time / args.pages:.2f}s/page)")
+    print(f"speed-up: {legacy_time / pooled_time:.1f}x")
+
+    markers = [f"--- OCR Page {i} ---" for i in range(1, args.pages + 1)]
+    positions = [pooled_text.find(m) for m in markers]
+    print(f"page order preserved: {positions == sorted(positions) and -1 not in positions}")
+    print(f"output size: legacy {len(legacy_text)} chars, pooled {len(pooled_text)} chars")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: prompt size over a long chat session with the previous assembly
+(top-5 chunks joined as-is, the whole client chat_history appended) versus
+PromptBudget. Retrieved chunks come from real chunker output, so neighbours
+overlap and some turns retrieve the same passage twice. Token counts use the
+chat model's tokenizer (or the offline estimate):
+
+    python benchmarks/bench_prompt_budget.py --turns 100
+"""
+import argparse
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routes.chat import SYSTEM_PROMPT
+from rag.chunkers import get_chunker
+from rag.prompt_budget import PromptBudget
+
+WORDS = ('policy', 'refund', 'account', 'invoice', 'the', 'customer', 'within', 'days', 'support', 'plan')
+
+
+def old_build(user_message, chat_history, relevant_chunks):
+    context = "\n\n".join(chunk['content'] for chunk in relevant_chunks)
+    messages = [{"role": "system", "content": SYSTEM_PROMPT.format(context=context)}]
+    messages += [{"role": msg.get("role", "user"), "content": msg.get("content", "")} for msg in chat_history]
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=100)
+    parser.add_argument('--answer-words', type=int, default=180, help='length of each assistant reply')
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+
+    def words(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+    documents = []
+    for doc in range(20):
+        text = ' '.join(f"{words(rng.randint(8, 25))}." for _ in range(300))
+        documents.append([
+            {'id': f"{doc}-{idx}", 'document_id': str(doc), 'chunk_index': idx, 'content': content}
+            for idx, content in enumerate(get_chunker('txt').iter_chunks([text]))
+        ])
+
+    def retrieve():
+        # Top-5 usually clusters: a hit, its neighbours, and a hit from another document
+        doc = rng.choice(documents)
+        at = rng.randrange(len(doc) - 3)
+        other = rng.choice(documents)
+        chunks = doc[at:at + 3] + [rng.choice(other), doc[at + 1]]
+        rng.shuffle(chunks)
+        return chunks
+
+    budget = PromptBudget()
+    count = budget.count_tokens
+    history = []
+    old_total = new_total = 0
+    old_seconds = new_seconds = 0.0
+    print(f"budget {budget.max_tokens} tokens (context {budget.context_tokens}, history {budget.history_tokens})")
+    print(f"{'turn':>5} {'old tokens':>11} {'new tokens':>11} {'chunks sent':>12} {'history kept':>13}")
+    for turn in range(1, args.turns + 1):
+        question = f"What does the {rng.choice(WORDS)} section say about {words(6)}?"
+        chunks = retrieve()
+
+        start = time.perf_counter()
+        old_messages = old_build(question, history, chunks)
+        old_seconds += time.perf_counter() - start
+        old_tokens = sum(budget.count_message(msg['content']) for msg in old_messages)
+
+        start = time.perf_counter()
+        messages, used, prompt = budget.build(SYSTEM_PROMPT, question, history, chunks)
+        new_seconds += time.perf_counter() - start
+        assert prompt['total'] == sum(budget.count_message(msg['content']) for msg in messages)
+        assert prompt['total'] <= budget.max_tokens * 1.02, prompt
+
+        old_total += old_tokens
+        new_total += prompt['total']
+        if turn in (1, 5, 10, 25, 50, 100) or turn == args.turns:
+            print(f"{turn:>5} {old_tokens:>11} {prompt['total']:>11} {len(used):>9}/{len(chunks)} "
+                  f"{prompt['history_messages']['kept']:>8}/{len(history)}")
+        history += [{"role": "user", "content": question},
+                    {"role": "assistant", "content": f"{words(args.answer_words)}."}]
+
+    print(f"total prompt tokens over {args.turns} turns: old {old_total}, budgeted {new_total} "
+          f"({new_total / old_total:.0%}); assembly {old_seconds * 1000 / args.turns:.2f} ms vs "
+          f"{new_seconds * 1000 / args.turns:.2f} ms per turn (token counting included)")
+
+
+if __name__ == '__main__':
+    main()
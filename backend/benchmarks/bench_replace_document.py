@@ -0,0 +1,101 @@
+"""
+Benchmark: replacing a document through the chunk-hash diff
+(run_replace_pipeline) versus deleting its chunks and re-ingesting the new
+version, for a few typical edits, against the local OpenAI and Supabase stubs
+(embedding cache off, so every embedded chunk is an API input):
+
+    python benchmarks/bench_replace_document.py --kb 500 --latency 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from load_test_chat import start_stub
+
+
+def make_text(rng, kb):
+    words = [''.join(rng.choice('abcdefghijklmnop') for _ in range(rng.randint(2, 9))) for _ in range(5000)]
+
+    def paragraph():
+        return ' '.join(
+            ' '.join(rng.choice(words) for _ in range(rng.randint(5, 20))) + rng.choice('.!?')
+            for _ in range(rng.randint(1, 8))
+        )
+
+    paragraphs = []
+    while sum(map(len, paragraphs)) < kb * 1024:
+        paragraphs.append(paragraph())
+    return paragraphs, paragraph
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kb', type=int, default=500, help='document size')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per stub request')
+    args = parser.parse_args()
+
+    openai_proc, openai_url = start_stub('stub_openai.py', 8094, '--latency', args.latency)
+    supabase_proc, supabase_url = start_stub('stub_supabase.py', 8095, '--latency', args.latency)
+    os.environ.update(
+        OPENAI_BASE_URL=f"{openai_url}/v1", OPENAI_API_KEY='stub',
+        SUPABASE_URL=supabase_url, SUPABASE_ANON_KEY='stub', EMBEDDING_CACHE_ENABLED='False'
+    )
+    from sb.database_service import DocumentService
+    from rag.processing import run_rag_pipeline, run_replace_pipeline
+
+    rng = random.Random(7)
+    paragraphs, paragraph = make_text(rng, args.kb)
+    middle = len(paragraphs) // 2
+    edits = {
+        'fix 3 typos': None,
+        'insert a paragraph': paragraphs[:middle] + [paragraph()] + paragraphs[middle:],
+        'rewrite 5% of paragraphs': [paragraph() if rng.random() < 0.05 else p for p in paragraphs],
+        'drop the first 10%': paragraphs[len(paragraphs) // 10:],
+    }
+    typos = list('\n\n'.join(paragraphs))
+    for position in rng.sample(range(len(typos)), 3):
+        typos[position] = 'z' if typos[position].isalpha() else typos[position]
+    original = '\n\n'.join(paragraphs)
+
+    workdir = tempfile.mkdtemp(prefix='replace-bench-')
+    db_service = DocumentService()
+    try:
+        def write(name, text):
+            path = os.path.join(workdir, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            return path
+
+        print(f"{len(original) // 1024} KB document, {args.latency * 1000:.0f} ms per stub request")
+        print(f"{'edit':>26}  {'full re-ingest':>22}  {'diff replace':>36}")
+        for name, edited in edits.items():
+            text = ''.join(typos) if edited is None else '\n\n'.join(edited)
+            new_path = write('new.txt', text)
+            document = db_service.create_document({'name': 'bench.txt', 'original_name': 'bench.txt',
+                                                   'file_path': 'bench.txt', 'file_size': 0, 'file_type': 'TXT'})
+            run_rag_pipeline(db_service, document['id'], write('old.txt', original), 'TXT')
+
+            start = time.perf_counter()
+            counts = run_replace_pipeline(db_service, document['id'], new_path, 'TXT')
+            replace_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            db_service.delete_document_chunks(document['id'])
+            embedded = run_rag_pipeline(db_service, document['id'], new_path, 'TXT')
+            full_seconds = time.perf_counter() - start
+            db_service.delete_document(document['id'])
+
+            print(f"{name:>26}  {embedded:5d} chunks {full_seconds:7.2f}s  "
+                  f"{counts['added']:5d} added {counts['removed']:4d} removed {counts['kept']:5d} kept {replace_seconds:6.2f}s")
+    finally:
+        openai_proc.kill()
+        supabase_proc.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: handling one multipart upload the old way (Werkzeug spools the part
+to a temp file, get_file_size seeks it twice, file.save copies it to
+UPLOAD_FOLDER, extraction reads it back) versus UploadRequest streaming the
+part straight to UPLOAD_FOLDER while sizing, hashing and sniffing it, and text
+extraction decoding from a memory map. Includes an upload over MAX_FILE_SIZE,
+which the streamed path rejects once the limit is crossed:
+
+    python benchmarks/bench_upload.py --mb 40
+"""
+import argparse
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.test import EnvironBuilder
+from config import Config
+from app.uploads import UploadRequest
+from rag.processing import iter_text
+
+
+def old_iter_text(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            block = f.read(64 * 1024)
+            if not block:
+                break
+            yield block
+
+
+def make_apps(upload_dir):
+    old = Flask('old')
+
+    @old.route('/upload', methods=['POST'])
+    def old_upload():
+        file = request.files['file']
+        file.seek(0, 2)
+        size = file.tell()
+        file.seek(0)
+        if size > Config.MAX_FILE_SIZE:
+            return jsonify({"error": "File too large"}), 400
+        path = os.path.join(upload_dir, file.filename)
+        file.seek(0, 2)  # save_upload sized it again
+        file.seek(0)
+        file.save(path)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:  # what content hashing needed on top
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return jsonify({"chars": sum(map(len, old_iter_text(path)))}), 200
+
+    new = Flask('new')
+    new.request_class = UploadRequest
+
+    @new.route('/upload', methods=['POST'])
+    def new_upload():
+        try:
+            file = request.files['file']
+        except RequestEntityTooLarge:
+            return jsonify({"error": "File too large"}), 400
+        file.stream.kept = True
+        file.stream.content_hash
+        return jsonify({"chars": sum(map(len, iter_text(file.stream.full_path, 'TXT')))}), 200
+
+    return old, new
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=int, default=40, help='size of the accepted upload')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    line = b'The quick brown fox jumps over the lazy dog, again and again.\n'
+    accepted = line * (args.mb * 1024 * 1024 // len(line))
+    rejected = line * ((Config.MAX_FILE_SIZE * 2) // len(line))
+    upload_dir = tempfile.mkdtemp(prefix='upload-bench-')
+    Config.UPLOAD_FOLDER = upload_dir  # absolute, so UploadStream writes here too
+    old, new = make_apps(upload_dir)
+    # Encoded once, so the timings are the server side only
+    bodies = []
+    for data in (accepted, rejected):
+        environ = EnvironBuilder(method='POST', data={'file': (io.BytesIO(data), 'doc.txt')}).get_environ()
+        bodies.append((environ['CONTENT_TYPE'], environ['wsgi.input'].read()))
+    try:
+        print(f"{'':>10}  {f'{len(accepted) >> 20} MB accepted':>18}  {f'{len(rejected) >> 20} MB rejected':>18}")
+        for name, app in (('old', old), ('streamed', new)):
+            client = app.test_client()
+            timings = []
+            for content_type, body in bodies:
+                best = float('inf')
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    response = client.post('/upload', data=body, content_type=content_type)
+                    best = min(best, time.perf_counter() - start)
+                    for entry in os.listdir(upload_dir):
+                        os.remove(os.path.join(upload_dir, entry))
+                timings.append(f"{best * 1000:8.0f} ms ({response.status_code})")
+            print(f"{name:>10}  {timings[0]:>18}  {timings[1]:>18}")
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
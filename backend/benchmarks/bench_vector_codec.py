@@ -0,0 +1,96 @@
+"""
+Benchmark: cost of sending embeddings to Supabase as pgvector text versus
+packed float32/float16 buffers (encode time and request bytes per chunk), and
+the retrieval accuracy kept by float16 storage and by the int8 / binary local
+copies with exact rescoring.
+
+    python benchmarks/bench_vector_codec.py --dims 1536 --rows 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.vector_codec import (
+    format_pgvector, pack_vectors, unpack_vector, quantize_int8, quantize_binary, int8_scores, hamming_scores
+)
+from bench_vector_index import clustered_vectors
+
+
+def top_rows(scores, k):
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dims', type=int, default=1536)
+    parser.add_argument('--chunks', type=int, default=1000, help='chunks encoded for the transfer measurements')
+    parser.add_argument('--rows', type=int, default=50000, help='corpus size for the accuracy measurements')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--rerank', type=int, nargs='+', default=[4, 10, 20])
+    parser.add_argument('--noise', type=float, default=2.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    centers = rng.standard_normal((500, args.dims)).astype(np.float32)
+
+    # Transfer: what insert_document_chunks does per batch, and the JSON body it produces
+    batch = clustered_vectors(rng, centers, args.chunks, args.noise)
+    as_lists = batch.tolist()  # what the embedding engine hands over
+    print(f"{'encoding':>10}  {'encode us/chunk':>15}  {'bytes/chunk':>11}  {'max abs error':>13}")
+    for encoding in ('text', 'float32', 'float16'):
+        start = time.perf_counter()
+        if encoding == 'text':
+            encoded = [format_pgvector(vector) for vector in as_lists]
+        else:
+            encoded = pack_vectors(as_lists, encoding)
+        elapsed = time.perf_counter() - start
+        size = sum(len(json.dumps({'embedding': value})) for value in encoded) / len(encoded)
+        if encoding == 'text':
+            decoded = np.array([json.loads(value) for value in encoded], dtype=np.float32)
+        else:
+            decoded = np.array([unpack_vector(value, encoding) for value in encoded])
+        print(f"{encoding:>10}  {elapsed * 1e6 / len(encoded):15.1f}  {size:11.0f}  {np.abs(decoded - batch).max():13.2e}")
+
+    # Accuracy: exact float32 search is the reference
+    corpus = clustered_vectors(rng, centers, args.rows, args.noise)
+    queries = clustered_vectors(rng, centers, args.queries, args.noise)
+    k = args.top_k
+    truth = [set(top_rows(corpus @ query, k)) for query in queries]
+
+    def recall(search):
+        hits = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, truth):
+            hits += len(expected & set(search(query)))
+        return hits / (len(truth) * k), (time.perf_counter() - start) * 1000 / len(queries)
+
+    print(f"\naccuracy over {args.rows} x {args.dims} (exhaustive scan, recall@{k} against float32)")
+    half = corpus.astype(np.float16).astype(np.float32)
+    value, ms = recall(lambda query: top_rows(half @ query, k))
+    print(f"{'float16 storage':>22}: recall {value:.3f}  {ms:6.2f} ms/query")
+
+    codes, scales = quantize_int8(corpus)
+    bits = quantize_binary(corpus)
+    print(f"{'':>22}  memory: float32 {corpus.nbytes >> 20} MB, int8 {(codes.nbytes + scales.nbytes) >> 20} MB, "
+          f"binary {bits.nbytes >> 20} MB")
+    for rerank in args.rerank:
+        shortlist = k * rerank
+
+        def rescored(approximate, query):
+            candidates = np.argpartition(-approximate, shortlist - 1)[:shortlist]
+            return candidates[top_rows(corpus[candidates] @ query, k)]
+
+        value, ms = recall(lambda query: rescored(int8_scores(codes, scales, query), query))
+        print(f"{f'int8 rerank={rerank}':>22}: recall {value:.3f}  {ms:6.2f} ms/query")
+        value, ms = recall(lambda query: rescored(hamming_scores(bits, query), query))
+        print(f"{f'binary rerank={rerank}':>22}: recall {value:.3f}  {ms:6.2f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
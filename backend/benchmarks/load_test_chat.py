@@ -0,0 +1,203 @@
+"""
+Load test: concurrent /api/chat/chat requests against the ASGI app (uvicorn)
+and, for comparison, the threaded WSGI app (gunicorn gthread), both talking to
+local OpenAI/Supabase stubs (each in its own process) with simulated network
+latency. With threads, throughput is capped at threads / upstream latency;
+the ASGI path is capped by ASYNC_HTTP_POOL_MAX_CONNECTIONS and CPU instead.
+
+    python benchmarks/load_test_chat.py --requests 1000 --concurrency 300
+    python benchmarks/load_test_chat.py --openai-latency 0.1 --wsgi-threads 32
+    python benchmarks/load_test_chat.py --target asgi --stream
+
+Every request uses a distinct question so the query/retrieval caches do not
+short-circuit the pipeline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(script, port, *args):
+    """Run a stub in its own process so it does not share a GIL with the load generator"""
+    cmd = [sys.executable, os.path.join(BENCH_DIR, script), '--port', str(port), *map(str, args)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{script} did not start")
+
+
+def start_server(target, port, env, wsgi_threads):
+    if target == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port), '--log-level', 'warning']
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', '-w', '1', '-k', 'gthread', '--threads', str(wsgi_threads),
+               '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'wsgi:app']
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/api/chat/metrics', timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{target} server did not start")
+
+
+async def read_response(reader, on_body=None):
+    """Read one HTTP/1.1 response (Content-Length or chunked) and return its status"""
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            data = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            if on_body:
+                on_body()
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+        if on_body:
+            on_body()
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def run_load(port, requests, concurrency, stream):
+    """
+    `concurrency` keep-alive connections issuing requests back to back. Uses
+    raw asyncio streams rather than httpx so the load generator's own
+    connection-pool overhead does not compete with the server for CPU.
+    """
+    latencies = []
+    first_events = []
+    errors = 0
+    in_flight = 0
+    peak = 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors, in_flight, peak
+        reader = writer = None
+        for i in queue:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            started = time.perf_counter()
+            first = []
+            body = json.dumps({'message': f'load test question {i}: what is in the handbook?', 'stream': stream}).encode()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(b'POST /api/chat/chat HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                             b'Content-Type: application/json\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+                await writer.drain()
+                status, keep_alive = await read_response(
+                    reader, lambda: first or first.append(time.perf_counter() - started))
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                    first_events.extend(first)
+                else:
+                    errors += 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors += 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+            finally:
+                in_flight -= 1
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    first_events.sort()
+    pct = lambda values, p: values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 if values else float('nan')
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': pct(latencies, 50), 'p95': pct(latencies, 95), 'p99': pct(latencies, 99),
+        'first_event_p50': pct(first_events, 50),
+        'errors': errors, 'peak_in_flight': peak, 'elapsed': elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--target', choices=['asgi', 'wsgi', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=300)
+    parser.add_argument('--wsgi-threads', type=int, default=16)
+    parser.add_argument('--openai-latency', type=float, default=1.0, help='stub seconds per embeddings/chat call')
+    parser.add_argument('--supabase-latency', type=float, default=0.03)
+    parser.add_argument('--stream', action='store_true')
+    args = parser.parse_args()
+
+    openai_stub, openai_url = start_stub('stub_openai.py', free_port(), '--dims', 64, '--latency', args.openai_latency)
+    supabase_stub, supabase_url = start_stub('stub_supabase.py', free_port(), '--latency', args.supabase_latency)
+    cache_dir = tempfile.mkdtemp(prefix='load-test-')
+    env = dict(os.environ,
+               OPENAI_API_KEY='stub', OPENAI_BASE_URL=openai_url,
+               SUPABASE_URL=supabase_url, SUPABASE_ANON_KEY='stub',
+               EMBEDDING_CACHE_PATH=os.path.join(cache_dir, 'embeddings.sqlite3'),
+               CORPUS_VERSION_PATH=os.path.join(cache_dir, 'corpus_version.sqlite3'))
+
+    targets = ['asgi', 'wsgi'] if args.target == 'both' else [args.target]
+    try:
+        for target in targets:
+            port = free_port()
+            proc = start_server(target, port, env, args.wsgi_threads)
+            try:
+                result = asyncio.run(run_load(port, args.requests, args.concurrency, args.stream))
+            finally:
+                proc.terminate()
+                proc.wait()
+            label = target if target == 'asgi' else f'wsgi ({args.wsgi_threads} threads)'
+            print(f"{label:>18}: {result['throughput']:7.1f} chats/s  p50 {result['p50']:7.1f} ms  "
+                  f"p95 {result['p95']:7.1f} ms  p99 {result['p99']:7.1f} ms  "
+                  f"errors {result['errors']}  peak in-flight {result['peak_in_flight']}"
+                  + (f"  first event p50 {result['first_event_p50']:.1f} ms" if args.stream else ''))
+    finally:
+        for stub in (openai_stub, supabase_stub):
+            stub.terminate()
+            stub.wait()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
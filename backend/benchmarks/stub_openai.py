@@ -0,0 +1,209 @@
+"""
+Minimal local stand-in for the OpenAI embeddings and chat completions APIs.
+
+Embeddings are deterministic vectors derived from a hash of each input (or,
+with --semantic, the sum of per-word vectors, so paraphrases sharing most of
+their words come out close); chat completions echo a canned answer, optionally
+streamed token by token. Latency
+and injected 429/500 failures let batching, concurrency, retries and streaming
+be exercised without network access:
+
+    python benchmarks/stub_openai.py --port 8089 --latency 0.05 --fail-rate 0.1
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub python main.py
+"""
+import argparse
+import base64
+import functools
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(text, dims):
+    """Deterministic unit-length vector for `text`"""
+    values = []
+    counter = 0
+    while len(values) < dims:
+        digest = hashlib.sha256(f"{counter}:{text}".encode('utf-8')).digest()
+        values.extend(v / 2 ** 31 for v in struct.unpack('<8i', digest))
+        counter += 1
+    values = values[:dims]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+@functools.lru_cache(maxsize=65536)
+def word_embedding(word, dims):
+    return fake_embedding(word, dims)
+
+
+def semantic_embedding(text, dims):
+    """Unit-length sum of per-word vectors: cosine similarity tracks word overlap"""
+    values = [0.0] * dims
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        values = [v + w for v, w in zip(values, word_embedding(word, dims))]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+class StubState:
+    def __init__(self, dims=1536, latency=0.0, fail_rate=0.0, max_items=2048, token_latency=0.0, semantic=False):
+        self.dims = dims
+        self.embed = semantic_embedding if semantic else fake_embedding
+        self.latency = latency
+        self.token_latency = token_latency
+        self.fail_rate = fail_rate
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.inputs = 0
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 1024  # hundreds of concurrent clients in load tests
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # headers and body are separate writes on keep-alive connections
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if self.path.endswith('/chat/completions'):
+                return self._chat(payload)
+            if not self.path.endswith('/embeddings'):
+                return self._send(404, {'error': {'message': 'not found'}})
+
+            inputs = payload.get('input', [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            with state.lock:
+                state.requests += 1
+                fail = random.random() < state.fail_rate
+                if fail:
+                    state.failures += 1
+                else:
+                    state.inputs += len(inputs)
+            if state.latency:
+                time.sleep(state.latency)
+            if fail:
+                status = random.choice([429, 500])
+                return self._send(status, {'error': {'message': 'injected failure', 'type': 'stub'}},
+                                  {'Retry-After': '0.05'} if status == 429 else None)
+            if len(inputs) > state.max_items:
+                return self._send(400, {'error': {'message': f'too many inputs ({len(inputs)})'}})
+
+            # The SDK asks for base64 (little-endian float32) unless told otherwise, like the real API
+            packed = payload.get('encoding_format') == 'base64'
+            data = [
+                {
+                    'object': 'embedding',
+                    'index': idx,
+                    'embedding': base64.b64encode(struct.pack(f'<{state.dims}f', *vector)).decode('ascii') if packed else vector
+                }
+                for idx, vector in enumerate(state.embed(text, state.dims) for text in inputs)
+            ]
+            self._send(200, {
+                'object': 'list',
+                'data': data,
+                'model': payload.get('model', 'stub'),
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0}
+            })
+
+        def _chat(self, payload):
+            with state.lock:
+                state.requests += 1
+            if state.latency:
+                time.sleep(state.latency)
+            question = payload.get('messages', [{}])[-1].get('content', '')
+            tokens = [f"{word} " for word in f"Stub answer to: {question}".split()]
+            usage = {'prompt_tokens': sum(len(m.get('content', '')) // 4 for m in payload.get('messages', [])),
+                     'completion_tokens': len(tokens)}
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+            base = {'id': 'chatcmpl-stub', 'created': int(time.time()), 'model': payload.get('model', 'stub')}
+
+            if not payload.get('stream'):
+                time.sleep(state.token_latency * len(tokens))
+                return self._send(200, {**base, 'object': 'chat.completion', 'usage': usage, 'choices': [{
+                    'index': 0, 'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)}
+                }]})
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            def emit(data):
+                body = f"data: {data}\n\n".encode('utf-8')
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                self.wfile.flush()
+
+            for idx, token in enumerate(tokens):
+                time.sleep(state.token_latency)
+                emit(json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [{
+                    'index': 0, 'delta': {'content': token} if idx else {'role': 'assistant', 'content': token},
+                    'finish_reason': None
+                }]}))
+            emit(json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [{
+                'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}))
+            if (payload.get('stream_options') or {}).get('include_usage'):
+                emit(json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage}))
+            emit('[DONE]')
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_stub_server(port=0, **kwargs):
+    """Start the stub in a background thread; returns (server, state, base_url)"""
+    state = StubState(**kwargs)
+    server = StubHTTPServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--dims', type=int, default=1536)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--token-latency', type=float, default=0.0, help='seconds per streamed chat token')
+    parser.add_argument('--semantic', action='store_true', help='word-overlap embeddings instead of pure hashes')
+    args = parser.parse_args()
+    server, _, base_url = start_stub_server(args.port, dims=args.dims, latency=args.latency,
+                                            fail_rate=args.fail_rate, token_latency=args.token_latency,
+                                            semantic=args.semantic)
+    print(f"Stub OpenAI API on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+Minimal in-memory stand-in for the Supabase REST (PostgREST) API.
+
+Supports what DocumentService uses: select with eq/in/lt/lte/gt/gte filters and
+or/and trees, order, limit and range, insert/upsert, update, delete,
+`count=exact`, and the match_documents / match_documents_batch /
+truncate_all_documents / insert_document_chunks_packed /
+reorder_document_chunks RPCs. Optional per-request latency simulates a remote
+database, a body size limit answers 413 like an API gateway, and a failure rate answers 503 for a
+fraction of writes after applying them (a lost response):
+
+    python benchmarks/stub_supabase.py --port 8090 --latency 0.02
+    SUPABASE_URL=http://127.0.0.1:8090 SUPABASE_ANON_KEY=stub python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+
+class StubDatabase:
+    def __init__(self, latency=0.0, max_body_bytes=0, fail_rate=0.0):
+        self.latency = latency
+        self.max_body_bytes = max_body_bytes
+        self.fail_rate = fail_rate
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.requests = 0
+
+    def rows(self, table):
+        return self.tables.setdefault(table, [])
+
+
+def _split_top_level(text):
+    """Split a PostgREST logic tree body on commas outside parentheses and quotes"""
+    parts, current, depth, quoted = [], '', 0, False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch in '()':
+            depth += 1 if ch == '(' else -1
+        elif not quoted and ch == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        current += ch
+    return parts + [current]
+
+
+def _matches_tree(row, operator, body):
+    """or=(...) / and=(...) filters, nested like and(a.eq.1,b.lt.2)"""
+    results = []
+    for part in _split_top_level(body):
+        if part.startswith(('and(', 'or(')):
+            name, _, inner = part.partition('(')
+            results.append(_matches_tree(row, name, inner[:-1]))
+        else:
+            column, _, expression = part.partition('.')
+            op, _, value = expression.partition('.')
+            results.append(_matches(row, [(column, op + '.' + value.strip('"'))]))
+    return any(results) if operator == 'or' else all(results)
+
+
+def _matches(row, filters):
+    for column, expression in filters:
+        if column in ('or', 'and'):
+            if not _matches_tree(row, column, expression[1:-1]):
+                return False
+            continue
+        op, _, value = expression.partition('.')
+        current = row.get(column)
+        if op == 'eq' and str(current) != value:
+            return False
+        if op == 'neq' and str(current) == value:
+            return False
+        if op == 'in' and str(current) not in [v.strip('"') for v in value.strip('()').split(',')]:
+            return False
+        if op == 'lt' and not (current is not None and str(current) < value):
+            return False
+        if op == 'gt' and not (current is not None and str(current) > value):
+            return False
+        if op == 'lte' and not (current is not None and str(current) <= value):
+            return False
+        if op == 'gte' and not (current is not None and str(current) >= value):
+            return False
+    return True
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 1024  # hundreds of concurrent clients in load tests
+
+
+def make_handler(db):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # headers and body are separate writes on keep-alive connections
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if not getattr(self, 'head_only', False):
+                self.wfile.write(body)
+
+        def _request(self):
+            with db.lock:
+                db.requests += 1
+            if db.latency:
+                time.sleep(db.latency)
+            parts = urlsplit(self.path)
+            path = parts.path.split('/rest/v1/', 1)[-1]
+            params = parse_qsl(parts.query, keep_blank_values=True)
+            length = int(self.headers.get('Content-Length', 0) or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            if db.max_body_bytes and length > db.max_body_bytes:
+                self._send(413, {'message': 'Payload too large', 'code': '413'})
+                return None, params, body
+            return path, params, body
+
+        def _lost_response(self):
+            """Answer a write that was applied with a 503, as if the response was lost"""
+            with db.lock:
+                failed = db.fail_rate and db.random.random() < db.fail_rate
+            if failed:
+                self._send(503, {'message': 'Service unavailable', 'code': '503'})
+            return failed
+
+        def _project(self, rows, params):
+            select = dict(params).get('select', '*')
+            if select == '*':
+                return rows
+            columns = [c.strip() for c in select.split(',')]
+            return [{c: r.get(c) for c in columns} for r in rows]
+
+        def _filters(self, params):
+            reserved = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+            return [(k, v) for k, v in params if k not in reserved]
+
+        def do_GET(self):
+            path, params, _ = self._request()
+            if path.startswith('rpc/'):
+                return self._rpc(path[4:], dict(params))
+            with db.lock:
+                rows = [dict(r) for r in db.rows(path) if _matches(r, self._filters(params))]
+            total = len(rows)
+            options = dict(params)
+            for spec in reversed((options.get('order') or '').split(',')):
+                if spec:
+                    column, _, direction = spec.partition('.')
+                    rows.sort(key=lambda r: (r.get(column) is None, str(r.get(column))), reverse=direction.startswith('desc'))
+            offset = int(options.get('offset', 0))
+            range_header = self.headers.get('Range')
+            if range_header:
+                start, _, end = range_header.partition('-')
+                offset, limit = int(start), int(end) - int(start) + 1
+            else:
+                limit = int(options['limit']) if 'limit' in options else None
+            rows = self._project(rows[offset:offset + limit if limit is not None else None], params)
+            headers = {}
+            if 'count=exact' in (self.headers.get('Prefer') or ''):
+                headers['Content-Range'] = f"{offset}-{offset + len(rows) - 1}/{total}"
+            self._send(200, rows, headers)
+
+        def do_HEAD(self):
+            self.head_only = True
+            try:
+                self.do_GET()
+            finally:
+                self.head_only = False
+
+        def _write_rows(self, path, rows, upsert, conflict):
+            with db.lock:
+                table = db.rows(path)
+                existing = {tuple(str(r.get(c)) for c in conflict): r for r in table} if upsert else {}
+                stored = []
+                for row in rows:
+                    row.setdefault('created_at', time.strftime('%Y-%m-%dT%H:%M:%S'))
+                    match = existing.get(tuple(str(row.get(c)) for c in conflict))
+                    if match is not None:
+                        match.update({k: v for k, v in row.items() if k != 'id'})
+                        stored.append(dict(match))
+                    else:
+                        row.setdefault('id', f"{path}-{len(table) + 1}-{time.time_ns()}")
+                        table.append(dict(row))
+                        if upsert:
+                            existing[tuple(str(row.get(c)) for c in conflict)] = table[-1]
+                        stored.append(dict(row))
+            return stored
+
+        def do_POST(self):
+            path, params, body = self._request()
+            if path is None:
+                return
+            if path.startswith('rpc/'):
+                return self._rpc(path[4:], body or {})
+            rows = body if isinstance(body, list) else [body]
+            upsert = 'merge-duplicates' in (self.headers.get('Prefer') or '')
+            conflict = [c for c in dict(params).get('on_conflict', 'id').split(',') if c]
+            stored = self._write_rows(path, rows, upsert, conflict)
+            if not self._lost_response():
+                self._send(201, self._project(stored, params))
+
+        def do_PATCH(self):
+            path, params, body = self._request()
+            if path is None:
+                return
+            with db.lock:
+                updated = []
+                for row in db.rows(path):
+                    if _matches(row, self._filters(params)):
+                        row.update(body or {})
+                        updated.append(dict(row))
+            self._send(200, updated)
+
+        def do_DELETE(self):
+            path, params, _ = self._request()
+            with db.lock:
+                table = db.rows(path)
+                deleted = [r for r in table if _matches(r, self._filters(params))]
+                db.tables[path] = [r for r in table if not _matches(r, self._filters(params))]
+                if path == 'documents':
+                    ids = {r['id'] for r in deleted}
+                    db.tables['document_chunks'] = [r for r in db.rows('document_chunks') if r.get('document_id') not in ids]
+            prefer = self.headers.get('Prefer') or ''
+            headers = {'Content-Range': f"*/{len(deleted)}"} if 'count=exact' in prefer else None
+            self._send(200, [] if 'return=minimal' in prefer else deleted, headers)
+
+        def _rpc(self, name, params):
+            if name == 'insert_document_chunks_packed':
+                stored = self._write_rows('document_chunks', params.get('chunks') or [], True, ['document_id', 'chunk_index'])
+                if not self._lost_response():
+                    self._send(200, [{k: r.get(k) for k in ('id', 'document_id', 'chunk_index')} for r in stored])
+                return
+            with db.lock:
+                if name in ('match_documents', 'match_documents_batch'):
+                    documents = {d['id']: d for d in db.rows('documents')}
+                    batch = name == 'match_documents_batch'
+                    rows = []
+                    for query_index in range(len(params.get('query_embeddings') or []) if batch else 1):
+                        for chunk in db.rows('document_chunks')[:int(params.get('match_count', 5))]:
+                            document = documents.get(chunk.get('document_id'), {})
+                            rows.append({
+                                **({'query_index': query_index} if batch else {}),
+                                'id': chunk.get('id'),
+                                'document_id': chunk.get('document_id'),
+                                'chunk_index': chunk.get('chunk_index'),
+                                'content': chunk.get('content'),
+                                'similarity': 0.9,
+                                'document_name': document.get('name'),
+                                'document_path': document.get('file_path'),
+                                'document_type': document.get('file_type')
+                            })
+                    return self._send(200, rows)
+                if name == 'reorder_document_chunks':
+                    positions = {chunk_id: idx for idx, chunk_id in enumerate(params.get('chunk_ids') or [])}
+                    kept, deleted = [], []
+                    for chunk in db.rows('document_chunks'):
+                        if chunk.get('document_id') != params.get('p_document_id'):
+                            kept.append(chunk)
+                        elif chunk.get('id') in positions:
+                            chunk['chunk_index'] = positions[chunk['id']]
+                            kept.append(chunk)
+                        else:
+                            deleted.append({'id': chunk.get('id')})
+                    db.tables['document_chunks'] = kept
+                    return self._send(200, deleted)
+                if name == 'truncate_all_documents':
+                    counts = {
+                        'deleted_documents_count': len(db.rows('documents')),
+                        'deleted_chunks_count': len(db.rows('document_chunks'))
+                    }
+                    db.tables['documents'] = []
+                    db.tables['document_chunks'] = []
+                    return self._send(200, [counts])
+            self._send(200, [])
+
+    return Handler
+
+
+def start_stub_supabase(port=0, latency=0.0, max_body_bytes=0, fail_rate=0.0):
+    """Start the stub in a background thread; returns (server, db, url)"""
+    db = StubDatabase(latency, max_body_bytes, fail_rate)
+    server = StubHTTPServer(('127.0.0.1', port), make_handler(db))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, db, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--max-body-bytes', type=int, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    server, _, url = start_stub_supabase(args.port, args.latency, args.max_body_bytes, args.fail_rate)
+    print(f"Stub Supabase REST API on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import os
+import math
+import asyncio
+import threading
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from supabase import create_client, acreate_client, Client, AsyncClient
+from supabase.lib.client_options import SyncClientOptions, AsyncClientOptions
+from config import Config
+
+
+class ClientRegistry:
+    """Process-wide Supabase and OpenAI clients with keep-alive connection pools.
+
+    httpx clients are thread-safe, so a single registry serves every request
+    thread and ingestion worker in the process. Clients are built lazily, which
+    keeps sockets from being shared across a gunicorn --preload fork.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._supabase = None
+        self._openai = None
+        self._http_clients = []
+
+    def _pool_limits(self):
+        return httpx.Limits(
+            max_connections=Config.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+        )
+
+    @property
+    def supabase(self) -> Client:
+        if self._supabase is None:
+            with self._lock:
+                if self._supabase is None:
+                    http_client = httpx.Client(
+                        limits=self._pool_limits(),
+                        timeout=httpx.Timeout(Config.HTTP_TIMEOUT, connect=10.0)
+                    )
+                    self._http_clients.append(http_client)
+                    self._supabase = create_client(
+                        Config.SUPABASE_URL,
+                        Config.SUPABASE_ANON_KEY,
+                        options=SyncClientOptions(httpx_client=http_client)
+                    )
+        return self._supabase
+
+    @property
+    def openai(self) -> OpenAI:
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    http_client = httpx.Client(
+                        limits=self._pool_limits(),
+                        timeout=httpx.Timeout(Config.HTTP_TIMEOUT, connect=10.0),
+                        follow_redirects=True
+                    )
+                    self._http_clients.append(http_client)
+                    self._openai = OpenAI(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        base_url=Config.OPENAI_BASE_URL,
+                        http_client=http_client
+                    )
+        return self._openai
+
+    def close(self):
+        with self._lock:
+            for http_client in self._http_clients:
+                http_client.close()
+            self._http_clients = []
+            self._supabase = None
+            self._openai = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class ShardedAsyncTransport(httpx.AsyncBaseTransport):
+    """Async transport that spreads requests over several small connection pools.
+
+    httpcore re-checks every pooled connection for every in-flight request each
+    time a connection frees up, so one large pool costs O(requests x connections)
+    per response; with hundreds of concurrent chats that bookkeeping dominated
+    CPU. Requests wait on a semaphore here instead and go to the least-loaded
+    shard. A slot is held until the response is closed, so streamed responses
+    count against the limit for their whole duration.
+    """
+
+    def __init__(self, limits, shard_size=16):
+        count = max(1, math.ceil(limits.max_connections / shard_size))
+        per_shard = math.ceil(limits.max_connections / count)
+        shard_limits = httpx.Limits(
+            max_connections=per_shard,
+            max_keepalive_connections=min(per_shard, limits.max_keepalive_connections or per_shard),
+            keepalive_expiry=limits.keepalive_expiry
+        )
+        self._shards = [httpx.AsyncHTTPTransport(limits=shard_limits) for _ in range(count)]
+        self._in_flight = [0] * count
+        self._slots = asyncio.Semaphore(per_shard * count)
+
+    async def handle_async_request(self, request):
+        await self._slots.acquire()
+        index = min(range(len(self._shards)), key=self._in_flight.__getitem__)
+        self._in_flight[index] += 1
+
+        def release():
+            self._in_flight[index] -= 1
+            self._slots.release()
+
+        try:
+            response = await self._shards[index].handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self):
+        for shard in self._shards:
+            await shard.aclose()
+
+
+class AsyncClientRegistry:
+    """Async Supabase and OpenAI clients for the ASGI path.
+
+    Bound to the event loop that creates them, so one is built per serving
+    loop (in the ASGI lifespan) rather than per process.
+    """
+
+    def __init__(self):
+        self._supabase = None
+        self._openai = None
+        self._http_clients = []
+
+    def _pool_limits(self):
+        return httpx.Limits(
+            max_connections=Config.ASYNC_HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.ASYNC_HTTP_POOL_MAX_CONNECTIONS,
+            keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+        )
+
+    def _http_client(self):
+        http_client = httpx.AsyncClient(
+            transport=ShardedAsyncTransport(self._pool_limits()),
+            timeout=httpx.Timeout(Config.HTTP_TIMEOUT, connect=10.0),
+            follow_redirects=True
+        )
+        self._http_clients.append(http_client)
+        return http_client
+
+    async def start(self):
+        if not Config.SUPABASE_URL or not Config.SUPABASE_ANON_KEY:
+            raise ValueError("Supabase URL and Key must be set in environment variables or config")
+        self._supabase = await acreate_client(
+            Config.SUPABASE_URL,
+            Config.SUPABASE_ANON_KEY,
+            options=AsyncClientOptions(httpx_client=self._http_client())
+        )
+        self._openai = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=Config.OPENAI_BASE_URL,
+            http_client=self._http_client()
+        )
+        return self
+
+    @property
+    def supabase(self) -> AsyncClient:
+        return self._supabase
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        return self._openai
+
+    async def close(self):
+        for http_client in self._http_clients:
+            await http_client.aclose()
+        self._http_clients = []
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def init_client_registry():
+    """Create the process-wide registry (called once from create_app)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
+
+
+def get_client_registry():
+    """Return the process-wide registry, creating it for scripts that skip create_app"""
+    return _registry or init_client_registry()
@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
 
@@ -17,6 +19,117 @@ class Config:
     SUPABASE_URL = os.getenv('SUPABASE_URL', 'your_supabase_project_url_here')
     SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY', 'your_supabase_anon_key_here')
     SUPABASE_DOCUMENTS_TABLE = 'documents'
+    SUPABASE_JOBS_TABLE = 'ingestion_jobs'
+    # Cached documents row count for /api/document/list, adjusted by create/delete and recounted when stale
+    DOCUMENT_COUNT_PATH = os.getenv('DOCUMENT_COUNT_PATH', os.path.join(BASE_DIR, 'cache', 'document_count.sqlite3'))
+    DOCUMENT_COUNT_REFRESH = int(os.getenv('DOCUMENT_COUNT_REFRESH', '300'))  # seconds
+
+    # Shared HTTP connection pools (per process) for Supabase and OpenAI
+    HTTP_POOL_MAX_CONNECTIONS = int(os.getenv('HTTP_POOL_MAX_CONNECTIONS', '50'))
+    HTTP_POOL_MAX_KEEPALIVE = int(os.getenv('HTTP_POOL_MAX_KEEPALIVE', '20'))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))  # seconds
+    ASYNC_HTTP_POOL_MAX_CONNECTIONS = int(os.getenv('ASYNC_HTTP_POOL_MAX_CONNECTIONS', '100'))  # per client, ASGI path
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '120'))  # seconds
+
+    # Threads serving the Flask routes mounted under the ASGI app
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '10'))
+
+    # Background ingestion
+    INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', '2'))
+    INGESTION_BATCH_SIZE = int(os.getenv('INGESTION_BATCH_SIZE', '100'))  # chunks per embed/insert batch
+    INGESTION_JOB_TIMEOUT = int(os.getenv('INGESTION_JOB_TIMEOUT', '3600'))  # seconds in processing before a restart requeues a job
+
+    # Chunking: chunks are sized in embedding-model tokens; the strategy is picked per extension
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '128'))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '12'))  # prose chunks only
+    CHUNK_STRATEGIES = {
+        'md': 'markdown', 'js': 'code', 'sql': 'code', 'yaml': 'code', 'yml': 'code', 'csv': 'rows',
+        **dict(item.replace(' ', '').lower().split('=', 1) for item in os.getenv('CHUNK_STRATEGIES', '').split(',') if '=' in item)
+    }  # extension -> chunker name; other extensions use 'text'
+
+    # Bulk uploads (many files or zip/tar archives in one request)
+    ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+    BULK_UPLOAD_MAX_FILES = int(os.getenv('BULK_UPLOAD_MAX_FILES', '5000'))
+    BULK_UPLOAD_MAX_BYTES = int(os.getenv('BULK_UPLOAD_MAX_BYTES', str(1024 * 1024 * 1024)))  # per archive and in total
+    BULK_EXTRACT_WORKERS = int(os.getenv('BULK_EXTRACT_WORKERS', '0'))  # extraction processes, 0 = one per CPU core
+
+    # document_chunks bulk writes: size-bounded batches upserted concurrently, retried per batch
+    CHUNK_INSERT_MAX_ROWS = int(os.getenv('CHUNK_INSERT_MAX_ROWS', '500'))
+    CHUNK_INSERT_MAX_BYTES = int(os.getenv('CHUNK_INSERT_MAX_BYTES', str(1024 * 1024)))  # encoded request body
+    CHUNK_INSERT_CONCURRENCY = int(os.getenv('CHUNK_INSERT_CONCURRENCY', '4'))
+    CHUNK_INSERT_MAX_RETRIES = int(os.getenv('CHUNK_INSERT_MAX_RETRIES', '3'))
+    CHUNK_INSERT_RETRY_BASE_DELAY = 0.5  # seconds
+    CHUNK_INSERT_RETRY_MAX_DELAY = 10.0
+
+    # OpenAI chat
+    CHAT_MODEL = os.getenv('CHAT_MODEL', 'gpt-5')
+    # Prompt budget per chat turn, in tokens: retrieved context is packed first, then history
+    CHAT_PROMPT_MAX_TOKENS = int(os.getenv('CHAT_PROMPT_MAX_TOKENS', '8000'))
+    CHAT_CONTEXT_MAX_TOKENS = int(os.getenv('CHAT_CONTEXT_MAX_TOKENS', '3000'))
+    CHAT_HISTORY_MAX_TOKENS = int(os.getenv('CHAT_HISTORY_MAX_TOKENS', '2000'))
+    CHAT_HISTORY_SUMMARY_TOKENS = int(os.getenv('CHAT_HISTORY_SUMMARY_TOKENS', '300'))  # 0 = drop older turns
+    # Server-side chat sessions (turn log and rolling summary in a local SQLite file)
+    CHAT_SESSION_PATH = os.getenv('CHAT_SESSION_PATH', os.path.join(BASE_DIR, 'cache', 'chat_sessions.sqlite3'))
+    CHAT_SESSION_TTL = int(os.getenv('CHAT_SESSION_TTL', str(7 * 24 * 3600)))  # seconds idle before a session expires
+    CHAT_SESSION_MAX_TURNS = int(os.getenv('CHAT_SESSION_MAX_TURNS', '200'))  # messages kept per session
+    CHAT_SESSION_MAX_SESSIONS = int(os.getenv('CHAT_SESSION_MAX_SESSIONS', '10000'))
+
+    # OpenAI embeddings (OPENAI_BASE_URL can point at a local stub server)
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+    EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv('EMBEDDING_BATCH_MAX_ITEMS', '512'))
+    EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', '100000'))
+    EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', '4'))
+    EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', '5'))
+    EMBEDDING_RETRY_BASE_DELAY = 1.0  # seconds
+    EMBEDDING_RETRY_MAX_DELAY = 30.0
+    # How embeddings are sent to Supabase: 'text' (pgvector literal) or packed 'float32' / 'float16'
+    # through the insert_document_chunks_packed function in schema.sql
+    EMBEDDING_TRANSFER_FORMAT = os.getenv('EMBEDDING_TRANSFER_FORMAT', 'text').lower()
+
+    # Local embedding cache keyed by (model, chunk text hash)
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(BASE_DIR, 'cache', 'embeddings.sqlite3'))
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+
+    # Query embedding cache (in-process TTL+LRU, optional SQLite tier shared by workers)
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '1024'))
+    QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', '3600'))  # seconds
+    QUERY_CACHE_DISK_ENABLED = os.getenv('QUERY_CACHE_DISK_ENABLED', 'False').lower() == 'true'
+    QUERY_CACHE_DISK_PATH = os.getenv('QUERY_CACHE_DISK_PATH', os.path.join(BASE_DIR, 'cache', 'query_embeddings.sqlite3'))
+    QUERY_CACHE_DISK_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_DISK_MAX_ENTRIES', '50000'))
+
+    # Retrieval result cache, invalidated by a corpus version shared across workers
+    RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv('RETRIEVAL_CACHE_MAX_ENTRIES', '2048'))
+    RETRIEVAL_CACHE_TTL = int(os.getenv('RETRIEVAL_CACHE_TTL', '3600'))  # seconds
+    CORPUS_VERSION_PATH = os.getenv('CORPUS_VERSION_PATH', os.path.join(BASE_DIR, 'cache', 'corpus_version.sqlite3'))
+    SEARCH_BATCH_MAX_QUERIES = int(os.getenv('SEARCH_BATCH_MAX_QUERIES', '256'))  # queries per /api/chat/search batch
+
+    # Semantic answer cache: first-turn questions close enough to one already answered reuse its answer.
+    # Opt-in: when on, the question is embedded before retrieval starts (the embedding is then reused)
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'False').lower() == 'true'
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))  # cosine similarity of query embeddings
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '2048'))
+    ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', '3600'))  # seconds
+
+    # Retrieval backend: 'supabase' (match_documents RPC) or 'local' (in-process IVF index)
+    RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'supabase').lower()
+    VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH', os.path.join(BASE_DIR, 'cache', 'vector_index'))
+    VECTOR_INDEX_NLIST = int(os.getenv('VECTOR_INDEX_NLIST', '0'))  # 0 = sqrt(rows)
+    VECTOR_INDEX_NPROBE = int(os.getenv('VECTOR_INDEX_NPROBE', '8'))
+    # Compact copy scanned before exact rescoring: 'none', 'int8' or 'binary' (sign bits)
+    VECTOR_INDEX_QUANTIZATION = os.getenv('VECTOR_INDEX_QUANTIZATION', 'none').lower()
+    VECTOR_INDEX_RERANK = int(os.getenv('VECTOR_INDEX_RERANK', '20'))  # rescored candidates per result
+
+    # Hybrid retrieval: BM25 over chunk content fused with vector results (reciprocal rank fusion)
+    HYBRID_SEARCH_ENABLED = os.getenv('HYBRID_SEARCH_ENABLED', 'False').lower() == 'true'
+    LEXICAL_INDEX_PATH = os.getenv('LEXICAL_INDEX_PATH', os.path.join(BASE_DIR, 'cache', 'lexical_index'))
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '20'))  # per retriever, before fusion
+    RRF_K = int(os.getenv('RRF_K', '60'))
+
+    # OCR (0 workers = one per CPU core)
+    OCR_DPI = int(os.getenv('OCR_DPI', '300'))
+    OCR_WORKERS = int(os.getenv('OCR_WORKERS', '0'))
     
     CORS_ORIGINS = [
         'http://localhost:3000',
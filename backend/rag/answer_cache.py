@@ -0,0 +1,167 @@
+import threading
+import time
+import numpy as np
+from config import Config
+from .retrieval_cache import get_retrieval_cache
+
+
+class AnswerCache:
+    """Chat answers looked up by the meaning of the question.
+
+    Entries are (unit-length query embedding, answer, sources). A lookup is one
+    matrix-vector product over the stored embeddings, and the nearest entry is
+    served when its cosine similarity reaches `threshold`, so paraphrases of a
+    question already answered skip retrieval and the completion call. Entries
+    belong to one corpus version: the cache empties itself when the version
+    moves, and answers generated against an older version are not stored.
+    Per process; entries older than `ttl_seconds` are purged on lookup, and
+    least recently used entries are evicted past `max_entries`.
+    """
+
+    def __init__(self, corpus_version, threshold=0.95, max_entries=2048, ttl_seconds=3600):
+        self.corpus_version = corpus_version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._version = None
+        self._vectors = None  # (max_entries, dims) float32, rows [0, len(_entries)) in use
+        self._used_at = np.zeros(max_entries)
+        self._created_at = np.zeros(max_entries)
+        self._entries = []
+        self._counters = {'lookups': 0, 'hits': 0, 'stores': 0, 'stale_stores': 0, 'invalidations': 0, 'expired': 0}
+        self._seconds = {'lookup': 0.0, 'hit': 0.0, 'miss': 0.0}
+        self._observed = {'hit': 0, 'miss': 0}
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _sync_version(self, version):
+        """Drop every entry when the corpus has changed (caller holds the lock)"""
+        if version != self._version:
+            if self._entries:
+                self._counters['invalidations'] += 1
+            self._entries = []
+            self._version = version
+
+    def _purge_expired(self, now):
+        """Compact out entries older than the TTL (caller holds the lock)"""
+        count = len(self._entries)
+        live = np.flatnonzero(now - self._created_at[:count] <= self.ttl_seconds)
+        if len(live) == count:
+            return
+        self._counters['expired'] += count - len(live)
+        kept = len(live)
+        self._vectors[:kept] = self._vectors[live]
+        self._used_at[:kept] = self._used_at[live]
+        self._created_at[:kept] = self._created_at[live]
+        self._entries = [self._entries[idx] for idx in live]
+
+    def lookup(self, embedding):
+        """Nearest stored answer for a query embedding. Returns (entry or None,
+        corpus version); pass the version back to put() with the new answer."""
+        start = time.perf_counter()
+        version = self.corpus_version.current()
+        query = self._unit(embedding)
+        found = None
+        with self._lock:
+            self._sync_version(version)
+            self._counters['lookups'] += 1
+            now = time.time()
+            if self._entries:
+                self._purge_expired(now)
+            count = len(self._entries)
+            if count and self._vectors.shape[1] == query.shape[0]:
+                scores = self._vectors[:count] @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._used_at[best] = now
+                    self._counters['hits'] += 1
+                    found = dict(self._entries[best], similarity=round(float(scores[best]), 4))
+            self._seconds['lookup'] += time.perf_counter() - start
+        return found, version
+
+    def put(self, embedding, question, answer, sources, version):
+        """Store an answer generated against corpus `version` (from lookup)"""
+        if not answer:
+            return False
+        query = self._unit(embedding)
+        current = self.corpus_version.current()
+        with self._lock:
+            self._sync_version(current)
+            if version != current:
+                self._counters['stale_stores'] += 1
+                return False
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+                self._entries = []
+            now = time.time()
+            entry = {'question': question, 'answer': answer, 'sources': sources, 'created_at': now}
+            count = len(self._entries)
+            if count and float(np.max(self._vectors[:count] @ query)) >= 0.9999:
+                return False  # the same question is already stored
+            if count < self.max_entries:
+                slot = count
+                self._entries.append(entry)
+            else:
+                slot = int(np.argmin(self._used_at))
+                self._entries[slot] = entry
+            self._vectors[slot] = query
+            self._used_at[slot] = now
+            self._created_at[slot] = now
+            self._counters['stores'] += 1
+        return True
+
+    def observe(self, hit, seconds):
+        """Record the end-to-end latency of a chat turn that used the cache"""
+        key = 'hit' if hit else 'miss'
+        with self._lock:
+            self._observed[key] += 1
+            self._seconds[key] += seconds
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            seconds = dict(self._seconds)
+            observed = dict(self._observed)
+            entries = len(self._entries)
+        lookups = counters['lookups']
+        return dict(
+            counters,
+            misses=lookups - counters['hits'],
+            hit_rate=counters['hits'] / lookups if lookups else 0.0,
+            avg_lookup_ms=seconds['lookup'] * 1000 / lookups if lookups else 0.0,
+            avg_hit_ms=seconds['hit'] * 1000 / observed['hit'] if observed['hit'] else None,
+            avg_miss_ms=seconds['miss'] * 1000 / observed['miss'] if observed['miss'] else None,
+            entries=entries,
+            max_entries=self.max_entries,
+            threshold=self.threshold,
+            corpus_version=self._version
+        )
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Return the process-wide answer cache, or None when it is disabled"""
+    global _answer_cache
+    if not Config.ANSWER_CACHE_ENABLED:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache(
+                get_retrieval_cache().corpus_version,
+                threshold=Config.ANSWER_CACHE_THRESHOLD,
+                max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=Config.ANSWER_CACHE_TTL
+            )
+        return _answer_cache
@@ -0,0 +1,145 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from config import Config
+from .processing import embed_chunks_openai, iter_document_chunks
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def resolve_extract_workers(max_workers=None):
+    return max_workers or Config.BULK_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def _init_extract_worker():
+    # Each process already works on a whole document; OCR its scanned pages inline
+    Config.OCR_WORKERS = 1
+
+
+def get_extraction_pool(max_workers=None):
+    """Return the process-wide document extraction pool, creating it on first use"""
+    global _pool, _pool_workers
+    workers = resolve_extract_workers(max_workers)
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker)
+            _pool_workers = workers
+        return _pool
+
+
+def extract_chunks(file_path, file_type):
+    """Worker entry point: extract and chunk one document"""
+    return list(iter_document_chunks(file_path, file_type))
+
+
+def submit_extraction(file_path, file_type, max_workers=None):
+    """Extract a document on the pool. With a single worker it runs inline and an
+    already-completed future is returned."""
+    workers = resolve_extract_workers(max_workers)
+    if workers == 1:
+        future = Future()
+        try:
+            future.set_result(extract_chunks(file_path, file_type))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return get_extraction_pool(workers).submit(extract_chunks, file_path, file_type)
+
+
+def run_bulk_pipeline(db_service, documents, on_finished, max_workers=None):
+    """
+    Ingest many documents together. Extraction and chunking run on a process pool,
+    a bounded window of documents ahead of the embedder, and chunks of consecutive
+    documents share embedding and insert batches of INGESTION_BATCH_SIZE, so a dump
+    of small files costs a few full API calls instead of one small call per file.
+    documents: dicts with document_id, file_path and file_type (e.g. job rows).
+    on_finished(document, chunk_count, error) is called once per document, as soon
+    as all of its chunks are stored or it has failed; a failed document's chunks
+    stored by earlier batches are deleted first, as run_replace_pipeline does.
+    """
+    started = time.perf_counter()
+    window = resolve_extract_workers(max_workers) * 2
+    remaining = iter(documents)
+    pending = deque()  # (document, extraction future), in submission order
+    buffer = []  # (state, chunk_index, text) waiting for an embedding batch
+    totals = {'documents': 0, 'failed': 0, 'chunks': 0, 'batches': 0}
+
+    def submit_next():
+        document = next(remaining, None)
+        if document is not None:
+            pending.append((document, submit_extraction(document['file_path'], document['file_type'], max_workers)))
+        return document is not None
+
+    def finish(state, error=None):
+        if state['done']:
+            return
+        state['done'] = True
+        totals['documents'] += 1
+        if error is None:
+            totals['chunks'] += state['chunk_count']
+        else:
+            totals['failed'] += 1
+            if state['written']:
+                try:
+                    db_service.delete_document_chunks(state['document']['document_id'])
+                except Exception as e:
+                    print(f"Error removing chunks of failed document {state['document']['document_id']}: {str(e)}")
+        on_finished(state['document'], state['chunk_count'], error)
+
+    def flush(items):
+        # Chunks of documents that failed in an earlier batch are dropped
+        items = [item for item in items if not item[0]['done']]
+        if not items:
+            return
+        states = list({id(state): state for state, _, _ in items}.values())
+        for state in states:
+            state['written'] = True
+        try:
+            embeddings = embed_chunks_openai([text for _, _, text in items])
+            db_service.insert_chunks([
+                {'document_id': state['document']['document_id'], 'chunk_index': idx, 'content': text, 'embedding': embedding}
+                for (state, idx, text), embedding in zip(items, embeddings)
+            ])
+        except Exception as e:
+            for state in states:
+                finish(state, e)
+            return
+        totals['batches'] += 1
+        for state, _, _ in items:
+            state['unstored'] -= 1
+        for state in states:
+            if state['extracted'] and not state['unstored']:
+                finish(state)
+
+    while len(pending) < window and submit_next():
+        pass
+    batch_size = Config.INGESTION_BATCH_SIZE
+    while pending:
+        document, future = pending.popleft()
+        submit_next()
+        state = {'document': document, 'chunk_count': 0, 'unstored': 0, 'extracted': False, 'written': False,
+                 'done': False}
+        try:
+            chunks = future.result()
+        except Exception as e:
+            finish(state, e)
+            continue
+        state.update(chunk_count=len(chunks), unstored=len(chunks), extracted=True)
+        if not chunks:
+            finish(state)
+            continue
+        buffer.extend((state, idx, text) for idx, text in enumerate(chunks))
+        while len(buffer) >= batch_size:
+            flush(buffer[:batch_size])
+            del buffer[:batch_size]
+    flush(buffer)
+
+    print(f"📦 Bulk ingested {totals['documents']} documents ({totals['failed']} failed), {totals['chunks']} chunks "
+          f"in {totals['batches']} embedding batches, {time.perf_counter() - started:.1f}s")
+    return totals
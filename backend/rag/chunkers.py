@@ -0,0 +1,386 @@
+import re
+import zlib
+import threading
+from abc import ABC, abstractmethod
+from config import Config
+from .embeddings import get_token_counter
+
+CUT_CONTEXT_CHARS = 24
+CUT_ZONE = 0.5  # cuts are picked in the second half of each window
+# Calibrates characters per token for the prose windows; every chunk is still counted afterwards
+CALIBRATION_TEXT = (
+    "The quarterly report covers revenue, operating costs and the outlook for the next two years. "
+    "Customers can reset their password from the account settings page, or contact support by email."
+)
+_INLINE_WHITESPACE_RE = re.compile(r"[ \t]+")
+_BREAK_RE = re.compile(r"[ \n]")
+_HEADING_RE = re.compile(r"(#{1,6})\s")
+_LIST_ITEM_RE = re.compile(r"\s*(?:[-*+]|\d+[.)])\s")
+
+
+def _cut_rank(window, pos):
+    """Content-defined rank of a break at `pos`, from the text just before it"""
+    return zlib.crc32(window[max(0, pos - CUT_CONTEXT_CHARS):pos].encode('utf-8'))
+
+
+def _next_chunk(text, start, max_chars, overlap):
+    """Cut one chunk starting at `start`; returns (chunk, next_start).
+
+    The cut is the sentence (else word) break in the second half of the window
+    whose preceding text ranks lowest, rather than simply the last break. Cuts
+    then depend on content, not on where the previous chunk started, so after
+    an edit the boundaries fall back into step within a chunk or two and the
+    rest of the document re-chunks identically (see run_replace_pipeline).
+    """
+    n = len(text)
+    end = min(n, start + max_chars)
+    window = text[start:end]
+
+    if len(window) < max_chars:
+        cut = len(window)  # the rest of the text fits
+    else:
+        sentence_breaks, word_breaks = [], []
+        for match in _BREAK_RE.finditer(window, int(max_chars * CUT_ZONE)):
+            pos = match.start()
+            (sentence_breaks if window[pos] == "\n" or window[pos - 1] in ".!?" else word_breaks).append(pos)
+        breaks = sentence_breaks or word_breaks
+        if breaks:
+            cut = min(breaks, key=lambda pos: _cut_rank(window, pos))
+        else:
+            # Try to cut near the end of a sentence or word boundary
+            cut = max(window.rfind(". "), window.rfind(" "), window.rfind("\n"))
+            if cut == -1 or cut < max_chars * 0.5:
+                cut = len(window)
+
+    chunk = window[:cut].strip()
+
+    # Move start forward by (cut - overlap), but never backward or beyond text
+    next_start = start + cut - overlap
+    if next_start <= start:
+        next_start = start + cut  # avoid infinite loops when cut < overlap
+
+    return chunk, min(next_start, n)
+
+
+def iter_chunks(segments, max_chars: int = 500, overlap: int = 50):
+    """
+    Incrementally chunk a stream of text segments. Produces exactly the chunks
+    `chunk_text` would for the concatenated text, while only holding the current
+    segment plus one window of carry-over.
+    """
+    buffer = ''
+    seen_text = False
+    for segment in segments:
+        if not segment:
+            continue
+        # Normalize whitespace but preserve paragraph breaks
+        segment = _INLINE_WHITESPACE_RE.sub(" ", segment)
+        if not seen_text:
+            segment = segment.lstrip()
+            if not segment:
+                continue
+            seen_text = True
+        elif buffer.endswith(" ") and segment.startswith(" "):
+            segment = segment[1:]
+        buffer += segment
+
+        # Only cut windows that are complete; trailing whitespace may still be stripped at the end
+        limit = len(buffer.rstrip())
+        start = 0
+        while limit - start >= max_chars:
+            chunk, start = _next_chunk(buffer, start, max_chars, overlap)
+            if chunk:
+                yield chunk
+        buffer = buffer[start:]
+
+    buffer = buffer.rstrip()
+    start = 0
+    while start < len(buffer):
+        chunk, start = _next_chunk(buffer, start, max_chars, overlap)
+        if chunk:
+            yield chunk
+
+
+def chunk_text(text: str, max_chars: int = 500, overlap: int = 50) -> list[str]:
+    """
+    Split text into overlapping chunks of at most `max_chars` characters.
+    Tries to break at sentence or word boundaries. Ensures no text loss or duplication.
+    """
+    if not text:
+        return []
+    return list(iter_chunks([text], max_chars, overlap))
+
+
+def iter_lines(segments):
+    """Complete lines (with their newline) of a stream of text segments"""
+    tail = ''
+    for segment in segments:
+        if not segment:
+            continue
+        lines = (tail + segment).splitlines(keepends=True)
+        tail = lines.pop() if not lines[-1].endswith(('\n', '\r')) else ''
+        yield from lines
+    if tail:
+        yield tail
+
+
+class Chunker(ABC):
+    """Turns the stream of text segments of one document into chunk strings of at
+    most `max_tokens` tokens. Subclasses are registered by name in CHUNKERS and
+    picked per file extension through CHUNK_STRATEGIES."""
+
+    name = None
+
+    def __init__(self, max_tokens=None, overlap_tokens=None, count_tokens=None):
+        self.max_tokens = max_tokens or Config.CHUNK_MAX_TOKENS
+        self.overlap_tokens = Config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.count_tokens = count_tokens or get_chunk_token_counter()
+
+    @abstractmethod
+    def iter_chunks(self, segments):
+        """Yield the chunk strings of a document given its text segments"""
+
+    def split_long(self, text, max_tokens=None):
+        """Content-defined split of one oversized piece, keeping its whitespace"""
+        max_tokens = max_tokens or self.max_tokens
+        tokens = self.count_tokens(text)
+        if tokens <= max_tokens:
+            yield text.strip()
+            return
+        # Scale the character window to this text's own characters-per-token ratio
+        max_chars = max(CUT_CONTEXT_CHARS, int(len(text) * max_tokens / tokens * 0.9))
+        start = 0
+        while start < len(text):
+            chunk, start = _next_chunk(text, start, max_chars, 0)
+            if chunk:
+                yield chunk
+
+
+class TextChunker(Chunker):
+    """Prose: content-defined sentence/word cuts over whitespace-collapsed text with
+    an overlap between chunks. Windows are sized in characters from the token budget;
+    the rare chunk that still counts over budget (dense text) is split again."""
+
+    name = 'text'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Fixed per counter rather than adapted per document, so cuts stay content-defined
+        self.chars_per_token = len(CALIBRATION_TEXT) / self.count_tokens(CALIBRATION_TEXT) * 0.9
+
+    def iter_chunks(self, segments):
+        max_chars = int(self.max_tokens * self.chars_per_token)
+        overlap = int(self.overlap_tokens * self.chars_per_token)
+        for chunk in iter_chunks(segments, max_chars, overlap):
+            if len(chunk) <= self.max_tokens or self.count_tokens(chunk) <= self.max_tokens:
+                yield chunk
+            else:
+                yield from self.split_long(chunk)
+
+
+class StructuredChunker(Chunker):
+    """Packs structural units (lines or blocks) into chunks.
+
+    iter_units yields (text, level, context) per unit: its source text, how good a
+    chunk boundary the start of the unit is (higher is better, e.g. a heading over
+    a paragraph over a line inside a block), and a context line repeated at the top
+    of any chunk the unit starts (e.g. the headings above it). Once a window of
+    units exceeds the budget, it is cut before the best-level unit that leaves at
+    least half a chunk behind it, ties going to the lowest content rank like the
+    text cuts, so boundaries resync after an edit. Each unit is counted once.
+    """
+
+    MIN_FILL = CUT_ZONE
+
+    @abstractmethod
+    def iter_units(self, segments):
+        """Yield (text, level, context) for each structural unit of a document"""
+
+    def iter_chunks(self, segments):
+        window = []  # [text, tokens, level, context]
+        total = 0
+        context_tokens = {None: 0}
+
+        def repeated(context):
+            # Context longer than half a chunk is not repeated
+            if context not in context_tokens:
+                context_tokens[context] = self.count_tokens(context) + 1
+            return context if context_tokens[context] <= self.max_tokens // 2 else None
+
+        def budget():
+            return self.max_tokens - context_tokens[repeated(window[0][3])]
+
+        def emit(units):
+            body = ''.join(unit[0] for unit in units).strip()
+            if body:
+                context = repeated(units[0][3])
+                yield f"{context}\n{body}" if context else body
+
+        for text, level, context in self.iter_units(segments):
+            window.append([text, self.count_tokens(text), level, context])
+            total += window[-1][1]
+            while total > budget():
+                if len(window) == 1:
+                    # One unit over budget on its own: split it by sentences/words
+                    for piece in self.split_long(window[0][0], budget()):
+                        yield from emit([[piece, 0, level, context]])
+                    window, total = [], 0
+                    break
+                limit = budget()
+                fill = limit * self.MIN_FILL
+                cut, best, last_fit, prefix = None, None, 1, 0
+                for idx in range(1, len(window)):
+                    prefix += window[idx - 1][1]
+                    if prefix > limit:
+                        break
+                    last_fit = idx
+                    if prefix >= fill:
+                        previous = window[idx - 1][0]
+                        key = (window[idx][2], -zlib.crc32(previous[-CUT_CONTEXT_CHARS:].encode('utf-8')))
+                        if best is None or key > best:
+                            cut, best = idx, key
+                if cut is None:
+                    # No boundary fills half a chunk (a large unit follows): keep everything that fits together
+                    cut = last_fit
+                yield from emit(window[:cut])
+                total -= sum(unit[1] for unit in window[:cut])
+                del window[:cut]
+        if window:
+            yield from emit(window)
+
+
+class MarkdownChunker(StructuredChunker):
+    """Markdown: cuts prefer headings (higher levels first), then paragraphs, list
+    items and table rows; fenced code blocks are only split when they exceed the
+    budget. Chunks repeat the headings they sit under."""
+
+    name = 'markdown'
+
+    def iter_units(self, segments):
+        headings = []  # (level, line) of the current section path
+        fence = None
+        blank_before = True
+        unit = None
+        for line in iter_lines(segments):
+            stripped = line.strip()
+            if not stripped:
+                if unit is not None:
+                    unit[0] += line
+                blank_before = True
+                continue
+            context = "\n".join(heading for _, heading in headings) or None
+            if fence:
+                level = 0
+                if stripped.startswith(fence):
+                    fence = None
+            elif stripped.startswith(('```', '~~~')):
+                fence = stripped[:3]
+                level = 3 if blank_before else 2
+            elif _HEADING_RE.match(stripped):
+                depth = len(_HEADING_RE.match(stripped).group(1))
+                headings = [heading for heading in headings if heading[0] < depth]
+                context = "\n".join(heading for _, heading in headings) or None
+                headings.append((depth, stripped))
+                level = 10 - depth
+            elif _LIST_ITEM_RE.match(line) or stripped.startswith('|'):
+                level = 3 if blank_before else 2
+            else:
+                level = 3 if blank_before else 1
+            if unit is not None:
+                yield tuple(unit)
+            unit = [line, level, context]
+            blank_before = False
+        if unit is not None:
+            yield tuple(unit)
+
+
+class CodeChunker(StructuredChunker):
+    """Source and config files (JS, SQL, YAML): cuts prefer top-level declarations
+    and statements that follow a blank line or a closing `}` / `;`, then shallower
+    indentation. Indentation is kept as written."""
+
+    name = 'code'
+
+    def iter_units(self, segments):
+        blank_before = True
+        closed_before = True
+        unit = None
+        for line in iter_lines(segments):
+            stripped = line.strip()
+            if not stripped:
+                if unit is not None:
+                    unit[0] += line
+                blank_before = True
+                continue
+            indent = len(line) - len(line.lstrip(' \t'))
+            if indent == 0:
+                level = 4 if blank_before or closed_before else 3
+            elif blank_before:
+                level = 2
+            else:
+                level = 1 if indent <= 4 else 0
+            if unit is not None:
+                yield tuple(unit)
+            unit = [line, level, None]
+            blank_before = False
+            closed_before = stripped.endswith((';', '}', '};'))
+        if unit is not None:
+            yield tuple(unit)
+
+
+class RowChunker(StructuredChunker):
+    """Delimited rows (CSV): chunks hold whole records (quoted fields may span
+    lines) and repeat the header row."""
+
+    name = 'rows'
+
+    def iter_units(self, segments):
+        header = None
+        record = ''
+        for line in iter_lines(segments):
+            record += line
+            if record.count('"') % 2:
+                continue  # inside a quoted field
+            if record.strip():
+                if header is None:
+                    header = record.strip()
+                    yield record, 5, None
+                else:
+                    yield record, 1, header
+            record = ''
+        if record.strip():
+            yield record, 1, header
+
+
+CHUNKERS = {cls.name: cls for cls in (TextChunker, MarkdownChunker, CodeChunker, RowChunker)}
+
+_chunkers = {}
+_counter = None
+_lock = threading.Lock()
+
+
+def register_chunker(cls):
+    """Make a Chunker subclass available to CHUNK_STRATEGIES under its `name`"""
+    CHUNKERS[cls.name] = cls
+    return cls
+
+
+def get_chunk_token_counter():
+    """Process-wide token counter for the embedding model"""
+    global _counter
+    with _lock:
+        if _counter is None:
+            _counter = get_token_counter(Config.EMBEDDING_MODEL)
+        return _counter
+
+
+def get_chunker(file_type):
+    """The chunker configured for a file type/extension (e.g. 'MD' or 'md'); 'text' by default"""
+    name = Config.CHUNK_STRATEGIES.get((file_type or '').lower(), 'text')
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunk strategy '{name}' for {file_type}; known: {', '.join(sorted(CHUNKERS))}")
+    count_tokens = get_chunk_token_counter()
+    with _lock:
+        if name not in _chunkers:
+            _chunkers[name] = CHUNKERS[name](count_tokens=count_tokens)
+        return _chunkers[name]
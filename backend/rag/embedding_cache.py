@@ -0,0 +1,160 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from config import Config
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_chunk_text(text):
+    """Normalize text the same way stored chunk content is cleaned, so trivially
+    re-flowed copies of a chunk share one cache entry"""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def chunk_hash(text):
+    return hashlib.sha256(normalize_chunk_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store backed by a local SQLite file.
+
+    Entries are keyed by (model, sha256 of normalized chunk text) and hold the
+    vector as packed float32. The file is shared by every worker process on the
+    host (WAL mode); triggers keep its row count in `meta`, and once it grows
+    past `max_entries` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL, PRIMARY KEY (model, text_hash))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        conn.commit()
+        # Count the existing rows and install the triggers in one write transaction,
+        # so no insert from another process falls between the two
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) SELECT 'rows', COUNT(*) FROM embeddings")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_count_insert AFTER INSERT ON embeddings"
+            " BEGIN UPDATE meta SET value = value + 1 WHERE key = 'rows'; END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_count_delete AFTER DELETE ON embeddings"
+            " BEGIN UPDATE meta SET value = value - 1 WHERE key = 'rows'; END"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model, texts):
+        """Look up vectors for `texts`. Returns {position: vector} for the hits."""
+        hashes = [chunk_hash(text) for text in texts]
+        found = {}
+        conn = self._connection()
+        unique = list(set(hashes))
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(unique), 500):
+            part = unique[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [model, *part]
+            ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = array('f', blob).tolist()
+
+        if found:
+            now = time.time()
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(now, model, text_hash) for text_hash in found]
+            )
+            conn.commit()
+
+        result = {idx: found[text_hash] for idx, text_hash in enumerate(hashes) if text_hash in found}
+        with self._lock:
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        return result
+
+    def put_many(self, model, texts, vectors):
+        """Store vectors for `texts`, then evict least recently used entries if over capacity"""
+        if not texts:
+            return
+        now = time.time()
+        conn = self._connection()
+        # An upsert rather than INSERT OR REPLACE: REPLACE deletes without firing the delete trigger
+        conn.executemany(
+            "INSERT INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (model, text_hash) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used",
+            [(model, chunk_hash(text), array('f', vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        )
+        conn.commit()
+        self._evict(conn)
+
+    def _count(self, conn):
+        return conn.execute("SELECT value FROM meta WHERE key = 'rows'").fetchone()[0]
+
+    def _evict(self, conn):
+        count = self._count(conn)
+        if count <= self.max_entries:
+            return
+        # Trim an extra 10% so eviction does not run on every insert once full
+        excess = count - int(self.max_entries * 0.9)
+        conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        conn.commit()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        entries = self._count(self._connection())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Return the process-wide embedding cache, or None when disabled"""
+    global _cache
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(Config.EMBEDDING_CACHE_PATH, Config.EMBEDDING_CACHE_MAX_ENTRIES)
+        return _cache
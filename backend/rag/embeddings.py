@@ -0,0 +1,136 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+from clients import get_client_registry
+from config import Config
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a character estimate
+    tiktoken = None
+
+
+def get_token_counter(model):
+    """Return a callable counting tokens for `model` (approximate without tiktoken)"""
+    if tiktoken is not None:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            # Encodings are downloaded on first use; offline hosts use the estimate
+            print(f"tiktoken unavailable ({e.__class__.__name__}), estimating token counts")
+    # English averages ~4 characters per token; dividing by 3 over-counts so batches stay under the limit
+    return lambda text: len(text) // 3 + 1
+
+
+def is_retryable_error(error):
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error):
+    """Honour a server-provided Retry-After header when present"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingEngine:
+    """Token-aware, concurrent embedding client.
+
+    Inputs are packed into batches that respect per-request item and token
+    limits, batches run on a bounded thread pool, and 429/5xx/connection errors
+    are retried with exponential backoff. Output order always matches input order.
+    """
+
+    def __init__(self, client=None, model=None, max_batch_items=None, max_batch_tokens=None,
+                 concurrency=None, max_retries=None):
+        # Retries are handled here so they can back off per batch
+        self.client = client or get_client_registry().openai.with_options(max_retries=0)
+        self.model = model or Config.EMBEDDING_MODEL
+        self.max_batch_items = max_batch_items or Config.EMBEDDING_BATCH_MAX_ITEMS
+        self.max_batch_tokens = max_batch_tokens or Config.EMBEDDING_BATCH_MAX_TOKENS
+        self.concurrency = concurrency or Config.EMBEDDING_CONCURRENCY
+        self.max_retries = Config.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self.count_tokens = get_token_counter(self.model)
+
+    def plan_batches(self, texts):
+        """Split `texts` into contiguous (start, end) ranges under the item and token limits"""
+        batches = []
+        start = 0
+        tokens = 0
+        for idx, text in enumerate(texts):
+            text_tokens = self.count_tokens(text)
+            if idx > start and (idx - start >= self.max_batch_items or tokens + text_tokens > self.max_batch_tokens):
+                batches.append((start, idx))
+                start = idx
+                tokens = 0
+            tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def embed(self, texts):
+        """Embed a list of texts, returning one vector per text in the same order"""
+        if not texts:
+            return []
+        texts = list(texts)
+        batches = self.plan_batches(texts)
+        vectors = [None] * len(texts)
+
+        if len(batches) == 1 or self.concurrency == 1:
+            for start, end in batches:
+                vectors[start:end] = self._embed_batch(texts[start:end])
+            return vectors
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            futures = {
+                executor.submit(self._embed_batch, texts[start:end]): (start, end)
+                for start, end in batches
+            }
+            for future, (start, end) in futures.items():
+                vectors[start:end] = future.result()
+        return vectors
+
+    def _embed_batch(self, batch):
+        attempt = 0
+        while True:
+            try:
+                resp = self.client.embeddings.create(model=self.model, input=batch)
+                # The API returns an index per input; do not rely on response order
+                return [data.embedding for data in sorted(resp.data, key=lambda data: data.index)]
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(Config.EMBEDDING_RETRY_MAX_DELAY, Config.EMBEDDING_RETRY_BASE_DELAY * (2 ** attempt))
+                    delay *= 0.5 + random.random() / 2  # jitter so concurrent batches do not retry in lockstep
+                attempt += 1
+                print(f"Embedding batch of {len(batch)} failed ({str(e)}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_embedding_engine():
+    """Return the process-wide embedding engine, creating it on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = EmbeddingEngine()
+        return _engine
@@ -0,0 +1,144 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from sb.database_service import DocumentService
+from sb.job_service import JobService
+from .processing import run_rag_pipeline, run_replace_pipeline
+from .bulk_ingestion import run_bulk_pipeline
+
+
+def remove_file(path):
+    """Best-effort removal of an uploaded file"""
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
+class IngestionQueue:
+    """Local worker pool that runs the RAG pipeline for queued upload jobs.
+
+    Jobs are persisted in the ingestion_jobs table, so a restarted process can
+    pick up work that was queued but never started.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max(1, int(max_workers))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest')
+
+    def enqueue(self, job):
+        """Hand a queued job row to the worker pool"""
+        return self.executor.submit(self._run_job, job)
+
+    def enqueue_batch(self, jobs):
+        """Hand the jobs of a bulk upload to one worker, which ingests them together"""
+        return self.executor.submit(self._run_batch, jobs)
+
+    def resume_queued_jobs(self):
+        """Re-submit jobs left in the queued state by a previous process, after
+        requeueing jobs whose worker stopped mid-run (processing for longer than
+        INGESTION_JOB_TIMEOUT)"""
+        try:
+            job_service = JobService()
+            stale = job_service.requeue_stale_jobs(Config.INGESTION_JOB_TIMEOUT)
+            if stale:
+                print(f"Requeued {len(stale)} stale ingestion jobs")
+            jobs = job_service.get_queued_jobs()
+            for job in jobs:
+                self.enqueue(job)
+            if jobs:
+                print(f"Resumed {len(jobs)} queued ingestion jobs")
+            return len(jobs)
+        except Exception as e:
+            print(f"Error resuming ingestion jobs: {str(e)}")
+            return 0
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def _run_job(self, job):
+        job_service = JobService()
+        # Another worker process may have picked the job up already
+        claimed = job_service.claim_job(job['id'], job.get('attempts') or 0)
+        if not claimed:
+            return
+
+        document_id = claimed['document_id']
+        replace = (claimed.get('kind') or 'ingest') == 'replace'
+        replacement = claimed.get('replacement') if replace else None
+        db_service = DocumentService()
+        try:
+            db_service.update_document_status(document_id, 'processing')
+            if claimed['attempts'] > 1 and not replace:
+                # A requeued job: drop the chunks its earlier attempt stored
+                db_service.delete_document_chunks(document_id)
+            if replace:
+                chunk_count = run_replace_pipeline(db_service, document_id, claimed['file_path'], claimed['file_type'])['chunk_count']
+            else:
+                chunk_count = run_rag_pipeline(db_service, document_id, claimed['file_path'], claimed['file_type'])
+            # Finish the job first so status readers see chunk_count once the document is processed
+            job_service.finish_job(claimed['id'], 'completed', chunk_count=chunk_count)
+            if replacement:
+                # The new file becomes the document's only now that its chunks are in place
+                db_service.update_document(document_id, {**replacement['document'], 'status': 'processed'})
+                remove_file(replacement.get('previous_file_path'))
+            else:
+                db_service.update_document_status(document_id, 'processed')
+        except Exception as e:
+            print(f"Error processing ingestion job {claimed['id']}: {str(e)}")
+            try:
+                # Chunks are written batch by batch; drop any partial set. A failed
+                # replace has already removed its own writes and keeps the old chunks.
+                if not replace:
+                    db_service.delete_document_chunks(document_id)
+                job_service.finish_job(claimed['id'], 'failed', error=str(e))
+                if replacement:
+                    # The document still describes the previous file; drop the new one
+                    remove_file(claimed['file_path'])
+                    db_service.update_document_status(document_id, replacement.get('previous_status') or 'failed')
+                else:
+                    db_service.update_document_status(document_id, 'failed')
+            except Exception:
+                pass
+
+    def _run_batch(self, jobs):
+        job_service = JobService()
+        db_service = DocumentService()
+        try:
+            # Jobs another worker process already picked up are left to it
+            claimed = job_service.claim_jobs([job['id'] for job in jobs])
+            if not claimed:
+                return
+            db_service.update_documents_status([job['document_id'] for job in claimed], 'processing')
+        except Exception as e:
+            print(f"Error claiming bulk ingestion jobs: {str(e)}")
+            return
+
+        finished = set()
+
+        def on_finished(job, chunk_count, error):
+            finished.add(job['id'])
+            try:
+                if error is None:
+                    job_service.finish_job(job['id'], 'completed', chunk_count=chunk_count)
+                    db_service.update_document_status(job['document_id'], 'processed')
+                    return
+                # run_bulk_pipeline has already removed the chunks of a failed document
+                print(f"Error processing ingestion job {job['id']}: {str(error)}")
+                job_service.finish_job(job['id'], 'failed', error=str(error))
+                db_service.update_document_status(job['document_id'], 'failed')
+            except Exception as e:
+                print(f"Error recording ingestion job {job['id']}: {str(e)}")
+
+        try:
+            run_bulk_pipeline(db_service, claimed, on_finished)
+        except Exception as e:
+            print(f"Error processing bulk ingestion: {str(e)}")
+            for job in claimed:
+                if job['id'] not in finished:
+                    try:
+                        db_service.delete_document_chunks(job['document_id'])
+                    except Exception:
+                        pass
+                    on_finished(job, 0, e)
@@ -0,0 +1,531 @@
+import os
+import re
+import sys
+import math
+import threading
+from collections import Counter
+import numpy as np
+from config import Config
+from .local_store import LocalIndexStore, iter_table_pages
+from .retrieval_cache import get_retrieval_cache
+
+_TOKEN_RE = re.compile(r"[0-9a-z_]+(?:[.\-:/][0-9a-z_]+)*")
+_SEPARATOR_RE = re.compile(r"[.\-:/]+")
+
+
+def tokenize(text):
+    """Lowercased word tokens. Compound identifiers (error codes, schema.table,
+    snake_case names) are kept whole and also split into their parts, so
+    `ERR-1042`, `1042`, `document_chunks` and `chunks` all match a chunk
+    mentioning ERR-1042 in public.document_chunks."""
+    tokens = []
+    for match in _TOKEN_RE.finditer((text or '').lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = _SEPARATOR_RE.split(token) if not token.isalnum() else [token]
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+        for part in parts:
+            if '_' in part:
+                tokens.extend(word for word in part.split('_') if word)
+    return tokens
+
+
+def reciprocal_rank_fusion(vector_rows, lexical_rows, top_k, k=60):
+    """Merge two ranked lists of match_documents rows by sum of 1 / (k + rank).
+
+    Rows keep the vector `similarity` when the vector side found them and
+    gain `lexical_score` when the lexical side did; `rrf_score` is the fused
+    score the result is ordered by.
+    """
+    fused = {}
+    for field, rows in (('similarity', vector_rows or []), ('lexical_score', lexical_rows or [])):
+        for rank, row in enumerate(rows):
+            entry = fused.get(row['id'])
+            if entry is None:
+                entry = fused[row['id']] = dict(row, rrf_score=0.0)
+            entry[field] = row[field]
+            entry['rrf_score'] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda row: row['rrf_score'], reverse=True)[:top_k]
+
+
+class _Segment:
+    """Immutable CSR postings: the rows, term frequencies and BM25 impacts of
+    term i are rows[offsets[i]:offsets[i + 1]], tfs[...] and impacts[...],
+    memory-mapped from disk; maxima[i] is the largest impact of term i"""
+
+    def __init__(self, index, gen):
+        self.gen = gen
+        if gen == 0:
+            self.vocab = []
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.rows = np.zeros(0, dtype=np.int32)
+            self.tfs = np.zeros(0, dtype=np.uint16)
+            self.impacts = np.zeros(0, dtype=np.float16)
+            self.maxima = np.zeros(0, dtype=np.float32)
+            self.lengths = np.zeros(0, dtype=np.float32)
+        else:
+            with open(index._file('vocab', gen), encoding='utf-8') as f:
+                text = f.read()
+            self.vocab = text.split('\n') if text else []
+            self.offsets = np.load(index._file('offsets', gen), mmap_mode='r')
+            self.rows = np.load(index._file('rows', gen), mmap_mode='r')
+            self.tfs = np.load(index._file('tfs', gen), mmap_mode='r')
+            self.lengths = np.load(index._file('lengths', gen))
+            if os.path.exists(index._file('impacts', gen)):
+                self.impacts = np.load(index._file('impacts', gen), mmap_mode='r')
+                self.maxima = np.load(index._file('maxima', gen))
+            else:
+                # Segment written before impacts were stored: derive them once per process
+                live = self.lengths[self.lengths > 0]
+                self.impacts = index._impacts(self.tfs, self.lengths[self.rows], live.mean() if len(live) else 1.0)
+                self.maxima = term_maxima(self.impacts, self.offsets)
+        self.terms = {term: i for i, term in enumerate(self.vocab)}
+
+    def postings(self, term):
+        """(rows, impacts, largest impact) of a term, or None"""
+        i = self.terms.get(term)
+        if i is None:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.rows[start:end], self.impacts[start:end], float(self.maxima[i])
+
+
+def term_maxima(impacts, offsets):
+    """Largest impact in each term's slice of CSR postings"""
+    if not len(impacts):
+        return np.zeros(len(offsets) - 1, dtype=np.float32)
+    return np.maximum.reduceat(np.asarray(impacts, dtype=np.float32), np.asarray(offsets[:-1]))
+
+
+class _Term:
+    """Postings of one query term: (rows, impacts) from the segment and the delta,
+    each sorted by row, with the term's idf and an upper bound on its score"""
+
+    def __init__(self, sources, idf, bound):
+        self.sources = sources
+        self.df = sum(len(rows) for rows, _ in sources)
+        self.idf = idf
+        self.bound = bound
+
+
+class _View:
+    """One process's state: the current segment plus postings for rows added since"""
+
+    def __init__(self, version, segment, delta, applied_row, lengths, deleted, live_rows, total_length):
+        self.version = version
+        self.segment = segment
+        self.delta = delta  # term -> (rows int32, tfs float32)
+        self.applied_row = applied_row
+        self.lengths = lengths
+        self.deleted = deleted
+        self.live_rows = live_rows
+        self.total_length = total_length
+
+
+class LexicalIndex(LocalIndexStore):
+    """BM25 inverted index over chunk content.
+
+    Postings live in an immutable segment (CSR arrays: int32 rows, uint16 term
+    frequencies, memory-mapped) plus a small in-memory delta for rows added
+    since the segment was written; each process tokenizes only those new rows
+    when it sees a newer version. Deletes are tombstones. Once the delta or
+    the tombstones grow past a fraction of the segment, the writer merges
+    everything into a new segment generation.
+
+    The segment also stores each posting's BM25 impact (the tf and length
+    normalization part of the score, float16, against the average length when
+    the segment was written) and each term's largest impact. Queries are scored
+    MaxScore-style: once a first pass over the rarest terms has set the score
+    a result must beat, terms whose combined upper bounds cannot reach it only
+    add to the scores of candidates found through the other terms, so their
+    (long) postings are never scanned.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    MERGE_MIN_ROWS = 20000
+    MERGE_FRACTION = 0.25
+    COMMON_TERM_FRACTION = 0.5  # terms in more than half the chunks barely move BM25
+    META_KEYS = ('rows', 'live_rows', 'total_length', 'deleted', 'segment_gen', 'segment_rows')
+
+    def __init__(self, path):
+        self._load_lock = threading.Lock()
+        self._view = None
+        super().__init__(path)
+
+    def _create_tables(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " row INTEGER PRIMARY KEY, id TEXT, document_id TEXT, chunk_index INTEGER,"
+            " content TEXT, length INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id)")
+
+    def _file(self, kind, gen):
+        return os.path.join(self.path, f"{kind}-{gen}.{'txt' if kind == 'vocab' else 'npy'}")
+
+    SEGMENT_FILES = ('vocab', 'offsets', 'rows', 'tfs', 'impacts', 'maxima', 'lengths')
+
+    def _after_commit(self, meta):
+        gen = meta['segment_gen']
+        self._remove_stale_files(
+            {os.path.basename(self._file(kind, gen)) for kind in self.SEGMENT_FILES},
+            self.SEGMENT_FILES
+        )
+
+    def _impacts(self, tfs, lengths, avgdl):
+        """BM25 tf saturation and length normalization of postings (score = idf * impact)"""
+        tfs = np.asarray(tfs, dtype=np.float32)
+        norms = self.K1 * (1 - self.B + self.B * np.asarray(lengths, dtype=np.float32) / max(float(avgdl), 1.0))
+        return (tfs * (self.K1 + 1) / (tfs + norms)).astype(np.float16)
+
+    def add(self, chunks, vectors=None, merge=True):
+        """Append chunks (dicts with id, document_id, chunk_index, content).
+        `vectors` is accepted for parity with VectorIndex.add and ignored."""
+        if not chunks:
+            return
+        with self._transaction() as conn:
+            # A re-written (upserted) chunk replaces its old copy
+            self._tombstone(conn, self._live_rows(conn, 'id', [chunk.get('id') for chunk in chunks]))
+            meta = self._meta(conn)
+            rows = meta['rows']
+            records = [
+                (rows + i, str(chunk.get('id')), str(chunk.get('document_id')), chunk.get('chunk_index'),
+                 chunk.get('content'), len(tokenize(chunk.get('content'))))
+                for i, chunk in enumerate(chunks)
+            ]
+            conn.executemany(
+                "INSERT INTO chunks (row, id, document_id, chunk_index, content, length) VALUES (?, ?, ?, ?, ?, ?)",
+                records
+            )
+            meta.update(
+                rows=rows + len(records),
+                live_rows=meta['live_rows'] + len(records),
+                total_length=meta['total_length'] + sum(record[5] for record in records)
+            )
+            self._set_meta(conn, rows=meta['rows'], live_rows=meta['live_rows'], total_length=meta['total_length'])
+            if merge and self._needs_merge(meta):
+                self._merge(conn, meta)
+
+    def _needs_merge(self, meta):
+        threshold = max(self.MERGE_MIN_ROWS, meta['segment_rows'] * self.MERGE_FRACTION)
+        return meta['rows'] - meta['segment_rows'] > threshold or meta['deleted'] > threshold
+
+    def merge(self):
+        """Fold the delta and tombstones into a new segment now (after bulk loads)"""
+        with self._transaction() as conn:
+            self._merge(conn, self._meta(conn))
+
+    def _merge(self, conn, meta):
+        old = _Segment(self, meta['segment_gen'])
+        vocab = list(old.vocab)
+        term_ids = dict(old.terms)
+        new_terms, new_rows, new_tfs = [], [], []
+        for row, content in conn.execute(
+            "SELECT row, content FROM chunks WHERE row >= ? AND deleted = 0", (meta['segment_rows'],)
+        ):
+            for term, tf in Counter(tokenize(content)).items():
+                term_id = term_ids.get(term)
+                if term_id is None:
+                    term_id = term_ids[term] = len(vocab)
+                    vocab.append(term)
+                new_terms.append(term_id)
+                new_rows.append(row)
+                new_tfs.append(min(tf, 65535))
+
+        terms = np.concatenate([
+            np.repeat(np.arange(len(old.vocab), dtype=np.int32), np.diff(old.offsets)),
+            np.array(new_terms, dtype=np.int32)
+        ])
+        rows = np.concatenate([np.asarray(old.rows), np.array(new_rows, dtype=np.int32)])
+        tfs = np.concatenate([np.asarray(old.tfs), np.array(new_tfs, dtype=np.uint16)])
+        deleted = np.array([row for (row,) in conn.execute("SELECT row FROM chunks WHERE deleted = 1")], dtype=np.int32)
+        if len(deleted):
+            keep = ~np.isin(rows, deleted)
+            terms, rows, tfs = terms[keep], rows[keep], tfs[keep]
+
+        counts = np.bincount(terms, minlength=len(vocab))
+        used = counts > 0
+        terms = (np.cumsum(used) - 1)[terms]
+        order = np.lexsort((rows, terms))
+        lengths = np.zeros(meta['rows'], dtype=np.float32)
+        for row, length in conn.execute("SELECT row, length FROM chunks WHERE deleted = 0"):
+            lengths[row] = length
+
+        conn.execute("DELETE FROM chunks WHERE deleted = 1")
+        rows, tfs = rows[order], tfs[order]
+        avgdl = meta['total_length'] / meta['live_rows'] if meta['live_rows'] > 0 else 1.0
+        self._write_segment(
+            conn, meta,
+            [term for term, keep in zip(vocab, used) if keep],
+            np.concatenate(([0], np.cumsum(counts[used]))).astype(np.int64),
+            rows, tfs, self._impacts(tfs, lengths[rows], avgdl), lengths
+        )
+
+    def _write_segment(self, conn, meta, vocab, offsets, rows, tfs, impacts, lengths):
+        gen = meta['segment_gen'] + 1
+        with open(self._file('vocab', gen), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(vocab))
+        np.save(self._file('offsets', gen), offsets)
+        np.save(self._file('rows', gen), rows.astype(np.int32, copy=False))
+        np.save(self._file('tfs', gen), tfs.astype(np.uint16, copy=False))
+        np.save(self._file('impacts', gen), impacts.astype(np.float16, copy=False))
+        np.save(self._file('maxima', gen), term_maxima(impacts, offsets))
+        np.save(self._file('lengths', gen), lengths)
+        self._set_meta(conn, segment_gen=gen, segment_rows=len(lengths), deleted=0)
+
+    def _tombstoned(self, conn, meta, rows):
+        removed_length = 0
+        for start in range(0, len(rows), 500):
+            part = rows[start:start + 500]
+            removed_length += conn.execute(
+                f"SELECT COALESCE(SUM(length), 0) FROM chunks WHERE row IN ({','.join('?' * len(part))})", part
+            ).fetchone()[0]
+        meta.update(
+            live_rows=meta['live_rows'] - len(rows),
+            total_length=meta['total_length'] - removed_length,
+            deleted=meta['deleted'] + len(rows)
+        )
+        self._set_meta(conn, live_rows=meta['live_rows'], total_length=meta['total_length'], deleted=meta['deleted'])
+        if self._needs_merge(meta):
+            self._merge(conn, meta)
+
+    def clear(self):
+        with self._transaction() as conn:
+            meta = self._meta(conn)
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM documents")
+            self._set_meta(conn, rows=0, live_rows=0, total_length=0)
+            empty = np.zeros(0, dtype=np.int32)
+            self._write_segment(conn, meta, [], np.zeros(1, dtype=np.int64), empty, empty, empty,
+                                np.zeros(0, dtype=np.float32))
+
+    def build_from_supabase(self, supabase, page_size=1000):
+        """Rebuild the index from the documents and document_chunks tables"""
+        # Searches fall back to Supabase until the rebuild is complete
+        self.mark_stale()
+        self.clear()
+        self._put_documents_from_supabase(supabase)
+        for page in iter_table_pages(supabase, 'document_chunks', 'id,document_id,chunk_index,content', page_size):
+            self.add(page, merge=False)
+        self.merge()
+        self._mark_built()
+        get_retrieval_cache().invalidate()
+        return self.stats()
+
+    def _load(self, previous):
+        """Bring this process's view up to the current version, reusing `previous`
+        unless the segment changed; retried if a merge swaps files underneath"""
+        conn = self._connection()
+        for attempt in range(3):
+            conn.execute("BEGIN")
+            try:
+                meta = self._meta(conn)
+                same_segment = previous is not None and previous.segment.gen == meta['segment_gen']
+                applied_row = previous.applied_row if same_segment else meta['segment_rows']
+                added = conn.execute(
+                    "SELECT row, content, length FROM chunks WHERE row >= ? AND row < ? ORDER BY row",
+                    (applied_row, meta['rows'])
+                ).fetchall()
+                deleted_rows = [row for (row,) in conn.execute("SELECT row FROM chunks WHERE deleted = 1")]
+            finally:
+                conn.execute("COMMIT")
+            try:
+                segment = previous.segment if same_segment else _Segment(self, meta['segment_gen'])
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                continue
+            break
+
+        delta = dict(previous.delta) if same_segment else {}
+        lengths = previous.lengths if same_segment else segment.lengths
+        if added:
+            grouped = {}
+            for row, content, _ in added:
+                for term, tf in Counter(tokenize(content)).items():
+                    grouped.setdefault(term, ([], []))
+                    grouped[term][0].append(row)
+                    grouped[term][1].append(tf)
+            for term, (rows, tfs) in grouped.items():
+                rows = np.array(rows, dtype=np.int32)
+                tfs = np.array(tfs, dtype=np.float32)
+                if term in delta:
+                    rows = np.concatenate((delta[term][0], rows))
+                    tfs = np.concatenate((delta[term][1], tfs))
+                delta[term] = (rows, tfs)
+            grown = np.zeros(meta['rows'], dtype=np.float32)
+            grown[:len(lengths)] = lengths
+            grown[[row for row, _, _ in added]] = [length for _, _, length in added]
+            lengths = grown
+
+        deleted = np.zeros(len(lengths), dtype=bool)
+        deleted[[row for row in deleted_rows if row < len(lengths)]] = True
+        return _View(meta['version'], segment, delta, max(applied_row, meta['rows']), lengths, deleted,
+                     meta['live_rows'], meta['total_length'])
+
+    def _current(self):
+        version = self._version()
+        view = self._view
+        if view is None or view.version != version:
+            with self._load_lock:
+                view = self._view
+                if view is None or view.version != version:
+                    view = self._view = self._load(view)
+        return view
+
+    def search(self, query_text, top_k=5):
+        """Top-k chunks by BM25 score, shaped like match_documents rows with `lexical_score`"""
+        view = self._current()
+        tokens = list(dict.fromkeys(tokenize(query_text)))
+        if not tokens or view.live_rows <= 0 or top_k <= 0:
+            return []
+        n = view.live_rows
+        avgdl = max(view.total_length / n, 1.0)
+
+        terms = []
+        for token in tokens:
+            sources, bound = [], 0.0
+            found = view.segment.postings(token)
+            if found is not None and len(found[0]):
+                sources.append(found[:2])
+                bound = found[2]
+            delta = view.delta.get(token)
+            if delta is not None and len(delta[0]):
+                impacts = self._impacts(delta[1], view.lengths[delta[0]], avgdl)
+                sources.append((delta[0], impacts))
+                bound = max(bound, float(impacts.max()))
+            df = sum(len(rows) for rows, _ in sources)
+            if df:
+                # Postings still hold tombstoned rows until the next merge
+                idf = math.log(1 + (n - min(df, n) + 0.5) / (min(df, n) + 0.5))
+                terms.append(_Term(sources, idf, idf * bound))
+        if not terms:
+            return []
+        # Very common terms add little but cost the most; keep them only if nothing else matched
+        selective = [term for term in terms if term.df <= n * self.COMMON_TERM_FRACTION]
+        terms = selective or terms
+
+        rows, scores = self._top_rows(view, terms, top_k)
+        if not len(rows):
+            return []
+        return self._chunk_rows(rows, scores, 'lexical_score')
+
+    def _top_rows(self, view, terms, top_k):
+        """(rows, scores) of the best `top_k` live rows, best first"""
+        corpus = len(view.lengths)
+        by_df = sorted(terms, key=lambda term: term.df)
+        # First pass over the rarest terms: exact scores of enough live rows to know
+        # the score a result has to beat
+        seed, seeded = [], 0
+        for term in by_df:
+            seed.append(term)
+            seeded += term.df
+            if seeded >= top_k:
+                break
+        threshold = 0.0
+        if len(seed) < len(terms) and seeded * 16 < corpus:
+            candidates, scores = self._accumulate(seed)
+            live = ~view.deleted[candidates]
+            candidates, scores = candidates[live], scores[live]
+            if len(candidates) >= top_k:
+                scores += self._lookup([term for term in terms if term not in seed], candidates)
+                threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+
+        # Terms that cannot lift a row into the top k on their own, even together,
+        # are only looked up for rows found through the other (essential) terms
+        optional, reach = [], 0.0
+        for term in sorted(terms, key=lambda term: term.bound):
+            # Scores are float32 sums, which can round just past the bounds
+            if (reach + term.bound) * 1.001 >= threshold:
+                break
+            optional.append(term)
+            reach += term.bound
+        essential = [term for term in terms if term not in optional] or terms
+
+        postings = sum(term.df for term in essential)
+        if len(terms) == 1:
+            term = terms[0]
+            rows = np.concatenate([np.asarray(rows) for rows, _ in term.sources])
+            scores = term.idf * np.concatenate([np.asarray(impacts, dtype=np.float32) for _, impacts in term.sources])
+        elif postings * 16 < corpus:
+            # Sorting the postings is cheaper than scanning a corpus-sized accumulator
+            rows, scores = self._accumulate(essential)
+            scores += self._lookup(optional, rows)
+        else:
+            totals = np.zeros(corpus, dtype=np.float32)
+            for term in terms:
+                for rows, impacts in term.sources:
+                    totals[rows] += term.idf * np.asarray(impacts, dtype=np.float32)
+            totals[view.deleted] = 0
+            # Selecting from the accumulator directly; listing its nonzero rows costs more
+            rows = np.argpartition(-totals, top_k - 1)[:top_k] if corpus > top_k else np.arange(corpus)
+            rows = rows[totals[rows] > 0]
+            scores = totals[rows]
+        live = ~view.deleted[rows]
+        rows, scores = rows[live], scores[live]
+        k = min(top_k, len(rows))
+        if k == 0:
+            return rows[:0], scores[:0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return rows[top], scores[top]
+
+    @staticmethod
+    def _accumulate(terms):
+        """Sorted rows with any of `terms` and their summed scores over those terms"""
+        rows = np.concatenate([np.asarray(rows) for term in terms for rows, _ in term.sources])
+        scores = np.concatenate([
+            term.idf * np.asarray(impacts, dtype=np.float32) for term in terms for _, impacts in term.sources
+        ])
+        order = np.argsort(rows, kind='stable')
+        rows, scores = rows[order], scores[order]
+        starts = np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1])))
+        return rows[starts], np.add.reduceat(scores, starts).astype(np.float32) if len(rows) else scores
+
+    @staticmethod
+    def _lookup(terms, candidates):
+        """Scores of sorted `candidates` over `terms`, found by binary search in their postings"""
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        for term in terms:
+            for rows, impacts in term.sources:
+                pos = np.searchsorted(rows, candidates)
+                hit = pos < len(rows)
+                hit[hit] = rows[pos[hit]] == candidates[hit]
+                scores[hit] += term.idf * np.asarray(impacts[pos[hit]], dtype=np.float32)
+        return scores
+
+    def stats(self):
+        meta = self._meta(self._connection())
+        return {
+            'rows': meta['rows'],
+            'live_rows': meta['live_rows'],
+            'segment_rows': meta['segment_rows'],
+            'delta_rows': meta['rows'] - meta['segment_rows'],
+            'version': meta['version'],
+            'ready': bool(meta['built'])
+        }
+
+
+_lexical_index = None
+_lexical_index_lock = threading.Lock()
+
+
+def get_lexical_index():
+    """Return the process-wide BM25 index, or None when hybrid search is off"""
+    global _lexical_index
+    if not Config.HYBRID_SEARCH_ENABLED:
+        return None
+    with _lexical_index_lock:
+        if _lexical_index is None:
+            _lexical_index = LexicalIndex(Config.LEXICAL_INDEX_PATH)
+        return _lexical_index
+
+
+if __name__ == '__main__':
+    # python -m rag.lexical_index rebuild
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit("usage: python -m rag.lexical_index rebuild")
+    from sb.client import get_supabase_client
+    print(LexicalIndex(Config.LEXICAL_INDEX_PATH).build_from_supabase(get_supabase_client()))
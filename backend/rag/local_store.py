@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from config import Config
+
+
+def iter_table_pages(supabase, table, columns, page_size=1000):
+    """Yield pages of a Supabase table ordered by id, for rebuilding local indexes"""
+    start = 0
+    while True:
+        page = supabase.table(table).select(columns).order('id').range(start, start + page_size - 1).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+class LocalIndexStore(ABC):
+    """SQLite bookkeeping shared by the local retrieval indexes.
+
+    `index.sqlite3` under `path` holds a key/value `meta` table (a `version`
+    bumped by every write, a `built` flag plus the subclass's META_KEYS), the
+    document fields returned with search results, and whatever chunk tables
+    the subclass creates. Writers are serialized across threads and processes
+    by BEGIN IMMEDIATE; readers compare `version` to decide when to reload.
+    """
+
+    META_KEYS = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, name TEXT, file_path TEXT, file_type TEXT)")
+        self._create_tables(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks(id)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)",
+            [(key,) for key in ('version', 'built', *self.META_KEYS)]
+        )
+
+    def _create_tables(self, conn):
+        pass
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, 'index.sqlite3'), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, conn):
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def _set_meta(self, conn, **values):
+        conn.executemany("UPDATE meta SET value = ? WHERE key = ?", [(int(v), k) for k, v in values.items()])
+
+    def _version(self):
+        return self._connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    @contextmanager
+    def _transaction(self):
+        """Serialize writers across threads and processes; bump the version on commit"""
+        conn = self._connection()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._after_commit(self._meta(conn))
+
+    def _after_commit(self, meta):
+        pass
+
+    def _remove_stale_files(self, current, prefixes):
+        """Delete data files from superseded generations (open mappings stay valid)"""
+        for name in os.listdir(self.path):
+            if name.split('-')[0] in prefixes and name not in current:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    @property
+    def ready(self):
+        return bool(self._meta(self._connection())['built'])
+
+    def mark_stale(self):
+        """Stop serving searches until the next full build (after a failed sync)"""
+        with self._transaction() as conn:
+            self._set_meta(conn, built=0)
+
+    def _mark_built(self):
+        with self._transaction() as conn:
+            self._set_meta(conn, built=1)
+
+    def put_document(self, document):
+        """Record the document fields returned alongside search results"""
+        self.put_documents([document])
+
+    def put_documents(self, documents):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, name, file_path, file_type) VALUES (?, ?, ?, ?)",
+                [
+                    (str(document['id']), document.get('name'), document.get('file_path'), document.get('file_type'))
+                    for document in documents
+                ]
+            )
+
+    def remove_documents(self, document_ids):
+        self.remove_chunks(document_ids)
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM documents WHERE id = ?", [(str(document_id),) for document_id in document_ids])
+
+    def remove_chunks(self, document_ids):
+        """Tombstone every chunk of the given documents"""
+        with self._transaction() as conn:
+            self._tombstone(conn, self._live_rows(conn, 'document_id', document_ids))
+
+    def remove_chunk_ids(self, chunk_ids):
+        """Tombstone individual chunks by their Supabase id"""
+        with self._transaction() as conn:
+            self._tombstone(conn, self._live_rows(conn, 'id', chunk_ids))
+
+    def renumber_chunks(self, chunk_ids):
+        """Set the chunk_index of each chunk to its position in `chunk_ids`"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE chunks SET chunk_index = ? WHERE deleted = 0 AND id = ?",
+                [(position, str(chunk_id)) for position, chunk_id in enumerate(chunk_ids)]
+            )
+
+    def _live_rows(self, conn, column, values):
+        values = [str(value) for value in values]
+        rows = []
+        for start in range(0, len(values), 500):
+            part = values[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows += [row for (row,) in conn.execute(f"SELECT row FROM chunks WHERE deleted = 0 AND {column} IN ({placeholders})", part)]
+        return rows
+
+    def _tombstone(self, conn, rows):
+        """Mark `rows` deleted and let the subclass update its counters"""
+        if not rows:
+            return
+        conn.executemany("UPDATE chunks SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+        self._tombstoned(conn, self._meta(conn), rows)
+
+    @abstractmethod
+    def _tombstoned(self, conn, meta, rows):
+        """Update the subclass's counters for newly deleted `rows` (inside the write transaction)"""
+
+    def _put_documents_from_supabase(self, supabase):
+        for page in iter_table_pages(supabase, Config.SUPABASE_DOCUMENTS_TABLE, 'id,name,file_path,file_type'):
+            self.put_documents(page)
+
+    def _chunk_rows(self, rows, scores, score_key):
+        """match_documents-shaped rows for chunk `rows`, in the given order"""
+        placeholders = ",".join("?" * len(rows))
+        found = {
+            row[0]: row for row in self._connection().execute(
+                "SELECT c.row, c.id, c.document_id, c.chunk_index, c.content, d.name, d.file_path, d.file_type"
+                " FROM chunks c LEFT JOIN documents d ON d.id = c.document_id"
+                f" WHERE c.deleted = 0 AND c.row IN ({placeholders})",
+                [int(row) for row in rows]
+            )
+        }
+        results = []
+        for row, score in zip(rows, scores):
+            match = found.get(int(row))
+            if match is None:
+                continue  # deleted since this process loaded the index
+            results.append({
+                'id': match[1],
+                'document_id': match[2],
+                'chunk_index': match[3],
+                'content': match[4],
+                score_key: float(score),
+                'document_name': match[5],
+                'document_path': match[6],
+                'document_type': match[7]
+            })
+        return results
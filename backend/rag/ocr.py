@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import fitz  # PyMuPDF
+from PIL import Image
+import pytesseract
+from config import Config
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def resolve_ocr_workers(max_workers=None):
+    return max_workers or Config.OCR_WORKERS or os.cpu_count() or 1
+
+
+def get_ocr_pool(max_workers=None):
+    """Return the process-wide OCR pool, creating it on first use"""
+    global _pool, _pool_workers
+    workers = resolve_ocr_workers(max_workers)
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+def render_page_samples(page, dpi):
+    """Render a page to raw 8-bit grayscale samples (no PNG encode/decode)"""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return pix.width, pix.height, pix.samples
+
+
+def ocr_page_samples(page_number, width, height, samples, lang="eng"):
+    """Worker entry point: wrap raw samples in a PIL image and run tesseract"""
+    started = time.perf_counter()
+    img = Image.frombuffer("L", (width, height), samples, "raw", "L", 0, 1)
+    text = pytesseract.image_to_string(img, lang=lang)
+    return page_number, text, time.perf_counter() - started
+
+
+def submit_page_ocr(page, dpi=None, max_workers=None, lang="eng"):
+    """
+    Render a page in the caller and hand its samples to the OCR pool.
+    Returns a future resolving to (page_number, text, ocr_seconds). With a single
+    worker the page is OCR'd inline and an already-completed future is returned.
+    """
+    width, height, samples = render_page_samples(page, dpi or Config.OCR_DPI)
+    workers = resolve_ocr_workers(max_workers)
+    if workers == 1:
+        future = Future()
+        future.set_result(ocr_page_samples(page.number, width, height, samples, lang))
+        return future
+    return get_ocr_pool(workers).submit(ocr_page_samples, page.number, width, height, samples, lang)
+
+
+def ocr_pages(doc, page_numbers, dpi=None, max_workers=None, lang="eng"):
+    """
+    OCR the given pages of an open fitz document across a process pool.
+    Yields (page_number, text, ocr_seconds) in the order of `page_numbers`. Only a
+    bounded number of rendered pages are in flight at once, so memory stays
+    proportional to the worker count rather than the page count.
+    """
+    window = resolve_ocr_workers(max_workers) * 2
+    pending = deque()
+    for page_number in page_numbers:
+        pending.append(submit_page_ocr(doc[page_number], dpi, max_workers, lang))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
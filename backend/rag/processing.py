@@ -0,0 +1,309 @@
+import codecs
+import io
+import mmap
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future
+import fitz  # PyMuPDF
+import docx2txt
+import edoc
+from config import Config
+from .embedding_cache import get_embedding_cache, normalize_chunk_text
+from .chunkers import chunk_text, get_chunker, iter_chunks  # re-exported for existing callers
+from .embeddings import get_embedding_engine
+from .ocr import ocr_pages, resolve_ocr_workers, submit_page_ocr
+
+TEXT_BLOCK_BYTES = 64 * 1024
+
+
+def ocr_pdf_from_bytes_pymupdf(pdf_bytes, dpi=None, max_workers=None):
+    """
+    Run OCR on a PDF given as bytes using PyMuPDF to render pages as images.
+    No Poppler required. Pages are OCR'd in parallel across a process pool
+    (`OCR_WORKERS`) at `OCR_DPI`, keeping page order.
+    """
+    parts = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page_number, page_text, _ in ocr_pages(doc, range(len(doc)), dpi=dpi, max_workers=max_workers):
+            parts.append(f"\n--- OCR Page {page_number + 1} ---\n{page_text}")
+    return "".join(parts)
+
+
+def classify_pdf_page(page, page_text, min_chars_threshold=20):
+    """
+    Decide how to read a single page: 'text' if it has a usable text layer,
+    'ocr' if it has no text but carries images (a scan), otherwise 'empty'.
+    """
+    if len(page_text.strip()) > min_chars_threshold:
+        return 'text'
+    if page.get_images(full=False):
+        return 'ocr'
+    return 'empty'
+
+
+def iter_pdf_pages(doc, min_chars_threshold=20, page_stats=None):
+    """
+    Yield the text of each page of an open fitz document in page order.
+    Text pages are read directly; image-only pages are OCR'd on the pool while
+    later pages are still being read. At most a small window of pages is held
+    at once. Per-page kind and seconds are appended to `page_stats` if given.
+    """
+    window = resolve_ocr_workers() * 2
+    pending = deque()  # (stat, text or OCR future), in page order
+    in_flight = 0
+
+    def release(block):
+        nonlocal in_flight
+        while pending:
+            stat, item = pending[0]
+            if isinstance(item, Future):
+                if not block and not item.done() and in_flight < window and len(pending) < window * 4:
+                    return
+                pending.popleft()
+                in_flight -= 1
+                page_number, page_text, seconds = item.result()
+                stat['seconds'] += seconds
+                yield f"\n--- OCR Page {page_number + 1} ---\n{page_text}"
+            else:
+                pending.popleft()
+                yield item
+
+    for page in doc:
+        started = time.perf_counter()
+        page_text = page.get_text()
+        kind = classify_pdf_page(page, page_text, min_chars_threshold)
+        stat = {'page': page.number + 1, 'kind': kind, 'seconds': 0.0}
+        if kind == 'ocr':
+            pending.append((stat, submit_page_ocr(page)))
+            in_flight += 1
+        else:
+            pending.append((stat, page_text))
+        stat['seconds'] += time.perf_counter() - started
+        if page_stats is not None:
+            page_stats.append(stat)
+        yield from release(block=False)
+
+    yield from release(block=True)
+
+
+def log_pdf_stats(page_stats, seconds):
+    """Print a one-line summary of a PDF extraction plus its slowest pages"""
+    counts = {'text': 0, 'ocr': 0, 'empty': 0}
+    for stat in page_stats:
+        counts[stat['kind']] += 1
+    print(f"📄 PDF extracted: {len(page_stats)} pages ({counts['text']} text, {counts['ocr']} OCR, "
+          f"{counts['empty']} empty) in {seconds:.2f}s")
+    slowest = sorted(page_stats, key=lambda stat: stat['seconds'], reverse=True)[:3]
+    if slowest:
+        print("   slowest pages: " + ", ".join(
+            f"p{stat['page']} {stat['kind']} {stat['seconds']:.2f}s" for stat in slowest
+        ))
+
+
+def iter_pdf_text(doc, min_chars_threshold=20):
+    """Stream page texts from an open fitz document and log page-level timing at the end"""
+    started = time.perf_counter()
+    page_stats = []
+    try:
+        yield from iter_pdf_pages(doc, min_chars_threshold, page_stats)
+    finally:
+        doc.close()
+    log_pdf_stats(page_stats, time.perf_counter() - started)
+
+
+def extract_pdf_text_from_bytes(pdf_bytes, min_chars_threshold=20):
+    """
+    Extract text from PDF bytes. Pages with a text layer are read directly and
+    only image-only pages are OCR'd, so OCR cost follows the scanned content.
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    return "".join(iter_pdf_text(doc, min_chars_threshold))
+
+
+@contextmanager
+def mapped_file(file_path: str):
+    """Read-only memory map of a saved upload (b'' for an empty file), so text is decoded
+    straight from the page cache the upload was just written into"""
+    with open(file_path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+
+def iter_decoded(view, block_bytes=TEXT_BLOCK_BYTES):
+    """UTF-8 text of a byte view in blocks, with universal newlines as open(..., 'r') gives"""
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='ignore'), translate=True)
+    for start in range(0, len(view), block_bytes):
+        block = decoder.decode(view[start:start + block_bytes])
+        if block:
+            yield block
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_text(file_path: str, file_type: str):
+    """
+    Yield the text of a file in pieces: pages for PDFs, fixed-size blocks for
+    plain-text formats. Formats whose libraries only return a whole string
+    (DOCX/DOC) yield it as a single piece.
+    """
+    ft = (file_type or '').upper()
+    if ft == 'PDF':
+        # Opening by path lets MuPDF read pages on demand instead of loading the whole file
+        yield from iter_pdf_text(fitz.open(file_path))
+        return
+    if ft == 'DOCX':
+        # docx2txt handles .docx; .doc may fail
+        yield docx2txt.process(file_path) or ''
+        return
+    if ft == 'DOC':
+        yield edoc.extraxt_txt(file_path)
+        return
+    # Plain-text like files (and the utf-8 fallback for anything else)
+    with mapped_file(file_path) as view:
+        yield from iter_decoded(view)
+
+
+def iter_document_chunks(file_path: str, file_type: str):
+    """Stream a document's chunks, cut by the chunker configured for its type"""
+    return get_chunker(file_type).iter_chunks(iter_text(file_path, file_type))
+
+
+def extract_text(file_path: str, file_type: str) -> str:
+    """Extract text from supported file types."""
+    try:
+        return "".join(iter_text(file_path, file_type))
+    except Exception:
+        return ''
+
+
+def iter_batches(items, batch_size):
+    """Group an iterable into lists of at most `batch_size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_chunks_openai(chunks: list) -> list:
+    """Create embeddings for chunks using the configured OpenAI embedding model.
+    Chunks already in the embedding cache are served locally; only new text
+    (de-duplicated) reaches the API via the shared EmbeddingEngine.
+    """
+    if not chunks:
+        return []
+    engine = get_embedding_engine()
+    cache = get_embedding_cache()
+    if cache is None:
+        return engine.embed(chunks)
+
+    vectors = [None] * len(chunks)
+    for idx, vector in cache.get_many(engine.model, chunks).items():
+        vectors[idx] = vector
+
+    # Embed each distinct missing text once
+    missing = {}
+    for idx, chunk in enumerate(chunks):
+        if vectors[idx] is None:
+            missing.setdefault(normalize_chunk_text(chunk), []).append(idx)
+    if missing:
+        texts = [chunks[positions[0]] for positions in missing.values()]
+        new_vectors = engine.embed(texts)
+        for positions, vector in zip(missing.values(), new_vectors):
+            for idx in positions:
+                vectors[idx] = vector
+        cache.put_many(engine.model, texts, new_vectors)
+    return vectors
+
+
+def run_rag_pipeline(db_service, document_id, file_path: str, file_type: str) -> int:
+    """
+    Stream a document through extract -> chunk -> embed -> insert in batches of
+    `INGESTION_BATCH_SIZE` chunks, so memory stays bounded by the batch size
+    rather than the file size. Returns the chunk count.
+    """
+    chunk_count = 0
+    insert_seconds = 0.0
+    chunks = iter_document_chunks(file_path, file_type)
+    for batch in iter_batches(chunks, Config.INGESTION_BATCH_SIZE):
+        embeddings = embed_chunks_openai(batch)
+        chunk_rows = [
+            { 'chunk_index': chunk_count + idx, 'content': batch[idx], 'embedding': embeddings[idx] }
+            for idx in range(len(batch))
+        ]
+        start = time.perf_counter()
+        db_service.insert_document_chunks(document_id, chunk_rows)
+        insert_seconds += time.perf_counter() - start
+        chunk_count += len(chunk_rows)
+    if chunk_count:
+        print(f"🧩 Stored {chunk_count} chunks in {insert_seconds:.2f}s ({chunk_count / max(insert_seconds, 1e-9):.0f} rows/s)")
+    return chunk_count
+
+
+def run_replace_pipeline(db_service, document_id, file_path: str, file_type: str) -> dict:
+    """
+    Re-ingest a new version of a document by diffing chunk hashes against its
+    stored chunks. Only chunks whose text is new are embedded and written
+    (first after the current highest chunk_index); then, in one transaction,
+    chunks that no longer occur are deleted and every remaining chunk is
+    renumbered by its position in the new version, so chunk_index keeps
+    following document order. Unchanged rows keep their content and
+    embedding. Streams like run_rag_pipeline; on failure the chunks written
+    so far are removed, leaving the previous version in place. Returns chunk
+    counts.
+    """
+    available = {}  # content hash -> ids of stored chunks not yet matched, in order
+    next_index = 0
+    for chunk in db_service.get_chunk_hashes(document_id):
+        available.setdefault(chunk['hash'], deque()).append(chunk['id'])
+        next_index = max(next_index, chunk['chunk_index'] + 1)
+
+    counts = {'kept': 0, 'added': 0, 'removed': 0}
+    order = []  # the new version: ids of kept chunks, temporary chunk_index of new ones
+
+    def new_chunks():
+        added = 0
+        for text in iter_document_chunks(file_path, file_type):
+            ids = available.get(db_service.content_hash(text))
+            if ids:
+                order.append(ids.popleft())
+                counts['kept'] += 1
+            else:
+                order.append(next_index + added)
+                added += 1
+                yield text
+
+    written = {}  # temporary chunk_index -> id of the chunks written so far
+    try:
+        for batch in iter_batches(new_chunks(), Config.INGESTION_BATCH_SIZE):
+            embeddings = embed_chunks_openai(batch)
+            chunk_rows = [
+                { 'chunk_index': next_index + counts['added'] + idx, 'content': batch[idx], 'embedding': embeddings[idx] }
+                for idx in range(len(batch))
+            ]
+            for row in db_service.insert_document_chunks(document_id, chunk_rows):
+                written[row['chunk_index']] = row['id']
+            counts['added'] += len(chunk_rows)
+        chunk_ids = [written[item] if isinstance(item, int) else item for item in order]
+        counts['removed'] = db_service.reorder_chunks(document_id, chunk_ids)
+    except Exception:
+        try:
+            if written:
+                db_service.delete_chunks(document_id, list(written.values()))
+        except Exception:
+            pass
+        raise
+    counts['chunk_count'] = counts['kept'] + counts['added']
+    print(f"🔁 Replaced document {document_id}: {counts['kept']} chunks unchanged, "
+          f"{counts['added']} added, {counts['removed']} removed")
+    return counts
+
@@ -0,0 +1,252 @@
+import itertools
+import re
+import threading
+from config import Config
+from .embedding_cache import normalize_chunk_text
+from .embeddings import get_token_counter
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators around each chat message
+MERGE_PROBE_CHARS = 32
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+SUMMARY_LINE_WORDS = 30
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def merge_overlap(left, right):
+    """Join two consecutive chunks of one document, dropping the text the end of
+    `left` shares with the start of `right` (the chunker's overlap)"""
+    probe = right[:MERGE_PROBE_CHARS]
+    pos = left.find(probe, max(0, len(left) - len(right)))
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return left + right[len(left) - pos:]
+        pos = left.find(probe, pos + 1)
+    return f"{left}\n{right}"
+
+
+def summarize_turn(message):
+    """One summary line for a chat message: its role and first sentence"""
+    content = " ".join((message.get("content") or "").split())
+    sentence = _SENTENCE_END_RE.split(content, 1)[0]
+    words = sentence.split(" ")
+    if len(words) > SUMMARY_LINE_WORDS:
+        sentence = " ".join(words[:SUMMARY_LINE_WORDS]) + " ..."
+    role = "User" if message.get("role", "user") == "user" else "Assistant"
+    return f"- {role}: {sentence}"
+
+
+class PromptBudget:
+    """Assembles chat prompts within a token budget.
+
+    Retrieved chunks are deduplicated, consecutive chunks of one document are
+    merged into a single passage without their overlap, and passages are added
+    in relevance order while they fit CHAT_CONTEXT_MAX_TOKENS. History keeps the
+    newest messages that fit CHAT_HISTORY_MAX_TOKENS; older ones are replaced by
+    a short extractive summary. Context is filled before history, and neither
+    may push the prompt past CHAT_PROMPT_MAX_TOKENS. Every build returns its
+    token accounting, and totals are kept for /api/chat/metrics.
+    """
+
+    def __init__(self, max_tokens=None, context_tokens=None, history_tokens=None, summary_tokens=None,
+                 count_tokens=None):
+        self.max_tokens = max_tokens or Config.CHAT_PROMPT_MAX_TOKENS
+        self.context_tokens = context_tokens or Config.CHAT_CONTEXT_MAX_TOKENS
+        self.history_tokens = history_tokens or Config.CHAT_HISTORY_MAX_TOKENS
+        self.summary_tokens = Config.CHAT_HISTORY_SUMMARY_TOKENS if summary_tokens is None else summary_tokens
+        self.count_tokens = count_tokens or get_token_counter(Config.CHAT_MODEL)
+        self._lock = threading.Lock()
+        self._totals = {'requests': 0, 'prompt_tokens': 0, 'context_tokens': 0, 'history_tokens': 0,
+                        'chunks_dropped': 0, 'chunks_merged': 0, 'history_summarized': 0}
+
+    def count_message(self, content):
+        return self.count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+    def passages(self, chunks):
+        """Deduplicated chunks grouped into passages of consecutive chunks, in the
+        order of each passage's best-ranked chunk. Returns (passages, duplicates).
+        chunk_index is the chunk's position in the current version of its
+        document (replacing a document renumbers it); a document whose chunks
+        claim one position twice was read mid-replace and is not merged."""
+        seen = set()
+        runs = {}  # document_id -> [[rank, last chunk_index, text, chunks]]
+        duplicates = 0
+        for rank, chunk in enumerate(chunks):
+            key = normalize_chunk_text(chunk.get('content'))
+            if not key or key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            runs.setdefault(chunk.get('document_id'), []).append((chunk.get('chunk_index'), rank, chunk))
+        passages = []
+        for members in runs.values():
+            positions = [chunk_index for chunk_index, _, _ in members if chunk_index is not None]
+            mergeable = len(positions) == len(set(positions))
+            run = None
+            for chunk_index, rank, chunk in sorted(members, key=lambda item: (item[0] is None, item[0] or 0)):
+                if mergeable and run is not None and chunk_index is not None and run[1] is not None \
+                        and chunk_index == run[1] + 1:
+                    run[0] = min(run[0], rank)
+                    run[1] = chunk_index
+                    run[2] = merge_overlap(run[2], chunk['content'])
+                    run[3].append(chunk)
+                else:
+                    run = [rank, chunk_index, chunk['content'], [chunk]]
+                    passages.append(run)
+        passages.sort(key=lambda run: run[0])
+        # The same text stored under two documents (e.g. a re-uploaded copy) is sent once
+        kept = []
+        for run in passages:
+            if any(run[2] in other[2] for other in kept):
+                duplicates += len(run[3])
+            else:
+                kept.append(run)
+        return [(text, members) for _, _, text, members in kept], duplicates
+
+    def pack_context(self, chunks, max_tokens):
+        """Context text within `max_tokens`; returns (text, tokens, chunks used, stats)"""
+        passages, duplicates = self.passages(chunks or [])
+        texts, used, tokens = [], [], 0
+        for text, members in passages:
+            needed = self.count_tokens(text) + (2 if texts else 0)
+            if tokens + needed > max_tokens:
+                continue
+            texts.append(text)
+            used.extend(members)
+            tokens += needed
+        if not texts and passages and max_tokens > 0:
+            # Even the best passage is over budget: send its head rather than nothing
+            text, members = passages[0]
+            text = text[:int(len(text) * max_tokens / self.count_tokens(text) * 0.9)]
+            texts, used, tokens = [text], members[:1], self.count_tokens(text)
+        stats = {
+            'retrieved': len(chunks or []),
+            'used': len(used),
+            'duplicates': duplicates,
+            'merged': len(used) - len(texts),
+            'dropped': len(chunks or []) - len(used) - duplicates,
+        }
+        return "\n\n".join(texts), tokens, used, stats
+
+    def roll_summary(self, summary, messages, max_tokens):
+        """Fold `messages` into a rolling summary (lines of earlier turns) and keep
+        its newest lines within `max_tokens`. Returns (summary, exact tokens of
+        the summary message); only lines that can still fit are produced."""
+        lines = []
+        tokens = self.count_message(SUMMARY_HEADER)
+        previous = summary.splitlines()[::-1] if summary else []
+        for line in itertools.chain((summarize_turn(msg) for msg in reversed(messages)), previous):
+            line_tokens = self.count_tokens(line) + 1
+            if tokens + line_tokens > max_tokens:
+                break
+            lines.append(line)
+            tokens += line_tokens
+        if not lines:
+            return '', 0
+        summary = "\n".join(lines[::-1])
+        return summary, self.count_message(self.summary_message(summary)["content"])
+
+    @staticmethod
+    def summary_message(summary):
+        return {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+
+    def pack_history(self, chat_history, max_tokens, summary='', summary_tokens=0):
+        """Newest messages within `max_tokens`, older ones summarized; returns
+        (summary message or None, kept messages, tokens, stats). `summary` is a
+        rolling summary of turns before `chat_history` (server-side sessions),
+        and messages may carry precomputed `tokens`."""
+        history = [msg for msg in chat_history or [] if isinstance(msg, dict)]
+        if summary and not summary_tokens:
+            summary_tokens = self.count_message(self.summary_message(summary)["content"])
+        # Newest first, and only as far back as the budget reaches
+        counts, total = [], summary_tokens
+        for msg in reversed(history):
+            counts.append(msg.get("tokens") or self.count_message(msg.get("content", "")))
+            total += counts[-1]
+            if total > max_tokens:
+                break
+        if total <= max_tokens:
+            messages = [{"role": msg.get("role", "user"), "content": msg.get("content", "")} for msg in history]
+            stats = {'received': len(history), 'kept': len(history), 'summarized': 0}
+            return (self.summary_message(summary) if summary else None), messages, total, stats
+
+        summary_budget = min(self.summary_tokens, max_tokens // 2)
+        kept, tokens = 0, 0
+        for count in counts:
+            if tokens + count > max_tokens - summary_budget:
+                break
+            kept += 1
+            tokens += count
+        older = history[:len(history) - kept]
+        summary, summary_tokens = self.roll_summary(summary, older, summary_budget) if summary_budget > 0 else ('', 0)
+        messages = [
+            {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+            for msg in history[len(history) - kept:]
+        ] if kept else []
+        stats = {'received': len(history), 'kept': kept, 'summarized': len(older)}
+        return (self.summary_message(summary) if summary else None), messages, tokens + summary_tokens, stats
+
+    def build(self, system_template, user_message, chat_history, relevant_chunks, summary='', summary_tokens=0):
+        """Messages for one chat turn. `system_template` has a {context} field;
+        `summary` is a session's rolling summary (see pack_history).
+        Returns (messages, chunks used, token accounting)."""
+        system_tokens = self.count_message(system_template.format(context=""))
+        user_tokens = self.count_message(user_message)
+        remaining = max(0, self.max_tokens - system_tokens - user_tokens)
+
+        context, context_tokens, used, chunk_stats = self.pack_context(relevant_chunks, min(self.context_tokens, remaining))
+        remaining -= context_tokens
+        summary, history, history_tokens, history_stats = self.pack_history(
+            chat_history, min(self.history_tokens, remaining), summary, summary_tokens
+        )
+
+        messages = [{"role": "system", "content": system_template.format(context=context)}]
+        if summary:
+            messages.append(summary)
+        messages.extend(history)
+        messages.append({"role": "user", "content": user_message})
+
+        # The system message is recounted with its context, so the total is exact
+        accounting = {
+            'budget': self.max_tokens,
+            'total': self.count_message(messages[0]["content"]) + history_tokens + user_tokens,
+            'system': system_tokens,
+            'context': context_tokens,
+            'history': history_tokens,
+            'user': user_tokens,
+            'chunks': chunk_stats,
+            'history_messages': history_stats,
+        }
+        with self._lock:
+            self._totals['requests'] += 1
+            self._totals['prompt_tokens'] += accounting['total']
+            self._totals['context_tokens'] += context_tokens
+            self._totals['history_tokens'] += history_tokens
+            self._totals['chunks_dropped'] += chunk_stats['dropped'] + chunk_stats['duplicates']
+            self._totals['chunks_merged'] += chunk_stats['merged']
+            self._totals['history_summarized'] += history_stats['summarized']
+        return messages, used, accounting
+
+    def stats(self):
+        with self._lock:
+            totals = dict(self._totals)
+        requests = totals['requests']
+        return dict(
+            totals,
+            avg_prompt_tokens=totals['prompt_tokens'] / requests if requests else 0.0,
+            max_tokens=self.max_tokens,
+            context_max_tokens=self.context_tokens,
+            history_max_tokens=self.history_tokens
+        )
+
+
+_prompt_budget = None
+_prompt_budget_lock = threading.Lock()
+
+
+def get_prompt_budget():
+    """Return the process-wide prompt budget manager, creating it on first use"""
+    global _prompt_budget
+    with _prompt_budget_lock:
+        if _prompt_budget is None:
+            _prompt_budget = PromptBudget()
+        return _prompt_budget
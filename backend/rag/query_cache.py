@@ -0,0 +1,201 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from config import Config
+from .embedding_cache import EmbeddingCache, normalize_chunk_text
+from .embeddings import get_embedding_engine
+
+
+class TTLLRUCache:
+    """Thread-safe in-process cache bounded by entry count and entry age."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+
+class QueryEmbeddingCache:
+    """Two-tier cache for query embeddings.
+
+    The memory tier is a per-process TTL+LRU; the optional disk tier is a
+    SQLite EmbeddingCache file shared by all worker processes on the host.
+    Concurrent async requests for one query share a single API call.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, disk_path=None, disk_max_entries=50000):
+        self.memory = TTLLRUCache(max_entries, ttl_seconds)
+        self.disk = EmbeddingCache(disk_path, disk_max_entries) if disk_path else None
+        self._inflight = {}  # (event loop, key) -> task loading that embedding
+
+    def get_embedding(self, query_text, model=None):
+        """Return the embedding for `query_text`, calling the API only on a miss in both tiers"""
+        engine = get_embedding_engine()
+        model = model or engine.model
+        key = (model, normalize_chunk_text(query_text))
+
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        if self.disk is not None:
+            found = self.disk.get_many(model, [query_text])
+            if found:
+                vector = found[0]
+                self.memory.put(key, vector)
+                return vector
+
+        vector = engine.embed([query_text])[0]
+        self.memory.put(key, vector)
+        if self.disk is not None:
+            self.disk.put_many(model, [query_text], [vector])
+        return vector
+
+    async def get_embedding_async(self, query_text, client, model=None):
+        """Async variant of get_embedding for the ASGI path; `client` is an AsyncOpenAI"""
+        model = model or Config.EMBEDDING_MODEL
+        key = (model, normalize_chunk_text(query_text))
+
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        inflight_key = (asyncio.get_running_loop(), key)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._load_async(query_text, key, client, model))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        # Shielded: a caller being cancelled must not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def _load_async(self, query_text, key, client, model):
+        if self.disk is not None:
+            found = await asyncio.to_thread(self.disk.get_many, model, [query_text])
+            if found:
+                vector = found[0]
+                self.memory.put(key, vector)
+                return vector
+
+        resp = await client.embeddings.create(model=model, input=[query_text])
+        vector = resp.data[0].embedding
+        self.memory.put(key, vector)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put_many, model, [query_text], [vector])
+        return vector
+
+    def _lookup_many(self, query_texts, model):
+        """Memory-tier hits for a batch: (vectors with None for misses, texts to look up further)"""
+        vectors = [self.memory.get((model, normalize_chunk_text(text))) for text in query_texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(query_texts, vectors) if vector is None))
+        return vectors, missing
+
+    def _fill(self, query_texts, vectors, model, found):
+        """Put newly found vectors (text -> vector) in the memory tier and in place"""
+        for text, vector in found.items():
+            self.memory.put((model, normalize_chunk_text(text)), vector)
+        return [vector if vector is not None else found[text] for text, vector in zip(query_texts, vectors)]
+
+    def get_embeddings(self, query_texts, model=None):
+        """get_embedding for a batch: every query missing from both tiers is embedded
+        in one API request (split only past the engine's batch limits)"""
+        engine = get_embedding_engine()
+        model = model or engine.model
+        vectors, missing = self._lookup_many(query_texts, model)
+        found = {}
+        if missing and self.disk is not None:
+            found = {missing[pos]: vector for pos, vector in self.disk.get_many(model, missing).items()}
+        embed = [text for text in missing if text not in found]
+        if embed:
+            embedded = engine.embed(embed)
+            found.update(zip(embed, embedded))
+            if self.disk is not None:
+                self.disk.put_many(model, embed, embedded)
+        return self._fill(query_texts, vectors, model, found)
+
+    async def get_embeddings_async(self, query_texts, client, model=None):
+        """Async variant of get_embeddings; `client` is an AsyncOpenAI"""
+        model = model or Config.EMBEDDING_MODEL
+        vectors, missing = self._lookup_many(query_texts, model)
+        found = {}
+        if missing and self.disk is not None:
+            hits = await asyncio.to_thread(self.disk.get_many, model, missing)
+            found = {missing[pos]: vector for pos, vector in hits.items()}
+        embed = [text for text in missing if text not in found]
+        if embed:
+            step = Config.EMBEDDING_BATCH_MAX_ITEMS
+            responses = await asyncio.gather(*(
+                client.embeddings.create(model=model, input=embed[start:start + step])
+                for start in range(0, len(embed), step)
+            ))
+            embedded = [item.embedding for resp in responses for item in sorted(resp.data, key=lambda item: item.index)]
+            found.update(zip(embed, embedded))
+            if self.disk is not None:
+                await asyncio.to_thread(self.disk.put_many, model, embed, embedded)
+        return self._fill(query_texts, vectors, model, found)
+
+    def stats(self):
+        return {
+            'memory': self.memory.stats(),
+            'disk': self.disk.stats() if self.disk is not None else None
+        }
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache():
+    """Return the process-wide query embedding cache, creating it on first use"""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache(
+                max_entries=Config.QUERY_CACHE_MAX_ENTRIES,
+                ttl_seconds=Config.QUERY_CACHE_TTL,
+                disk_path=Config.QUERY_CACHE_DISK_PATH if Config.QUERY_CACHE_DISK_ENABLED else None,
+                disk_max_entries=Config.QUERY_CACHE_DISK_MAX_ENTRIES
+            )
+        return _query_cache
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import threading
+from config import Config
+from .embedding_cache import normalize_chunk_text
+from .query_cache import TTLLRUCache
+
+
+class CorpusVersion:
+    """Monotonic counter bumped on every knowledge-base mutation.
+
+    Kept in a one-row SQLite file so every worker process on the host sees a
+    bump immediately; caches include the version in their keys, so entries
+    computed against an older corpus can never be served again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS corpus_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO corpus_version (id, version) VALUES (1, 0)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def current(self):
+        return self._connection().execute("SELECT version FROM corpus_version WHERE id = 1").fetchone()[0]
+
+    def bump(self):
+        conn = self._connection()
+        conn.execute("UPDATE corpus_version SET version = version + 1 WHERE id = 1")
+        conn.commit()
+        return self.current()
+
+
+class RetrievalCache:
+    """Formatted search results keyed by (corpus version, model, normalized query, top_k)"""
+
+    def __init__(self, corpus_version, max_entries=2048, ttl_seconds=3600):
+        self.corpus_version = corpus_version
+        self.entries = TTLLRUCache(max_entries, ttl_seconds)
+
+    def key(self, query_text, top_k, model):
+        return (self.corpus_version.current(), model, normalize_chunk_text(query_text), int(top_k))
+
+    def keys(self, query_texts, top_k, model):
+        """key() for a batch of queries, reading the corpus version once"""
+        version = self.corpus_version.current()
+        return [(version, model, normalize_chunk_text(text), int(top_k)) for text in query_texts]
+
+    def get(self, key):
+        results = self.entries.get(key)
+        return list(results) if results is not None else None
+
+    def put(self, key, results):
+        self.entries.put(key, list(results))
+
+    def invalidate(self):
+        """Bump the corpus version; entries keyed to older versions become unreachable"""
+        version = self.corpus_version.bump()
+        self.entries.clear()
+        return version
+
+    def stats(self):
+        stats = self.entries.stats()
+        stats['corpus_version'] = self.corpus_version.current()
+        return stats
+
+
+_retrieval_cache = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache():
+    """Return the process-wide retrieval cache, creating it on first use"""
+    global _retrieval_cache
+    with _retrieval_cache_lock:
+        if _retrieval_cache is None:
+            _retrieval_cache = RetrievalCache(
+                CorpusVersion(Config.CORPUS_VERSION_PATH),
+                max_entries=Config.RETRIEVAL_CACHE_MAX_ENTRIES,
+                ttl_seconds=Config.RETRIEVAL_CACHE_TTL
+            )
+        return _retrieval_cache
@@ -0,0 +1,223 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import Config
+from .prompt_budget import get_prompt_budget
+
+PRUNE_EVERY = 100  # session creations between retention sweeps
+
+
+class SessionStore:
+    """Server-side chat sessions in a local SQLite file (WAL, shared by the
+    worker processes on the host).
+
+    Each session has an append-only turn log, with every turn's token count
+    stored once, and a rolling summary. After each append the oldest
+    unsummarized turns are folded into the summary until the rest fits the
+    history budget, so a chat turn loads the summary and a bounded tail and
+    counts nothing again. Turns already folded into the summary are kept for
+    reading back up to CHAT_SESSION_MAX_TURNS; sessions idle for
+    CHAT_SESSION_TTL are deleted, as are the least recently used ones past
+    CHAT_SESSION_MAX_SESSIONS.
+    """
+
+    def __init__(self, path, ttl_seconds=None, max_turns=None, max_sessions=None, prompt_budget=None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds or Config.CHAT_SESSION_TTL
+        self.max_turns = max_turns or Config.CHAT_SESSION_MAX_TURNS
+        self.max_sessions = max_sessions or Config.CHAT_SESSION_MAX_SESSIONS
+        self.prompt_budget = prompt_budget or get_prompt_budget()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.appended = 0
+        self.folded = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " turn_count INTEGER NOT NULL DEFAULT 0, summary TEXT NOT NULL DEFAULT '',"
+            " summary_tokens INTEGER NOT NULL DEFAULT 0, summarized_through INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL,"
+            " tokens INTEGER NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Serialize writers across threads and processes"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _live(self, conn, session_id):
+        row = conn.execute(
+            "SELECT id, created_at, updated_at, turn_count, summary, summary_tokens, summarized_through"
+            " FROM sessions WHERE id = ? AND updated_at >= ?",
+            (str(session_id), time.time() - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'created_at', 'updated_at', 'turn_count', 'summary', 'summary_tokens',
+                         'summarized_through'), row))
+
+    def create(self):
+        """Start a session; returns its id"""
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?)", (session_id, now, now))
+        with self._lock:
+            self.created += 1
+            sweep = self.created % PRUNE_EVERY == 1
+        if sweep:
+            self.prune()
+        return session_id
+
+    def get(self, session_id):
+        """Session fields, or None when unknown or expired"""
+        return self._live(self._connection(), session_id)
+
+    def history(self, session_id):
+        """Precomputed history state for the next turn: the session, and its
+        unsummarized turns oldest first as {role, content, tokens}. None when
+        the session is unknown or expired."""
+        conn = self._connection()
+        session = self._live(conn, session_id)
+        if session is None:
+            return None
+        rows = conn.execute(
+            "SELECT role, content, tokens FROM turns WHERE session_id = ? AND seq > ? ORDER BY seq",
+            (session['id'], session['summarized_through'])
+        ).fetchall()
+        return session, [{'role': role, 'content': content, 'tokens': tokens} for role, content, tokens in rows]
+
+    def append(self, session_id, messages):
+        """Append turns ({role, content}) to the log and roll the summary forward.
+        Returns False when the session no longer exists."""
+        budget = self.prompt_budget
+        counted = [(msg['role'], msg['content'], budget.count_message(msg['content'])) for msg in messages]
+        summary_budget = min(budget.summary_tokens, budget.history_tokens // 2)
+        tail_budget = budget.history_tokens - summary_budget
+        now = time.time()
+        with self._transaction() as conn:
+            session = self._live(conn, session_id)
+            if session is None:
+                return False
+            seq = session['turn_count']
+            conn.executemany(
+                "INSERT INTO turns (session_id, seq, role, content, tokens, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(session['id'], seq + offset + 1, role, content, tokens, now)
+                 for offset, (role, content, tokens) in enumerate(counted)]
+            )
+            seq += len(counted)
+
+            # Fold the oldest unsummarized turns into the summary until the tail fits
+            tail = conn.execute(
+                "SELECT seq, role, content, tokens FROM turns WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session['id'], session['summarized_through'])
+            ).fetchall()
+            tail_tokens = sum(row[3] for row in tail)
+            folded = []
+            while tail and tail_tokens > tail_budget:
+                row = tail.pop(0)
+                tail_tokens -= row[3]
+                folded.append(row)
+            summary, summary_tokens = session['summary'], session['summary_tokens']
+            summarized_through = session['summarized_through']
+            if folded:
+                if summary_budget > 0:
+                    summary, summary_tokens = budget.roll_summary(
+                        summary, [{'role': role, 'content': content} for _, role, content, _ in folded], summary_budget
+                    )
+                summarized_through = folded[-1][0]
+                # Retention: the log keeps at most max_turns, dropping only summarized turns
+                conn.execute(
+                    "DELETE FROM turns WHERE session_id = ? AND seq <= ? AND seq <= ?",
+                    (session['id'], summarized_through, seq - self.max_turns)
+                )
+            conn.execute(
+                "UPDATE sessions SET updated_at = ?, turn_count = ?, summary = ?, summary_tokens = ?,"
+                " summarized_through = ? WHERE id = ?",
+                (now, seq, summary, summary_tokens, summarized_through, session['id'])
+            )
+        with self._lock:
+            self.appended += len(counted)
+            self.folded += len(folded)
+        return True
+
+    def turns(self, session_id, limit=50, before=None):
+        """Stored turns, newest first (up to `limit`, optionally before a seq)"""
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT seq, role, content, created_at FROM turns WHERE session_id = ? AND seq < ?"
+            " ORDER BY seq DESC LIMIT ?",
+            (str(session_id), before if before is not None else 2 ** 62, limit)
+        ).fetchall()
+        return [{'seq': seq, 'role': role, 'content': content, 'created_at': created_at}
+                for seq, role, content, created_at in rows]
+
+    def delete(self, session_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (str(session_id),))
+            return conn.execute("DELETE FROM sessions WHERE id = ?", (str(session_id),)).rowcount > 0
+
+    def prune(self):
+        """Delete expired sessions and the least recently used ones past max_sessions"""
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+            )]
+            excess = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - len(expired) - self.max_sessions
+            if excess > 0:
+                expired += [row[0] for row in conn.execute(
+                    "SELECT id FROM sessions WHERE updated_at >= ? ORDER BY updated_at LIMIT ?",
+                    (time.time() - self.ttl_seconds, excess)
+                )]
+            conn.executemany("DELETE FROM turns WHERE session_id = ?", [(session_id,) for session_id in expired])
+            conn.executemany("DELETE FROM sessions WHERE id = ?", [(session_id,) for session_id in expired])
+        return len(expired)
+
+    def stats(self):
+        conn = self._connection()
+        with self._lock:
+            counters = {'created': self.created, 'turns_appended': self.appended, 'turns_summarized': self.folded}
+        return dict(
+            counters,
+            sessions=conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            stored_turns=conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+        )
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Return the process-wide chat session store, creating it on first use"""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore(Config.CHAT_SESSION_PATH)
+        return _session_store
@@ -0,0 +1,66 @@
+import base64
+import numpy as np
+
+# Little-endian element types accepted by decode_packed_vector() in schema.sql
+PACKED_DTYPES = {'float32': np.dtype('<f4'), 'float16': np.dtype('<f2')}
+
+
+def as_matrix(vectors):
+    """Embeddings (lists or arrays) as one float32 matrix"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix.reshape(len(matrix), -1) if matrix.ndim != 2 else matrix
+
+
+def format_pgvector(vector):
+    """pgvector text form, e.g. "[0.1,0.2]" (~20 bytes per dimension)"""
+    return f"[{','.join(map(str, np.asarray(vector, dtype=np.float32).tolist()))}]"
+
+
+def pack_vectors(vectors, encoding='float32'):
+    """Base64 of each row's little-endian float32/float16 buffer (4 or 2 bytes per dimension
+    before base64), converted for the whole batch at once"""
+    matrix = as_matrix(vectors).astype(PACKED_DTYPES[encoding], copy=False)
+    return [base64.b64encode(row.tobytes()).decode('ascii') for row in matrix]
+
+
+def unpack_vector(packed, encoding='float32'):
+    return np.frombuffer(base64.b64decode(packed), dtype=PACKED_DTYPES[encoding]).astype(np.float32)
+
+
+def quantize_int8(matrix):
+    """Symmetric per-row int8 codes and the float32 scale that restores each row"""
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(matrix):
+    """One sign bit per dimension, packed 8 to a byte"""
+    return np.packbits(matrix > 0, axis=1)
+
+
+def int8_scores(codes, scales, query, block_rows=2048):
+    """Approximate inner products of int8-coded rows with a float32 query. NumPy has no
+    int8 x float32 BLAS kernel, so rows are widened a cache-sized block at a time."""
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), block_rows):
+        scores[start:start + block_rows] = codes[start:start + block_rows].astype(np.float32) @ query
+    return scores * scales
+
+
+# Set bits of every byte value, for NumPy < 2.0 which has no np.bitwise_count
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def _bitwise_count(values):
+    return _POPCOUNT[values]
+
+
+bitwise_count = getattr(np, 'bitwise_count', _bitwise_count)
+
+
+def hamming_scores(codes, query):
+    """Negated Hamming distance between sign codes, so higher is closer like the other scores"""
+    query_bits = np.packbits(query > 0)
+    return -bitwise_count(codes ^ query_bits).sum(axis=1, dtype=np.int32)
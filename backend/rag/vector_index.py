@@ -0,0 +1,432 @@
+import os
+import sys
+import json
+import threading
+import numpy as np
+from config import Config
+from .local_store import LocalIndexStore, iter_table_pages
+from .vector_codec import quantize_int8, quantize_binary, int8_scores, hamming_scores
+from .retrieval_cache import get_retrieval_cache
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _assign(matrix, centroids, batch_size=16384):
+    """Nearest centroid (by inner product) of every row, in bounded batches"""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), batch_size):
+        block = np.asarray(matrix[start:start + batch_size], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def _kmeans(sample, k, iterations=10, seed=0):
+    """Spherical k-means (Lloyd's) on unit vectors"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        counts = np.bincount(labels, minlength=k)
+        nonempty = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        centroids[nonempty] = np.add.reduceat(sample[np.argsort(labels, kind='stable')], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class _Snapshot:
+    """One process's read-only view of the index at a given version"""
+
+    def __init__(self, version, rows, vectors, deleted, centroids=None, order=None, offsets=None, codes=None, scales=None):
+        self.version = version
+        self.rows = rows
+        self.vectors = vectors
+        self.deleted = deleted
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.codes = codes
+        self.scales = scales
+
+
+class VectorIndex(LocalIndexStore):
+    """Local IVF index over a memory-mapped float32 matrix of chunk embeddings.
+
+    Files under `path`:
+      vectors-<gen>.f32   row-major unit-normalized embeddings, append-only
+      centroids-<gen>.npy coarse quantizer, once there are enough rows to train
+      lists-<gen>.i32     inverted-list (nearest centroid) of every row
+      codes-<gen>.i8      optional int8 copy of the matrix (+ scales-<gen>.f32),
+                          or bits-<gen>.u8 with one sign bit per dimension
+      index.sqlite3       chunk/document metadata, tombstones and a version
+
+    Deletes are tombstones until more than half the rows are dead, then the
+    matrix is compacted. Every write bumps the version and each process remaps
+    its view when it sees a newer one, so all workers on the host search the
+    same corpus. Until `build_from_supabase` has completed, `ready` is False
+    and callers should use the match_documents RPC instead.
+
+    With `quantization` set to 'int8' or 'binary', probed lists are scanned
+    over the compact copy (4x / 32x smaller than float32, so it stays in the
+    page cache) and only the best `top_k * rerank` candidates are rescored
+    against the float32 matrix.
+    """
+
+    MIN_IVF_ROWS = 4096  # exhaustive search is already fast below this
+    BATCH_SCORE_ELEMENTS = 1 << 24  # scores search_many holds at once without IVF (64 MB of float32)
+    RETRAIN_GROWTH = 4  # retrain once the index has grown 4x since training
+    COMPACT_DELETED_FRACTION = 0.5
+    META_KEYS = ('dims', 'rows', 'deleted', 'vector_gen', 'ivf_gen', 'trained_rows')
+
+    def __init__(self, path, nlist=0, nprobe=8, quantization='none', rerank=20):
+        if quantization not in ('none', 'int8', 'binary'):
+            raise ValueError(f"Unknown vector index quantization: {quantization}")
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rerank = rerank
+        self._load_lock = threading.Lock()
+        self._snapshot = None
+        super().__init__(path)
+
+    def _create_tables(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " row INTEGER PRIMARY KEY, id TEXT, document_id TEXT, chunk_index INTEGER,"
+            " content TEXT, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id)")
+
+    def _file(self, kind, gen):
+        extension = {'vectors': 'f32', 'lists': 'i32', 'centroids': 'npy', 'codes': 'i8', 'scales': 'f32', 'bits': 'u8'}[kind]
+        return os.path.join(self.path, f"{kind}-{gen}.{extension}")
+
+    def _after_commit(self, meta):
+        self._remove_stale_files({
+            os.path.basename(self._file(kind, meta['vector_gen'])) for kind in ('vectors', 'codes', 'scales', 'bits')
+        } | {
+            os.path.basename(self._file('lists', meta['ivf_gen'])),
+            os.path.basename(self._file('centroids', meta['ivf_gen']))
+        }, ('vectors', 'lists', 'centroids', 'codes', 'scales', 'bits'))
+
+    def _quantized_files(self, gen, dims):
+        """(path, bytes per row) of each file holding the quantized copy"""
+        if self.quantization == 'int8':
+            return [(self._file('codes', gen), dims), (self._file('scales', gen), 4)]
+        if self.quantization == 'binary':
+            return [(self._file('bits', gen), (dims + 7) // 8)]
+        return []
+
+    def _quantize(self, gen, start, rows, dims):
+        """Extend the quantized copy to `rows` rows. Rows below `start` are committed; any
+        the copy is missing (quantization enabled on an existing index) are backfilled."""
+        files = self._quantized_files(gen, dims)
+        if not files:
+            return
+        done = min([start] + [os.path.getsize(path) // width if os.path.exists(path) else 0 for path, width in files])
+        if done >= rows:
+            return
+        vectors = np.memmap(self._file('vectors', gen), dtype=np.float32, mode='r', shape=(rows, dims))
+        for offset in range(done, rows, 65536):
+            block = np.asarray(vectors[offset:offset + 65536])
+            if self.quantization == 'int8':
+                codes, scales = quantize_int8(block)
+                self._write_at(files[0][0], offset * dims, codes)
+                self._write_at(files[1][0], offset * 4, scales)
+            else:
+                self._write_at(files[0][0], offset * files[0][1], quantize_binary(block))
+
+    @staticmethod
+    def _write_at(path, offset, array):
+        """Write `array` at byte `offset`, discarding anything after it (left by a rolled-back write)"""
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    def add(self, chunks, vectors):
+        """Append chunks (dicts with id, document_id, chunk_index, content) and their embeddings"""
+        if not chunks:
+            return
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(chunks), -1))
+        with self._transaction() as conn:
+            # A re-written (upserted) chunk replaces its old copy
+            self._tombstone(conn, self._live_rows(conn, 'id', [chunk.get('id') for chunk in chunks]))
+            meta = self._meta(conn)
+            dims = meta['dims'] or matrix.shape[1]
+            if matrix.shape[1] != dims:
+                raise ValueError(f"Embedding has {matrix.shape[1]} dimensions, index has {dims}")
+            rows = meta['rows']
+            self._write_at(self._file('vectors', meta['vector_gen']), rows * dims * 4, matrix)
+            self._quantize(meta['vector_gen'], rows, rows + len(chunks), dims)
+            if meta['ivf_gen']:
+                centroids = np.load(self._file('centroids', meta['ivf_gen']))
+                self._write_at(self._file('lists', meta['ivf_gen']), rows * 4, _assign(matrix, centroids))
+            conn.executemany(
+                "INSERT INTO chunks (row, id, document_id, chunk_index, content) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (rows + i, str(chunk.get('id')), str(chunk.get('document_id')), chunk.get('chunk_index'), chunk.get('content'))
+                    for i, chunk in enumerate(chunks)
+                ]
+            )
+            total = rows + len(chunks)
+            self._set_meta(conn, dims=dims, rows=total)
+            if total >= self.MIN_IVF_ROWS and (not meta['ivf_gen'] or total >= meta['trained_rows'] * self.RETRAIN_GROWTH):
+                self._train(conn, dict(meta, dims=dims, rows=total))
+
+    def _train(self, conn, meta):
+        """Fit the coarse quantizer on a sample and assign every row to a list"""
+        rows, dims = meta['rows'], meta['dims']
+        vectors = np.memmap(self._file('vectors', meta['vector_gen']), dtype=np.float32, mode='r', shape=(rows, dims))
+        nlist = min(self.nlist or max(16, int(np.sqrt(rows))), rows)
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(rows, min(rows, nlist * 64), replace=False))
+        centroids = _kmeans(np.asarray(vectors[sample_rows]), nlist)
+        gen = meta['ivf_gen'] + 1
+        np.save(self._file('centroids', gen), centroids)
+        self._write_at(self._file('lists', gen), 0, _assign(vectors, centroids))
+        self._set_meta(conn, ivf_gen=gen, trained_rows=rows)
+
+    def _tombstoned(self, conn, meta, rows):
+        deleted = meta['deleted'] + len(rows)
+        self._set_meta(conn, deleted=deleted)
+        if meta['rows'] and deleted > meta['rows'] * self.COMPACT_DELETED_FRACTION:
+            self._compact(conn, dict(meta, deleted=deleted))
+
+    def _compact(self, conn, meta):
+        """Rewrite the matrix without tombstoned rows and renumber the survivors"""
+        live = np.array([row for (row,) in conn.execute("SELECT row FROM chunks WHERE deleted = 0 ORDER BY row")], dtype=np.int64)
+        dims = meta['dims']
+        old = np.memmap(self._file('vectors', meta['vector_gen']), dtype=np.float32, mode='r', shape=(meta['rows'], dims))
+        gen = meta['vector_gen'] + 1
+        with open(self._file('vectors', gen), 'wb') as f:
+            for start in range(0, len(live), 65536):
+                f.write(np.ascontiguousarray(old[live[start:start + 65536]]).tobytes())
+        self._quantize(gen, 0, len(live), dims)
+        conn.execute("DELETE FROM chunks WHERE deleted = 1")
+        # Ascending order never collides: a survivor's new row is <= its old one
+        conn.executemany("UPDATE chunks SET row = ? WHERE row = ?", [(new, int(row)) for new, row in enumerate(live)])
+        meta = dict(meta, rows=len(live), deleted=0, vector_gen=gen, ivf_gen=meta['ivf_gen'], trained_rows=0)
+        self._set_meta(conn, rows=len(live), deleted=0, vector_gen=gen, trained_rows=0)
+        if len(live) >= self.MIN_IVF_ROWS:
+            self._train(conn, meta)
+        else:
+            self._set_meta(conn, ivf_gen=0)
+
+    def clear(self):
+        with self._transaction() as conn:
+            meta = self._meta(conn)
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM documents")
+            self._set_meta(conn, dims=0, rows=0, deleted=0, vector_gen=meta['vector_gen'] + 1, ivf_gen=0, trained_rows=0)
+
+    def build_from_supabase(self, supabase, page_size=1000):
+        """Rebuild the index from the documents and document_chunks tables"""
+        # Searches fall back to Supabase until the rebuild is complete
+        self.mark_stale()
+        self.clear()
+        self._put_documents_from_supabase(supabase)
+        for page in iter_table_pages(supabase, 'document_chunks', 'id,document_id,chunk_index,content,embedding', page_size):
+            page = [row for row in page if row.get('embedding')]
+            if page:
+                # pgvector columns arrive as their text form, e.g. "[0.1,0.2,...]"
+                vectors = [json.loads(row['embedding']) if isinstance(row['embedding'], str) else row['embedding'] for row in page]
+                self.add(page, vectors)
+        self._mark_built()
+        get_retrieval_cache().invalidate()  # cached results came from match_documents
+        return self.stats()
+
+    def _load(self):
+        """Map the current files; retried if a concurrent writer swaps generations underneath"""
+        conn = self._connection()
+        for attempt in range(3):
+            conn.execute("BEGIN")
+            try:
+                meta = self._meta(conn)
+                deleted_rows = [row for (row,) in conn.execute("SELECT row FROM chunks WHERE deleted = 1")]
+            finally:
+                conn.execute("COMMIT")
+            rows, dims = meta['rows'], meta['dims']
+            deleted = np.zeros(rows, dtype=bool)
+            deleted[[row for row in deleted_rows if row < rows]] = True
+            if rows == 0:
+                return _Snapshot(meta['version'], 0, None, deleted)
+            try:
+                vectors = np.memmap(self._file('vectors', meta['vector_gen']), dtype=np.float32, mode='r', shape=(rows, dims))
+                codes, scales = self._load_quantized(meta['vector_gen'], rows, dims)
+                if not meta['ivf_gen']:
+                    return _Snapshot(meta['version'], rows, vectors, deleted, codes=codes, scales=scales)
+                centroids = np.load(self._file('centroids', meta['ivf_gen']))
+                lists = np.fromfile(self._file('lists', meta['ivf_gen']), dtype=np.int32, count=rows)
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                continue
+            order = np.argsort(lists, kind='stable')
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(centroids)))))
+            return _Snapshot(meta['version'], rows, vectors, deleted, centroids, order, offsets, codes, scales)
+
+    def _load_quantized(self, gen, rows, dims):
+        """Map the quantized copy, or (None, None) to search the float32 matrix directly
+        (quantization off, or the copy is incomplete until the next write backfills it)"""
+        files = self._quantized_files(gen, dims)
+        if not files or any(not os.path.exists(path) or os.path.getsize(path) < rows * width for path, width in files):
+            return None, None
+        if self.quantization == 'int8':
+            return (np.memmap(files[0][0], dtype=np.int8, mode='r', shape=(rows, dims)),
+                    np.memmap(files[1][0], dtype=np.float32, mode='r', shape=(rows,)))
+        return np.memmap(files[0][0], dtype=np.uint8, mode='r', shape=(rows, files[0][1])), None
+
+    def _current(self):
+        version = self._version()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            with self._load_lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._snapshot = self._load()
+        return snapshot
+
+    def search(self, query_embedding, top_k=5, nprobe=None):
+        """Top-k chunks by cosine similarity, shaped like match_documents rows"""
+        snapshot = self._current()
+        if snapshot.rows == 0:
+            return []
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+
+        if snapshot.centroids is None:
+            candidates = np.arange(snapshot.rows)
+        else:
+            nprobe = min(nprobe or self.nprobe, len(snapshot.centroids))
+            probe = np.argpartition(-(snapshot.centroids @ query), nprobe - 1)[:nprobe]
+            candidates = np.sort(np.concatenate([snapshot.order[snapshot.offsets[c]:snapshot.offsets[c + 1]] for c in probe]))
+        candidates = candidates[~snapshot.deleted[candidates]]
+
+        shortlist = top_k * self.rerank
+        if snapshot.codes is not None and len(candidates) > shortlist:
+            # Rank on the compact copy, then rescore the shortlist exactly
+            if snapshot.scales is not None:
+                approximate = int8_scores(snapshot.codes[candidates], snapshot.scales[candidates], query)
+            else:
+                approximate = hamming_scores(snapshot.codes[candidates], query)
+            candidates = np.sort(candidates[np.argpartition(-approximate, shortlist - 1)[:shortlist]])
+        if len(candidates) == snapshot.rows:
+            scores = snapshot.vectors @ query
+        else:
+            scores = snapshot.vectors[candidates] @ query
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return self._chunk_rows(candidates[top], scores[top], 'similarity')
+
+    def search_many(self, query_embeddings, top_k=5, nprobe=None):
+        """search() for several queries at once, returning one row list per query.
+        Without IVF lists, blocks of queries are scored against the matrix in one
+        product; with them, every probed list is scored once against all the
+        queries that probe it and each query keeps its best rows across lists,
+        so results match search(). With a quantized copy the queries are
+        searched one by one."""
+        if len(query_embeddings) == 0:
+            return []
+        snapshot = self._current()
+        if snapshot.rows == 0:
+            return [[] for _ in query_embeddings]
+        if snapshot.codes is not None:
+            return [self.search(query, top_k, nprobe) for query in query_embeddings]
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+
+        def best(rows, scores):
+            """Top-k of each column of `scores` as (rows, scores) pairs"""
+            if len(rows) > top_k:
+                top = np.argpartition(-scores, top_k - 1, axis=0)[:top_k]
+            else:
+                top = np.broadcast_to(np.arange(len(rows))[:, None], scores.shape)
+            return [(rows[top[:, col]], scores[top[:, col], col]) for col in range(scores.shape[1])]
+
+        found = [[] for _ in range(len(queries))]
+        if snapshot.centroids is None:
+            live = np.flatnonzero(~snapshot.deleted)
+            if len(live) == 0:
+                return [[] for _ in query_embeddings]
+            block_size = max(1, self.BATCH_SCORE_ELEMENTS // len(live))
+            for start in range(0, len(queries), block_size):
+                block = queries[start:start + block_size]
+                scores = (snapshot.vectors if len(live) == snapshot.rows else snapshot.vectors[live]) @ block.T
+                for offset, pair in enumerate(best(live, scores)):
+                    found[start + offset].append(pair)
+        else:
+            nprobe = min(nprobe or self.nprobe, len(snapshot.centroids))
+            probes = np.argpartition(-(queries @ snapshot.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+            for centroid in np.unique(probes):
+                members = np.flatnonzero((probes == centroid).any(axis=1))
+                rows = snapshot.order[snapshot.offsets[centroid]:snapshot.offsets[centroid + 1]]
+                rows = np.sort(rows[~snapshot.deleted[rows]])
+                if len(rows) == 0:
+                    continue
+                scores = snapshot.vectors[rows] @ queries[members].T
+                for query, pair in zip(members, best(rows, scores)):
+                    found[query].append(pair)
+
+        results = []
+        for pairs in found:
+            if not pairs:
+                results.append([])
+                continue
+            rows = np.concatenate([rows for rows, _ in pairs])
+            scores = np.concatenate([scores for _, scores in pairs])
+            top = np.argsort(-scores, kind='stable')[:top_k]
+            results.append(self._chunk_rows(rows[top], scores[top], 'similarity'))
+        return results
+
+    def stats(self):
+        meta = self._meta(self._connection())
+        return {
+            'rows': meta['rows'],
+            'live_rows': meta['rows'] - meta['deleted'],
+            'dims': meta['dims'],
+            'lists': len(np.load(self._file('centroids', meta['ivf_gen']))) if meta['ivf_gen'] else 0,
+            'nprobe': self.nprobe,
+            'quantization': self.quantization,
+            'version': meta['version'],
+            'ready': bool(meta['built'])
+        }
+
+
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index():
+    """Return the process-wide local index, or None when retrieval goes through Supabase"""
+    global _vector_index
+    if Config.RETRIEVAL_BACKEND != 'local':
+        return None
+    with _vector_index_lock:
+        if _vector_index is None:
+            _vector_index = VectorIndex(
+                Config.VECTOR_INDEX_PATH,
+                nlist=Config.VECTOR_INDEX_NLIST,
+                nprobe=Config.VECTOR_INDEX_NPROBE,
+                quantization=Config.VECTOR_INDEX_QUANTIZATION,
+                rerank=Config.VECTOR_INDEX_RERANK
+            )
+        return _vector_index
+
+
+if __name__ == '__main__':
+    # python -m rag.vector_index rebuild
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit("usage: python -m rag.vector_index rebuild")
+    from sb.client import get_supabase_client
+    index = VectorIndex(Config.VECTOR_INDEX_PATH, nlist=Config.VECTOR_INDEX_NLIST, nprobe=Config.VECTOR_INDEX_NPROBE,
+                        quantization=Config.VECTOR_INDEX_QUANTIZATION, rerank=Config.VECTOR_INDEX_RERANK)
+    print(index.build_from_supabase(get_supabase_client()))
@@ -0,0 +1,96 @@
+import asyncio
+from config import Config
+from rag.query_cache import get_query_embedding_cache
+from rag.retrieval_cache import get_retrieval_cache
+from .database_service import (format_similar_chunks, match_documents_local, match_documents_local_many, match_lexical_local,
+                               retrieval_candidates, fuse_hybrid, group_batch_rows)
+
+class AsyncDocumentService:
+    """Read path of DocumentService for the ASGI app, on async Supabase/OpenAI clients"""
+
+    def __init__(self, clients):
+        self.supabase = clients.supabase
+        self.openai = clients.openai
+
+    async def search_similar_chunks(self, query_text, top_k=5):
+        """Search for similar chunks using Supabase SQL function."""
+        try:
+            # Identical questions against an unchanged corpus reuse the last result
+            query_cache = get_query_embedding_cache()
+            retrieval_cache = get_retrieval_cache()
+            cache_key = await asyncio.to_thread(retrieval_cache.key, query_text, top_k, Config.EMBEDDING_MODEL)
+            cached = retrieval_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            # The query embedding and the BM25 lookup are independent, so run them together
+            candidates = retrieval_candidates(top_k)
+            query_embedding, lexical_rows = await asyncio.gather(
+                query_cache.get_embedding_async(query_text, self.openai),
+                asyncio.to_thread(match_lexical_local, query_text, candidates)
+            )
+
+            rows = await asyncio.to_thread(match_documents_local, query_embedding, candidates)
+            if rows is None:
+                rows = (await self.supabase.rpc(
+                    'match_documents',
+                    {
+                        'query_embedding': query_embedding,
+                        'match_count': candidates
+                    }
+                ).execute()).data
+            rows = fuse_hybrid(rows, lexical_rows, top_k)
+            formatted_results = format_similar_chunks(rows)
+            retrieval_cache.put(cache_key, formatted_results)
+            return formatted_results
+
+        except Exception as e:
+            print(f"Error searching similar chunks: {str(e)}")
+            return []
+
+    async def match_documents_batch(self, query_embeddings, match_count):
+        """match_documents for several embeddings in one RPC, or concurrent single calls
+        on databases without match_documents_batch"""
+        try:
+            rows = (await self.supabase.rpc(
+                'match_documents_batch',
+                {'query_embeddings': query_embeddings, 'match_count': match_count}
+            ).execute()).data
+            return group_batch_rows(rows, len(query_embeddings))
+        except Exception as e:
+            print(f"match_documents_batch failed, searching query by query: {str(e)}")
+            responses = await asyncio.gather(*(
+                self.supabase.rpc('match_documents', {'query_embedding': embedding, 'match_count': match_count}).execute()
+                for embedding in query_embeddings
+            ))
+            return [response.data for response in responses]
+
+    async def search_similar_chunks_many(self, query_texts, top_k=5):
+        """Batch search: one embeddings request for the uncached queries, then one
+        vectorized search (local index) or RPC for all of them"""
+        try:
+            query_cache = get_query_embedding_cache()
+            retrieval_cache = get_retrieval_cache()
+            cache_keys = await asyncio.to_thread(retrieval_cache.keys, query_texts, top_k, Config.EMBEDDING_MODEL)
+            results = [retrieval_cache.get(key) for key in cache_keys]
+            pending = [pos for pos, cached in enumerate(results) if cached is None]
+            if not pending:
+                return results
+
+            texts = [query_texts[pos] for pos in pending]
+            candidates = retrieval_candidates(top_k)
+            query_embeddings, lexical_rows = await asyncio.gather(
+                query_cache.get_embeddings_async(texts, self.openai),
+                asyncio.to_thread(lambda: [match_lexical_local(text, candidates) for text in texts])
+            )
+            matches = await asyncio.to_thread(match_documents_local_many, query_embeddings, candidates)
+            if matches is None:
+                matches = await self.match_documents_batch(query_embeddings, candidates)
+            for pos, rows, lexical in zip(pending, matches, lexical_rows):
+                results[pos] = format_similar_chunks(fuse_hybrid(rows, lexical, top_k))
+                retrieval_cache.put(cache_keys[pos], results[pos])
+            return results
+
+        except Exception as e:
+            print(f"Error searching similar chunks: {str(e)}")
+            return [[] for _ in query_texts]
@@ -0,0 +1,142 @@
+import time
+import random
+import threading
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from postgrest.exceptions import APIError
+from config import Config
+from .client import get_supabase_client
+
+# SQLSTATE classes worth retrying: connection, transaction rollback (deadlock,
+# serialization), insufficient resources, operator intervention (statement timeout)
+_TRANSIENT_SQLSTATE_CLASSES = ('08', '40', '53', '57')
+
+
+def is_retryable_write_error(error):
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, APIError):
+        code = str(error.code or '')
+        if len(code) == 3:  # HTTP status, when the error body was not PostgREST JSON
+            return code == '429' or code.startswith('5')
+        return code[:2] in _TRANSIENT_SQLSTATE_CLASSES
+    return False
+
+
+class ChunkWriter:
+    """Bulk writer for document_chunks rows.
+
+    Rows are split into batches bounded by row count and encoded size, batches
+    are sent concurrently over the pooled Supabase client, and a failed batch is
+    retried on its own with backoff. Writes are upserts on (document_id,
+    chunk_index), so a retry after a lost response, or a re-run of a whole job,
+    overwrites rows instead of duplicating them.
+    """
+
+    ROW_OVERHEAD_BYTES = 128  # ids, keys and JSON punctuation around content and embedding
+
+    def __init__(self, supabase=None, max_batch_rows=None, max_batch_bytes=None, concurrency=None, max_retries=None):
+        self.supabase = supabase or get_supabase_client()
+        self.max_batch_rows = max_batch_rows or Config.CHUNK_INSERT_MAX_ROWS
+        self.max_batch_bytes = max_batch_bytes or Config.CHUNK_INSERT_MAX_BYTES
+        self.concurrency = concurrency or Config.CHUNK_INSERT_CONCURRENCY
+        self.max_retries = Config.CHUNK_INSERT_MAX_RETRIES if max_retries is None else max_retries
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.batches = 0
+        self.retries = 0
+        self.seconds = 0.0
+
+    def row_size(self, row):
+        return len(row['content'].encode('utf-8')) + len(row['embedding']) + self.ROW_OVERHEAD_BYTES
+
+    def plan_batches(self, rows):
+        """Split `rows` into contiguous (start, end) ranges under the row and byte limits"""
+        batches = []
+        start = 0
+        size = 0
+        for idx, row in enumerate(rows):
+            row_bytes = self.row_size(row)
+            if idx > start and (idx - start >= self.max_batch_rows or size + row_bytes > self.max_batch_bytes):
+                batches.append((start, idx))
+                start = idx
+                size = 0
+            size += row_bytes
+        if start < len(rows):
+            batches.append((start, len(rows)))
+        return batches
+
+    def write(self, rows, packed_width=None):
+        """Upsert document_chunks `rows` (embeddings already encoded) and return the stored
+        {id, document_id, chunk_index} in row order. With `packed_width` the embeddings are
+        base64 buffers sent through the insert_document_chunks_packed RPC."""
+        if not rows:
+            return []
+        started = time.perf_counter()
+        batches = self.plan_batches(rows)
+        stored = [None] * len(rows)
+
+        if len(batches) == 1 or self.concurrency == 1:
+            for start, end in batches:
+                stored[start:end] = self._write_batch(rows[start:end], packed_width)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches)), thread_name_prefix='chunk-write') as executor:
+                futures = {
+                    executor.submit(self._write_batch, rows[start:end], packed_width): (start, end)
+                    for start, end in batches
+                }
+                for future, (start, end) in futures.items():
+                    stored[start:end] = future.result()
+
+        with self._lock:
+            self.rows_written += len(rows)
+            self.batches += len(batches)
+            self.seconds += time.perf_counter() - started
+        return stored
+
+    def _write_batch(self, batch, packed_width):
+        attempt = 0
+        while True:
+            try:
+                if packed_width:
+                    result = self.supabase.rpc('insert_document_chunks_packed', {'chunks': batch, 'width': packed_width}).execute()
+                else:
+                    # Return only the keys, not the stored content and embeddings
+                    result = self.supabase.table('document_chunks') \
+                        .upsert(batch, on_conflict='document_id,chunk_index') \
+                        .select('id,document_id,chunk_index').execute()
+                # Upserted rows are not guaranteed to come back in request order
+                by_key = {(str(row.get('document_id')), int(row.get('chunk_index'))): row for row in result.data or []}
+                return [by_key.get((str(row['document_id']), int(row['chunk_index']))) for row in batch]
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_write_error(e):
+                    raise
+                delay = min(Config.CHUNK_INSERT_RETRY_MAX_DELAY, Config.CHUNK_INSERT_RETRY_BASE_DELAY * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                print(f"Chunk batch of {len(batch)} rows failed ({str(e)}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rows_written': self.rows_written,
+                'batches': self.batches,
+                'retries': self.retries,
+                'rows_per_second': self.rows_written / self.seconds if self.seconds else 0.0
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_chunk_writer():
+    """Return the process-wide chunk writer, creating it on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ChunkWriter()
+        return _writer
@@ -1,9 +1,10 @@
-from supabase import create_client, Client
+from supabase import Client
 from config import Config
+from clients import get_client_registry
 
 def get_supabase_client() -> Client:
-    """Get Supabase client instance"""
+    """Get the shared Supabase client instance (pooled connections)"""
     if not Config.SUPABASE_URL or not Config.SUPABASE_ANON_KEY:
         raise ValueError("Supabase URL and Key must be set in environment variables or config")
     
-    return create_client(Config.SUPABASE_URL, Config.SUPABASE_ANON_KEY)
+    return get_client_registry().supabase
@@ -1,8 +1,110 @@
 from .client import get_supabase_client
+from .chunk_writer import get_chunk_writer
+from .document_count import get_document_count
 from config import Config
+from rag.query_cache import get_query_embedding_cache
+from rag.retrieval_cache import get_retrieval_cache
+from rag.vector_index import get_vector_index
+from rag.lexical_index import get_lexical_index, reciprocal_rank_fusion
+from rag.vector_codec import PACKED_DTYPES, as_matrix, format_pgvector, pack_vectors
+from rag.embedding_cache import chunk_hash
+from postgrest.types import CountMethod, ReturnMethod
 from datetime import datetime
+import base64
+import json
 import uuid
 
+# Columns the document list shows
+LIST_COLUMNS = 'id,name,file_size,file_type,file_path,status,created_at'
+
+def format_similar_chunks(rows, min_similarity=0.3):
+    """Shape match_documents rows for the chat API, dropping weak matches.
+    Lexical (BM25) hits are kept whatever their vector similarity, since exact
+    identifiers and error codes often embed far from the question."""
+    formatted_results = []
+    for chunk in rows or []:
+        if chunk.get('lexical_score') is not None or (chunk.get('similarity') or 0) > min_similarity:
+            formatted_results.append({
+                'id': chunk.get('id'),
+                'document_id': chunk.get('document_id'),
+                'chunk_index': chunk.get('chunk_index'),
+                'content': chunk.get('content'),
+                'similarity': chunk.get('similarity'),
+                'lexical_score': chunk.get('lexical_score'),
+                'document_name': chunk.get('document_name', 'Unknown'),
+                'document_path': chunk.get('document_path', ''),
+                'document_type': chunk.get('document_type', ''),
+                'source_link': f"/documents/{chunk.get('document_id')}"
+            })
+    return formatted_results
+
+def sync_local_indexes(action, *args):
+    """Mirror a write into the local vector and lexical indexes that are in use.
+    On failure the index is marked stale, so searches stop using it until it
+    is rebuilt."""
+    for index in (get_vector_index(), get_lexical_index()):
+        if index is None:
+            continue
+        try:
+            getattr(index, action)(*args)
+        except Exception as e:
+            print(f"Error updating local {index.__class__.__name__} ({action}): {str(e)}")
+            try:
+                index.mark_stale()
+            except Exception:
+                pass
+
+def encode_cursor(document):
+    """Opaque keyset cursor: the position after `document` in (created_at, id) order"""
+    raw = json.dumps([document['created_at'], document['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor from encode_cursor; ValueError if malformed"""
+    try:
+        created_at, document_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(created_at), str(uuid.UUID(str(document_id)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def match_documents_local(query_embedding, top_k):
+    """match_documents rows from the local index, or None if it is not in use or not built"""
+    index = get_vector_index()
+    if index is None or not index.ready:
+        return None
+    return index.search(query_embedding, top_k)
+
+def match_documents_local_many(query_embeddings, top_k):
+    """match_documents rows for each embedding from the local index, in one vectorized search"""
+    index = get_vector_index()
+    if index is None or not index.ready:
+        return None
+    return index.search_many(query_embeddings, top_k)
+
+def group_batch_rows(rows, count):
+    """Split match_documents_batch rows into one list per query_index, keeping their order"""
+    grouped = [[] for _ in range(count)]
+    for row in rows or []:
+        row = dict(row)
+        grouped[row.pop('query_index')].append(row)
+    return grouped
+
+def match_lexical_local(query_text, top_k):
+    """BM25 rows from the lexical index, or None if hybrid search is off or not built"""
+    index = get_lexical_index()
+    if index is None or not index.ready:
+        return None
+    return index.search(query_text, top_k)
+
+def retrieval_candidates(top_k):
+    """How many rows to take from each retriever: more than top_k when fusing"""
+    return max(top_k, Config.HYBRID_CANDIDATES) if get_lexical_index() is not None else top_k
+
+def fuse_hybrid(vector_rows, lexical_rows, top_k):
+    if lexical_rows is None:
+        return (vector_rows or [])[:top_k]
+    return reciprocal_rank_fusion(vector_rows, lexical_rows, top_k, k=Config.RRF_K)
+
 class DocumentService:
     def __init__(self):
         self.supabase = get_supabase_client()
@@ -20,14 +122,18 @@ class DocumentService:
                 'file_size': document_data.get('file_size'),  # bytes (BIGINT)
                 'file_type': document_data.get('file_type'),
                 'status': document_data.get('status', 'uploaded'),
+                'content_hash': document_data.get('content_hash'),
                 'created_at': datetime.now().isoformat(),
                 'updated_at': datetime.now().isoformat()
             }
             
             # Insert into Supabase
             result = self.supabase.table(self.table).insert(supabase_data).execute()
+            get_retrieval_cache().invalidate()
+            get_document_count().add(len(result.data or []))
             
             if result.data:
+                sync_local_indexes('put_document', result.data[0])
                 return result.data[0]
             else:
                 raise Exception("Failed to create document record")
@@ -36,6 +142,39 @@ class DocumentService:
             print(f"Error creating document: {str(e)}")
             raise e
     
+    def create_documents(self, documents_data, page_size=500):
+        """Create many document records with one insert per `page_size` rows"""
+        try:
+            now = datetime.now().isoformat()
+            rows = [
+                {
+                    'id': str(uuid.uuid4()),
+                    'name': data.get('name'),
+                    'original_name': data.get('original_name'),
+                    'file_path': data.get('file_path'),
+                    'file_size': data.get('file_size'),
+                    'file_type': data.get('file_type'),
+                    'status': data.get('status', 'uploaded'),
+                    'content_hash': data.get('content_hash'),
+                    'created_at': now,
+                    'updated_at': now
+                }
+                for data in documents_data
+            ]
+            created = []
+            for start in range(0, len(rows), page_size):
+                result = self.supabase.table(self.table).insert(rows[start:start + page_size]).execute()
+                created += result.data or []
+                get_document_count().add(len(result.data or []))
+            if len(created) != len(rows):
+                raise Exception("Failed to create document records")
+            get_retrieval_cache().invalidate()
+            sync_local_indexes('put_documents', created)
+            return created
+        except Exception as e:
+            print(f"Error creating documents: {str(e)}")
+            raise e
+
     def get_documents(self):
         """Get all documents from Supabase"""
         try:
@@ -45,29 +184,45 @@ class DocumentService:
             print(f"Error fetching documents: {str(e)}")
             raise e
 
-    def get_documents_paginated(self, page=1, per_page=5):
-        """Get documents with pagination"""
+    def count_documents(self):
+        """Exact number of documents (one count query)"""
+        return self.supabase.table(self.table).select('id', count=CountMethod.exact, head=True).execute().count or 0
+
+    def get_documents_paginated(self, page=1, per_page=5, cursor=None):
+        """One page of documents, newest first, with only the LIST_COLUMNS.
+        With a `cursor` (next_cursor of the previous page) the page is read by
+        keyset on (created_at, id), so deep pages cost the same as the first;
+        otherwise it is read by offset from `page`. The total comes from the
+        cached document count. Raises ValueError for a malformed cursor."""
+        position = decode_cursor(cursor) if cursor else None
         try:
-            # Calculate offset
-            offset = (page - 1) * per_page
-            
-            # Get total count
-            count_result = self.supabase.table(self.table).select('id', count='exact').execute()
-            total = count_result.count or 0
-            
-            # Get paginated documents
-            result = self.supabase.table(self.table).select('*').order('created_at', desc=True).range(offset, offset + per_page - 1).execute()
+            query = self.supabase.table(self.table).select(LIST_COLUMNS) \
+                .order('created_at', desc=True).order('id', desc=True)
+            if position:
+                created_at, document_id = position
+                # (created_at, id) < cursor, with a plain range on created_at the index can seek to
+                query = query.lte('created_at', created_at) \
+                    .or_(f'created_at.lt."{created_at}",id.lt.{document_id}')
+                # One extra row tells whether there is a next page
+                result = query.limit(per_page + 1).execute()
+            else:
+                offset = (page - 1) * per_page
+                result = query.range(offset, offset + per_page).execute()
             documents = result.data or []
-            
-            # Calculate total pages
+            has_more = len(documents) > per_page
+            documents = documents[:per_page]
+
+            total = get_document_count().get(self.count_documents)
+            # Total pages calculated from the cached count
             total_pages = (total + per_page - 1) // per_page
-            
+
             return {
                 'documents': documents,
                 'total': total,
                 'total_pages': total_pages,
                 'page': page,
-                'per_page': per_page
+                'per_page': per_page,
+                'next_cursor': encode_cursor(documents[-1]) if has_more else None
             }
         except Exception as e:
             print(f"Error getting paginated documents: {str(e)}")
@@ -84,6 +239,33 @@ class DocumentService:
             print(f"Error fetching document: {str(e)}")
             raise e
 
+    def get_document_by_hash(self, content_hash):
+        """Oldest document whose file has this SHA-256, skipping failed ones, or None"""
+        try:
+            result = self.supabase.table(self.table).select('*').eq('content_hash', content_hash) \
+                .neq('status', 'failed').order('created_at').limit(1).execute()
+            if result.data:
+                return result.data[0]
+            return None
+        except Exception as e:
+            print(f"Error fetching document by hash: {str(e)}")
+            raise e
+
+    def get_documents_by_hashes(self, content_hashes):
+        """Map each given SHA-256 to its oldest non-failed document, for hashes that have one"""
+        try:
+            found = {}
+            hashes = list(dict.fromkeys(content_hashes))
+            for start in range(0, len(hashes), 100):
+                result = self.supabase.table(self.table).select('*').in_('content_hash', hashes[start:start + 100]) \
+                    .neq('status', 'failed').order('created_at').execute()
+                for document in result.data or []:
+                    found.setdefault(document['content_hash'], document)
+            return found
+        except Exception as e:
+            print(f"Error fetching documents by hashes: {str(e)}")
+            raise e
+
     def get_documents_by_ids(self, document_ids):
         """Get multiple documents by a list of IDs"""
         try:
@@ -99,6 +281,9 @@ class DocumentService:
         """Delete a document from Supabase"""
         try:
             result = self.supabase.table(self.table).delete().eq('id', document_id).execute()
+            get_retrieval_cache().invalidate()
+            get_document_count().add(-len(result.data or []))
+            sync_local_indexes('remove_documents', [document_id])
             return result.data
         except Exception as e:
             print(f"Error deleting document: {str(e)}")
@@ -108,6 +293,9 @@ class DocumentService:
         """Delete multiple documents from Supabase"""
         try:
             result = self.supabase.table(self.table).delete().in_('id', document_ids).execute()
+            get_retrieval_cache().invalidate()
+            get_document_count().add(-len(result.data or []))
+            sync_local_indexes('remove_documents', document_ids)
             return result.data or []
         except Exception as e:
             print(f"Error deleting documents: {str(e)}")
@@ -118,6 +306,9 @@ class DocumentService:
         try:
             # Use SQL function to truncate all tables efficiently
             result = self.supabase.rpc('truncate_all_documents').execute()
+            get_retrieval_cache().invalidate()
+            get_document_count().set(0)
+            sync_local_indexes('clear')
             
             if result.data and len(result.data) > 0:
                 data = result.data[0]
@@ -148,74 +339,228 @@ class DocumentService:
             print(f"Error updating document status: {str(e)}")
             raise e
 
+    def update_documents_status(self, document_ids, status):
+        """Set the status of many documents, 200 ids per request"""
+        try:
+            for start in range(0, len(document_ids), 200):
+                self.supabase.table(self.table).update({
+                    'status': status,
+                    'updated_at': datetime.now().isoformat()
+                }).in_('id', document_ids[start:start + 200]).execute()
+        except Exception as e:
+            print(f"Error updating documents status: {str(e)}")
+            raise e
+
+    def update_document(self, document_id, fields):
+        """Update document fields (e.g. the file of a replaced document)"""
+        try:
+            result = self.supabase.table(self.table).update({
+                **fields,
+                'updated_at': datetime.now().isoformat()
+            }).eq('id', document_id).execute()
+            get_retrieval_cache().invalidate()
+
+            if result.data:
+                sync_local_indexes('put_document', result.data[0])
+                return result.data[0]
+            return None
+        except Exception as e:
+            print(f"Error updating document: {str(e)}")
+            raise e
+
     def insert_document_chunks(self, document_id, chunks_with_embeddings):
         """Bulk insert document chunks with embeddings.
         chunks_with_embeddings: List[dict] with keys: chunk_index, content, embedding
+        Embeddings are sent per EMBEDDING_TRANSFER_FORMAT: pgvector text, or base64
+        float32/float16 buffers decoded by insert_document_chunks_packed. Rows are
+        upserted in size-bounded concurrent batches (see ChunkWriter).
         """
+        return self.insert_chunks([dict(item, document_id=document_id) for item in chunks_with_embeddings])
+
+    def insert_chunks(self, chunks_with_embeddings):
+        """insert_document_chunks for chunks of several documents at once; each dict
+        also carries its document_id"""
         try:
             if not chunks_with_embeddings:
                 return []
+            embeddings = as_matrix([item['embedding'] for item in chunks_with_embeddings])
+            transfer_format = Config.EMBEDDING_TRANSFER_FORMAT
+            if transfer_format == 'text':
+                encoded = [format_pgvector(vector) for vector in embeddings]  # Convert to PostgreSQL vector format
+            else:
+                encoded = pack_vectors(embeddings, transfer_format)
             rows = []
-            for item in chunks_with_embeddings:
+            for item, embedding in zip(chunks_with_embeddings, encoded):
                 # Clean content to remove problematic Unicode characters
                 cleaned_content = self._clean_text_content(item['content'])
                 rows.append({
-                    'document_id': document_id,
+                    'document_id': item['document_id'],
                     'chunk_index': int(item['chunk_index']),
                     'content': cleaned_content,
-                    'embedding': f"[{','.join(map(str, item['embedding']))}]"  # Convert to PostgreSQL vector format
+                    'embedding': embedding
                 })
-            result = self.supabase.table('document_chunks').insert(rows).execute()
-            return result.data or []
+            packed_width = None if transfer_format == 'text' else PACKED_DTYPES[transfer_format].itemsize
+            stored = get_chunk_writer().write(rows, packed_width)
+            get_retrieval_cache().invalidate()
+            inserted = [dict(row, id=match.get('id')) for row, match in zip(rows, stored) if match]
+            if inserted:
+                sync_local_indexes('add', inserted, embeddings[[idx for idx, match in enumerate(stored) if match]])
+            return [match for match in stored if match]
         except Exception as e:
             print(f"Error inserting document chunks: {str(e)}")
             raise e
 
+    def delete_document_chunks(self, document_id):
+        """Delete all chunks stored for a document"""
+        try:
+            result = self.supabase.table('document_chunks').delete().eq('document_id', document_id).execute()
+            get_retrieval_cache().invalidate()
+            sync_local_indexes('remove_chunks', [document_id])
+            return result.data or []
+        except Exception as e:
+            print(f"Error deleting document chunks: {str(e)}")
+            raise e
+
+    def content_hash(self, content):
+        """Hash of chunk text as it is stored, for diffing two versions of a document"""
+        return chunk_hash(self._clean_text_content(content))
+
+    def get_chunk_hashes(self, document_id, page_size=1000):
+        """id, chunk_index and content hash of every stored chunk of a document"""
+        try:
+            chunks = []
+            start = 0
+            while True:
+                page = self.supabase.table('document_chunks').select('id,chunk_index,content') \
+                    .eq('document_id', document_id).order('chunk_index') \
+                    .range(start, start + page_size - 1).execute().data or []
+                chunks += [
+                    {'id': row['id'], 'chunk_index': row['chunk_index'], 'hash': self.content_hash(row['content'])}
+                    for row in page
+                ]
+                if len(page) < page_size:
+                    return chunks
+                start += page_size
+        except Exception as e:
+            print(f"Error fetching document chunk hashes: {str(e)}")
+            raise e
+
+    def delete_chunks(self, document_id, chunk_ids):
+        """Delete specific chunks of a document by id; returns how many were deleted"""
+        try:
+            deleted = 0
+            # Ids travel in the query string; keep each request's URL short
+            for start in range(0, len(chunk_ids), 200):
+                result = self.supabase.table('document_chunks') \
+                    .delete(count=CountMethod.exact, returning=ReturnMethod.minimal) \
+                    .eq('document_id', document_id).in_('id', chunk_ids[start:start + 200]).execute()
+                deleted += result.count or 0
+            if chunk_ids:
+                get_retrieval_cache().invalidate()
+                sync_local_indexes('remove_chunk_ids', chunk_ids)
+            return deleted
+        except Exception as e:
+            print(f"Error deleting chunks: {str(e)}")
+            raise e
+
+    def reorder_chunks(self, document_id, chunk_ids):
+        """Make `chunk_ids` the document's chunks, numbered 0.. in that order, and
+        delete every other chunk of it in the same transaction (see
+        reorder_document_chunks); returns how many were deleted"""
+        try:
+            chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+            result = self.supabase.rpc('reorder_document_chunks', {
+                'p_document_id': str(document_id),
+                'chunk_ids': chunk_ids
+            }).execute()
+            removed = [row['id'] for row in result.data or []]
+            get_retrieval_cache().invalidate()
+            if removed:
+                sync_local_indexes('remove_chunk_ids', removed)
+            sync_local_indexes('renumber_chunks', chunk_ids)
+            return len(removed)
+        except Exception as e:
+            print(f"Error reordering chunks: {str(e)}")
+            raise e
+
     def search_similar_chunks(self, query_text, top_k=5):
         """Search for similar chunks using Supabase SQL function."""
         try:
-            from openai import OpenAI
-            import os
-            # Generate embedding for query
-            OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            query_embedding = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=query_text
-            ).data[0].embedding
-            # Call Supabase SQL function directly
-            result = self.supabase.rpc(
-                'match_documents',
-                {
-                    'query_embedding': query_embedding,
-                    'match_count': top_k
-                }
-            ).execute()
+            # Identical questions against an unchanged corpus reuse the last result
+            query_cache = get_query_embedding_cache()
+            retrieval_cache = get_retrieval_cache()
+            cache_key = retrieval_cache.key(query_text, top_k, Config.EMBEDDING_MODEL)
+            cached = retrieval_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            # Generate embedding for query (repeated questions are served from the cache)
+            query_embedding = query_cache.get_embedding(query_text)
+            candidates = retrieval_candidates(top_k)
+            rows = match_documents_local(query_embedding, candidates)
+            if rows is None:
+                # Call Supabase SQL function directly
+                rows = self.supabase.rpc(
+                    'match_documents',
+                    {
+                        'query_embedding': query_embedding,
+                        'match_count': candidates
+                    }
+                ).execute().data
+            # Exact-term matches (identifiers, table names, error codes) fused by rank
+            rows = fuse_hybrid(rows, match_lexical_local(query_text, candidates), top_k)
             # Format results with source links
-            if result.data:
-                formatted_results = []
-                for chunk in result.data:
-                    if chunk.get('similarity') > 0.3:
-                        formatted_results.append({
-                            'id': chunk.get('id'),
-                            'document_id': chunk.get('document_id'),
-                            'chunk_index': chunk.get('chunk_index'),
-                            'content': chunk.get('content'),
-                            'similarity': chunk.get('similarity'),
-                            'document_name': chunk.get('document_name', 'Unknown'),
-                            'document_path': chunk.get('document_path', ''),
-                            'document_type': chunk.get('document_type', ''),
-                            'source_link': f"/documents/{chunk.get('document_id')}"
-                        })
-                return formatted_results
-            
-            return []
+            formatted_results = format_similar_chunks(rows)
+            retrieval_cache.put(cache_key, formatted_results)
+            return formatted_results
             
         except Exception as e:
             print(f"Error searching similar chunks: {str(e)}")
             return []
     
+    def match_documents_batch(self, query_embeddings, match_count):
+        """match_documents for several embeddings in one RPC (match_documents_batch in
+        schema.sql); databases without the function are searched one call at a time"""
+        try:
+            rows = self.supabase.rpc(
+                'match_documents_batch',
+                {'query_embeddings': query_embeddings, 'match_count': match_count}
+            ).execute().data
+            return group_batch_rows(rows, len(query_embeddings))
+        except Exception as e:
+            print(f"match_documents_batch failed, searching query by query: {str(e)}")
+            return [
+                self.supabase.rpc('match_documents', {'query_embedding': embedding, 'match_count': match_count}).execute().data
+                for embedding in query_embeddings
+            ]
+
+    def search_similar_chunks_many(self, query_texts, top_k=5):
+        """search_similar_chunks for a batch of queries: the uncached ones are embedded
+        in one request and searched together. Returns one result list per query."""
+        try:
+            retrieval_cache = get_retrieval_cache()
+            cache_keys = retrieval_cache.keys(query_texts, top_k, Config.EMBEDDING_MODEL)
+            results = [retrieval_cache.get(key) for key in cache_keys]
+            pending = [pos for pos, cached in enumerate(results) if cached is None]
+            if not pending:
+                return results
+
+            texts = [query_texts[pos] for pos in pending]
+            query_embeddings = get_query_embedding_cache().get_embeddings(texts)
+            candidates = retrieval_candidates(top_k)
+            matches = match_documents_local_many(query_embeddings, candidates)
+            if matches is None:
+                matches = self.match_documents_batch(query_embeddings, candidates)
+            for pos, text, rows in zip(pending, texts, matches):
+                rows = fuse_hybrid(rows, match_lexical_local(text, candidates), top_k)
+                results[pos] = format_similar_chunks(rows)
+                retrieval_cache.put(cache_keys[pos], results[pos])
+            return results
+
+        except Exception as e:
+            print(f"Error searching similar chunks: {str(e)}")
+            return [[] for _ in query_texts]
+
     def _clean_text_content(self, text):
         """Clean text content to remove problematic Unicode characters."""
         if not text:
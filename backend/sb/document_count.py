@@ -0,0 +1,77 @@
+import os
+import time
+import sqlite3
+import threading
+from config import Config
+
+
+class DocumentCount:
+    """Row count of the documents table, kept in a one-row SQLite file so every
+    worker process on the host shares it.
+
+    The create and delete paths adjust it as they commit, so listing pages
+    never counts the table. It is recounted with one exact query when unknown
+    or older than `refresh_seconds`, which also picks up writes made outside
+    this host.
+    """
+
+    def __init__(self, path, refresh_seconds=300):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._local = threading.local()
+        self.recounts = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS document_count (id INTEGER PRIMARY KEY CHECK (id = 1),"
+                     " count INTEGER, counted_at REAL NOT NULL DEFAULT 0)")
+        conn.execute("INSERT OR IGNORE INTO document_count (id, count) VALUES (1, NULL)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, recount):
+        """The cached count, or `recount()` (an exact count) when stale or unknown"""
+        count, counted_at = self._connection().execute(
+            "SELECT count, counted_at FROM document_count WHERE id = 1"
+        ).fetchone()
+        if count is None or time.time() - counted_at > self.refresh_seconds:
+            count = recount()
+            self.set(count)
+            self.recounts += 1
+        return count
+
+    def set(self, count):
+        conn = self._connection()
+        conn.execute("UPDATE document_count SET count = ?, counted_at = ? WHERE id = 1", (count, time.time()))
+        conn.commit()
+
+    def add(self, delta):
+        """Adjust a known count by `delta` documents created (or deleted, if negative)"""
+        conn = self._connection()
+        conn.execute("UPDATE document_count SET count = MAX(0, count + ?) WHERE id = 1 AND count IS NOT NULL", (delta,))
+        conn.commit()
+
+    def invalidate(self):
+        """Forget the count; the next get() recounts"""
+        conn = self._connection()
+        conn.execute("UPDATE document_count SET count = NULL WHERE id = 1")
+        conn.commit()
+
+
+_document_count = None
+_document_count_lock = threading.Lock()
+
+
+def get_document_count():
+    """Return the process-wide document count cache, creating it on first use"""
+    global _document_count
+    with _document_count_lock:
+        if _document_count is None:
+            _document_count = DocumentCount(Config.DOCUMENT_COUNT_PATH, Config.DOCUMENT_COUNT_REFRESH)
+        return _document_count
@@ -0,0 +1,203 @@
+from .client import get_supabase_client
+from config import Config
+from datetime import datetime, timedelta
+import uuid
+
+class JobService:
+    """Persistent ingestion job records backing the background worker pool."""
+
+    def __init__(self):
+        self.supabase = get_supabase_client()
+        self.table = Config.SUPABASE_JOBS_TABLE
+
+    def create_job(self, document_id, file_path, file_type, kind='ingest', replacement=None):
+        """Create a queued ingestion job for a document.
+        kind: 'ingest' (new document) or 'replace' (diff a new version against stored chunks)
+        replacement: for 'replace', the new file fields of the document ('document'), written
+        once the job succeeds, and the 'previous_file_path' and 'previous_status' it replaces
+        """
+        try:
+            job_data = {
+                'id': str(uuid.uuid4()),
+                'document_id': document_id,
+                'file_path': file_path,
+                'file_type': file_type,
+                'status': 'queued',
+                'attempts': 0,
+                'created_at': datetime.now().isoformat(),
+                'updated_at': datetime.now().isoformat()
+            }
+            if kind != 'ingest':
+                # Plain uploads keep working on databases created before the kind column
+                job_data['kind'] = kind
+            if replacement is not None:
+                job_data['replacement'] = replacement
+            result = self.supabase.table(self.table).insert(job_data).execute()
+
+            if result.data:
+                return result.data[0]
+            else:
+                raise Exception("Failed to create ingestion job")
+
+        except Exception as e:
+            print(f"Error creating ingestion job: {str(e)}")
+            raise e
+
+    def create_jobs(self, documents, batch_id, page_size=500):
+        """Create queued ingestion jobs for documents of one bulk upload (one insert per
+        `page_size` rows). documents: dicts with document_id, file_path, file_type."""
+        try:
+            now = datetime.now().isoformat()
+            rows = [
+                {
+                    'id': str(uuid.uuid4()),
+                    'document_id': document['document_id'],
+                    'file_path': document['file_path'],
+                    'file_type': document['file_type'],
+                    'batch_id': batch_id,
+                    'status': 'queued',
+                    'attempts': 0,
+                    'created_at': now,
+                    'updated_at': now
+                }
+                for document in documents
+            ]
+            created = []
+            for start in range(0, len(rows), page_size):
+                result = self.supabase.table(self.table).insert(rows[start:start + page_size]).execute()
+                created += result.data or []
+            if len(created) != len(rows):
+                raise Exception("Failed to create ingestion jobs")
+            return created
+        except Exception as e:
+            print(f"Error creating ingestion jobs: {str(e)}")
+            raise e
+
+    def get_job(self, job_id):
+        """Get a specific ingestion job by ID"""
+        try:
+            result = self.supabase.table(self.table).select('*').eq('id', job_id).execute()
+            if result.data:
+                return result.data[0]
+            return None
+        except Exception as e:
+            print(f"Error fetching ingestion job: {str(e)}")
+            raise e
+
+    def get_latest_job_for_document(self, document_id):
+        """Get the most recent ingestion job for a document"""
+        try:
+            result = self.supabase.table(self.table).select('*').eq('document_id', document_id) \
+                .order('created_at', desc=True).limit(1).execute()
+            if result.data:
+                return result.data[0]
+            return None
+        except Exception as e:
+            print(f"Error fetching ingestion job for document: {str(e)}")
+            raise e
+
+    def get_queued_jobs(self, page_size=500):
+        """All jobs still waiting for a worker, oldest first. Read in pages by
+        keyset on (created_at, id), so jobs claimed meanwhile do not shift later pages."""
+        try:
+            jobs = []
+            while True:
+                query = self.supabase.table(self.table).select('*').eq('status', 'queued') \
+                    .order('created_at').order('id')
+                if jobs:
+                    created_at, job_id = jobs[-1]['created_at'], jobs[-1]['id']
+                    # (created_at, id) > last row of the previous page
+                    query = query.gte('created_at', created_at) \
+                        .or_(f'created_at.gt."{created_at}",id.gt.{job_id}')
+                page = query.limit(page_size).execute().data or []
+                jobs += page
+                if len(page) < page_size:
+                    return jobs
+        except Exception as e:
+            print(f"Error fetching queued ingestion jobs: {str(e)}")
+            raise e
+
+    def requeue_stale_jobs(self, timeout_seconds):
+        """Move jobs left in processing for longer than `timeout_seconds` (by
+        updated_at) back to queued, so a restarted process can claim them again.
+        Returns the requeued rows."""
+        try:
+            cutoff = (datetime.now() - timedelta(seconds=timeout_seconds)).isoformat()
+            result = self.supabase.table(self.table).update({
+                'status': 'queued',
+                'updated_at': datetime.now().isoformat()
+            }).eq('status', 'processing').lt('updated_at', cutoff).execute()
+            return result.data or []
+        except Exception as e:
+            print(f"Error requeueing stale ingestion jobs: {str(e)}")
+            raise e
+
+    def claim_job(self, job_id, attempts=0):
+        """Atomically move a queued job to processing.
+        Returns the job row, or None if another worker already claimed it.
+        """
+        try:
+            result = self.supabase.table(self.table).update({
+                'status': 'processing',
+                'attempts': attempts + 1,
+                'updated_at': datetime.now().isoformat()
+            }).eq('id', job_id).eq('status', 'queued').execute()
+
+            if result.data:
+                return result.data[0]
+            return None
+        except Exception as e:
+            print(f"Error claiming ingestion job: {str(e)}")
+            raise e
+
+    def claim_jobs(self, job_ids):
+        """claim_job for fresh jobs of a bulk upload, 200 per request. Returns the
+        rows this worker claimed."""
+        try:
+            claimed = []
+            for start in range(0, len(job_ids), 200):
+                result = self.supabase.table(self.table).update({
+                    'status': 'processing',
+                    'attempts': 1,
+                    'updated_at': datetime.now().isoformat()
+                }).in_('id', job_ids[start:start + 200]).eq('status', 'queued').execute()
+                claimed += result.data or []
+            return claimed
+        except Exception as e:
+            print(f"Error claiming ingestion jobs: {str(e)}")
+            raise e
+
+    def get_batch_jobs(self, batch_id, page_size=1000):
+        """All jobs of a bulk upload, oldest first"""
+        try:
+            jobs = []
+            start = 0
+            while True:
+                page = self.supabase.table(self.table) \
+                    .select('id,document_id,status,attempts,chunk_count,error,updated_at') \
+                    .eq('batch_id', batch_id).order('created_at').order('id') \
+                    .range(start, start + page_size - 1).execute().data or []
+                jobs += page
+                if len(page) < page_size:
+                    return jobs
+                start += page_size
+        except Exception as e:
+            print(f"Error fetching batch ingestion jobs: {str(e)}")
+            raise e
+
+    def finish_job(self, job_id, status, chunk_count=None, error=None):
+        """Record the final state of a job"""
+        try:
+            result = self.supabase.table(self.table).update({
+                'status': status,
+                'chunk_count': chunk_count,
+                'error': error,
+                'updated_at': datetime.now().isoformat()
+            }).eq('id', job_id).execute()
+
+            if result.data:
+                return result.data[0]
+            return None
+        except Exception as e:
+            print(f"Error updating ingestion job: {str(e)}")
+            raise e
@@ -7,6 +7,7 @@ CREATE TABLE IF NOT EXISTS documents (
     file_size BIGINT NOT NULL,
     file_type VARCHAR(20) NOT NULL,
     status VARCHAR(20) DEFAULT 'uploaded',
+    content_hash VARCHAR(64),  -- SHA-256 of the uploaded bytes, for upload deduplication
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -15,6 +16,11 @@ CREATE TABLE IF NOT EXISTS documents (
 CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
 CREATE INDEX IF NOT EXISTS idx_documents_file_type ON documents(file_type);
 CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at);
+-- Keyset pagination of the document list (newest first)
+CREATE INDEX IF NOT EXISTS idx_documents_created_at_id ON documents(created_at DESC, id DESC);
+-- Databases created before upload deduplication
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
 
 -- Create updated_at trigger
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -53,6 +59,8 @@ CREATE TABLE IF NOT EXISTS document_chunks (
 
 CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON document_chunks(document_id);
 CREATE INDEX IF NOT EXISTS idx_chunks_chunk_index ON document_chunks(chunk_index);
+-- Chunk writes are upserts on this key, so retried batches never duplicate rows
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chunks_document_chunk ON document_chunks(document_id, chunk_index);
 CREATE INDEX IF NOT EXISTS document_chunks_embedding_hnsw
 ON document_chunks
 USING hnsw (embedding vector_l2_ops);
@@ -89,6 +97,114 @@ AS $$
   LIMIT match_count;
 $$;
 
+-- match_documents for several query embeddings (a JSON array of vectors) in one call;
+-- query_index is the position of each row's query in that array.
+CREATE OR REPLACE FUNCTION match_documents_batch(
+  query_embeddings jsonb,
+  match_count int DEFAULT 5
+)
+RETURNS TABLE (
+  query_index int,
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  similarity float,
+  document_name text,
+  document_path text,
+  document_type text
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    (q.ordinality - 1)::int AS query_index,
+    m.*
+  FROM jsonb_array_elements(query_embeddings) WITH ORDINALITY AS q(embedding, ordinality)
+  CROSS JOIN LATERAL (
+    SELECT
+      dc.id,
+      dc.document_id,
+      dc.chunk_index,
+      dc.content,
+      1 - (dc.embedding <=> (q.embedding::text)::vector(1536)) AS similarity,
+      d.name AS document_name,
+      d.file_path AS document_path,
+      d.file_type AS document_type
+    FROM document_chunks dc
+    JOIN documents d ON dc.document_id = d.id
+    ORDER BY dc.embedding <=> (q.embedding::text)::vector(1536)
+    LIMIT match_count
+  ) m
+  ORDER BY q.ordinality, m.similarity DESC;
+$$;
+
+
+-- Decode a base64 little-endian float32 (width 4) or float16 (width 2) buffer into a vector.
+-- Lets clients send embeddings as packed binary instead of ~20 bytes of text per dimension.
+-- (PostgreSQL operators like | and << share one precedence level, hence the parentheses.)
+CREATE OR REPLACE FUNCTION decode_packed_vector(packed text, width int DEFAULT 4)
+RETURNS vector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+  SELECT array_agg(
+    (CASE WHEN width = 4 THEN
+       (CASE WHEN bits < 0 THEN -1 ELSE 1 END) *
+       (CASE WHEN (bits >> 23) & 255 = 0 THEN (bits & 8388607)::float8 * power(2::float8, -149)
+             ELSE ((bits & 8388607) + 8388608)::float8 * power(2::float8, ((bits >> 23) & 255) - 150) END)
+     ELSE
+       (CASE WHEN bits >= 32768 THEN -1 ELSE 1 END) *
+       (CASE WHEN (bits >> 10) & 31 = 0 THEN (bits & 1023)::float8 * power(2::float8, -24)
+             ELSE ((bits & 1023) + 1024)::float8 * power(2::float8, ((bits >> 10) & 31) - 25) END)
+     END)::real
+    ORDER BY i
+  )::vector
+  FROM (
+    SELECT i,
+      CASE WHEN width = 4 THEN
+        get_byte(b, i * 4) | (get_byte(b, i * 4 + 1) << 8) | (get_byte(b, i * 4 + 2) << 16) | (get_byte(b, i * 4 + 3) << 24)
+      ELSE
+        get_byte(b, i * 2) | (get_byte(b, i * 2 + 1) << 8)
+      END AS bits
+    FROM decode(packed, 'base64') AS b, generate_series(0, length(b) / width - 1) AS i
+  ) AS elements;
+$$;
+
+-- Bulk upsert chunks whose embeddings are packed buffers (see decode_packed_vector).
+-- Returns only the keys, not the stored vectors.
+CREATE OR REPLACE FUNCTION insert_document_chunks_packed(chunks jsonb, width int DEFAULT 4)
+RETURNS TABLE (id uuid, document_id uuid, chunk_index int)
+LANGUAGE sql
+AS $$
+  INSERT INTO document_chunks AS dc (document_id, chunk_index, content, embedding)
+  SELECT c.document_id, c.chunk_index, c.content, decode_packed_vector(c.embedding, width)
+  FROM jsonb_to_recordset(chunks) AS c(document_id uuid, chunk_index int, content text, embedding text)
+  ON CONFLICT (document_id, chunk_index) DO UPDATE SET content = EXCLUDED.content, embedding = EXCLUDED.embedding
+  RETURNING dc.id, dc.document_id, dc.chunk_index;
+$$;
+
+-- Make `chunk_ids` the chunks of a document, numbered 0.. in that order, in one
+-- transaction: every other chunk of the document is deleted (and returned), and
+-- the rest are moved through negative indexes so the unique
+-- (document_id, chunk_index) index never sees two rows at one position.
+CREATE OR REPLACE FUNCTION reorder_document_chunks(p_document_id uuid, chunk_ids uuid[])
+RETURNS TABLE (id uuid)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+    DELETE FROM document_chunks AS dc
+    WHERE dc.document_id = p_document_id AND NOT (dc.id = ANY(chunk_ids))
+    RETURNING dc.id;
+
+  UPDATE document_chunks AS dc SET chunk_index = -o.position
+  FROM unnest(chunk_ids) WITH ORDINALITY AS o(chunk_id, position)
+  WHERE dc.document_id = p_document_id AND dc.id = o.chunk_id;
+
+  UPDATE document_chunks AS dc SET chunk_index = -dc.chunk_index - 1
+  WHERE dc.document_id = p_document_id AND dc.chunk_index < 0;
+END;
+$$;
+
 
 -- Function to truncate all tables (delete all documents and chunks)
 CREATE OR REPLACE FUNCTION truncate_all_documents()
@@ -114,6 +230,38 @@ BEGIN
 END;
 $$;
 
+-- Background ingestion jobs (one per upload processed by the worker pool)
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    file_path TEXT NOT NULL,
+    file_type VARCHAR(20) NOT NULL,
+    kind VARCHAR(20) DEFAULT 'ingest',  -- 'ingest' or 'replace' (diff against the stored chunks)
+    batch_id UUID,  -- bulk upload the job belongs to
+    replacement JSONB,  -- replace jobs: new file fields of the document, applied on success
+    status VARCHAR(20) DEFAULT 'queued',
+    attempts INT DEFAULT 0,
+    chunk_count INT,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_document_id ON ingestion_jobs(document_id);
+-- Databases created before document replacement
+ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS kind VARCHAR(20) DEFAULT 'ingest';
+-- Databases created before bulk uploads
+ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS batch_id UUID;
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_batch_id ON ingestion_jobs(batch_id, created_at);
+-- Databases created before replace jobs carried the new file fields
+ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS replacement JSONB;
+
+ALTER TABLE ingestion_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow public access to ingestion_jobs" ON ingestion_jobs
+    FOR ALL USING (true);
+
 -- Insert some sample data (optional)
 -- INSERT INTO documents (name, original_name, file_path, file_size, file_size_bytes, file_type, upload_date) 
 -- VALUES 
@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from stub_supabase import start_stub_supabase  # noqa: E402
+
+# Caches, indexes and the Supabase API are local to the test run; set before config is imported
+SCRATCH_DIR = tempfile.mkdtemp(prefix='backend-tests-')
+_supabase_server, _supabase_db, _supabase_url = start_stub_supabase()
+os.environ.update(
+    SUPABASE_URL=_supabase_url,
+    SUPABASE_ANON_KEY='stub',
+    OPENAI_API_KEY='stub',
+    OPENAI_BASE_URL='http://127.0.0.1:9/v1',
+    DOCUMENT_COUNT_PATH=os.path.join(SCRATCH_DIR, 'document_count.sqlite3'),
+    CHAT_SESSION_PATH=os.path.join(SCRATCH_DIR, 'chat_sessions.sqlite3'),
+    EMBEDDING_CACHE_PATH=os.path.join(SCRATCH_DIR, 'embeddings.sqlite3'),
+    QUERY_CACHE_DISK_PATH=os.path.join(SCRATCH_DIR, 'query_embeddings.sqlite3'),
+    CORPUS_VERSION_PATH=os.path.join(SCRATCH_DIR, 'corpus_version.sqlite3'),
+    VECTOR_INDEX_PATH=os.path.join(SCRATCH_DIR, 'vector_index'),
+    LEXICAL_INDEX_PATH=os.path.join(SCRATCH_DIR, 'lexical_index'),
+)
+
+
+@pytest.fixture
+def stub_db():
+    """The in-memory Supabase stub, emptied for each test"""
+    with _supabase_db.lock:
+        _supabase_db.tables.clear()
+    return _supabase_db
+
+
+@pytest.fixture
+def app(stub_db):
+    from app import create_app
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    yield flask_app
+    flask_app.extensions['ingestion_queue'].shutdown()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def queued_jobs(app, tmp_path, monkeypatch):
+    """Uploads land in a scratch folder and queued jobs are recorded instead of run"""
+    from config import Config
+    monkeypatch.setattr(Config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    jobs = []
+    queue = app.extensions['ingestion_queue']
+    monkeypatch.setattr(queue, 'enqueue', jobs.append)
+    monkeypatch.setattr(queue, 'enqueue_batch', lambda batch: jobs.extend(batch))
+    return jobs
+
+
+@pytest.fixture
+def fake_tesseract(monkeypatch):
+    """OCR that reads back the rendered width, so each page's text identifies it"""
+    from rag import ocr
+    monkeypatch.setattr(ocr.pytesseract, 'image_to_string', lambda img, lang='eng': f"width {img.size[0]}")
+    monkeypatch.setattr(ocr, '_pool', None)
+    yield
+    if ocr._pool is not None:
+        ocr._pool.shutdown()
+
+
+@pytest.fixture
+def make_pdf():
+    return build_pdf
+
+
+def build_pdf(pages):
+    """PDF bytes with one page per item: a string is drawn as text, None leaves the
+    page blank, and an int draws an image-only page of that width (a scan)"""
+    import fitz
+    doc = fitz.open()
+    for item in pages:
+        if isinstance(item, int):
+            page = doc.new_page(width=item, height=200)
+            pixmap = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 16, 16), False)
+            pixmap.clear_with(128)
+            page.insert_image(fitz.Rect(10, 10, 60, 60), pixmap=pixmap)
+        else:
+            page = doc.new_page()
+            if item:
+                page.insert_text((72, 72), item)
+    data = doc.tobytes()
+    doc.close()
+    return data
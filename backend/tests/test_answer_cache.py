@@ -0,0 +1,119 @@
+import importlib
+from types import SimpleNamespace
+import pytest
+import rag.answer_cache
+from config import Config
+from rag.answer_cache import AnswerCache, get_answer_cache
+from rag.retrieval_cache import CorpusVersion
+from sb.database_service import DocumentService
+
+chat_routes = importlib.import_module('app.routes.chat')
+
+
+@pytest.fixture
+def version(tmp_path):
+    return CorpusVersion(str(tmp_path / 'version.sqlite3'))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rag.answer_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_paraphrases_within_the_threshold_hit(version):
+    cache = AnswerCache(version, threshold=0.95)
+    found, current = cache.lookup([1.0, 0.0, 0.0])
+    assert found is None
+    assert cache.put([2.0, 0.0, 0.0], 'How do I reset?', 'Hold the button.', [{'id': 's1'}], current)
+
+    found, _ = cache.lookup([1.0, 0.1, 0.0])  # cosine 0.995
+    assert found['answer'] == 'Hold the button.'
+    assert found['sources'] == [{'id': 's1'}]
+    assert found['similarity'] == pytest.approx(0.995, abs=1e-3)
+    assert cache.lookup([1.0, 0.5, 0.0])[0] is None  # cosine 0.894
+
+    stats = cache.stats()
+    assert (stats['lookups'], stats['hits'], stats['misses']) == (3, 1, 2)
+    assert stats['hit_rate'] == pytest.approx(1 / 3)
+
+
+def test_expired_answers_are_purged_before_matching(version, clock):
+    cache = AnswerCache(version, ttl_seconds=60)
+    _, current = cache.lookup([1.0, 0.0])
+    cache.put([1.0, 0.0], 'old', 'old answer', [], current)
+    clock[0] += 30
+    cache.put([0.0, 1.0], 'new', 'new answer', [], current)
+    clock[0] += 45
+    assert cache.lookup([1.0, 0.0])[0] is None
+    assert cache.lookup([0.0, 1.0])[0]['answer'] == 'new answer'
+    assert (cache.stats()['expired'], cache.stats()['entries']) == (1, 1)
+
+
+def test_a_corpus_change_empties_the_cache_and_refuses_stale_answers(version):
+    cache = AnswerCache(version)
+    _, before = cache.lookup([1.0, 0.0])
+    cache.put([1.0, 0.0], 'q', 'a', [], before)
+    version.bump()
+    assert cache.lookup([1.0, 0.0])[0] is None
+    # Generated against the old corpus while the bump happened
+    assert cache.put([1.0, 0.0], 'q', 'a', [], before) is False
+    stats = cache.stats()
+    assert (stats['invalidations'], stats['stale_stores'], stats['entries']) == (1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted(version, clock):
+    cache = AnswerCache(version, max_entries=2)
+    _, current = cache.lookup([1.0, 0.0, 0.0])
+    for i, vector in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0])):
+        clock[0] += 1
+        cache.put(vector, f"q{i}", f"a{i}", [], current)
+    clock[0] += 1
+    assert cache.lookup([1.0, 0.0, 0.0])[0]['answer'] == 'a0'
+    assert cache.put([1.0, 0.0, 0.0], 'q0 again', 'a0 again', [], current) is False  # already stored
+    clock[0] += 1
+    cache.put([0.0, 0.0, 1.0], 'q2', 'a2', [], current)
+    assert cache.lookup([0.0, 1.0, 0.0])[0] is None
+    assert cache.lookup([1.0, 0.0, 0.0])[0]['answer'] == 'a0'
+    assert cache.lookup([0.0, 0.0, 1.0])[0]['answer'] == 'a2'
+
+
+def test_the_cache_is_opt_in(monkeypatch):
+    monkeypatch.setattr(rag.answer_cache, '_answer_cache', None)
+    assert Config.ANSWER_CACHE_ENABLED is False
+    assert get_answer_cache() is None
+    monkeypatch.setattr(Config, 'ANSWER_CACHE_ENABLED', True)
+    assert get_answer_cache() is get_answer_cache()
+
+
+def test_chat_serves_a_repeated_question_from_the_cache(client, monkeypatch, version):
+    cache = AnswerCache(version)
+    monkeypatch.setattr(chat_routes, 'get_answer_cache', lambda: cache)
+    embeddings = {'How do I reset?': [1.0, 0.0], 'how can I reset': [0.99, 0.05], 'Something else': [0.0, 1.0]}
+    monkeypatch.setattr(chat_routes, 'get_query_embedding_cache',
+                        lambda: SimpleNamespace(get_embedding=embeddings.__getitem__))
+    calls = []
+
+    def create(model, messages, stream=False, stream_options=None):
+        calls.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Answer {len(calls)}"))])
+    openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(chat_routes, 'get_openai_client', lambda: openai)
+    monkeypatch.setattr(DocumentService, 'search_similar_chunks', lambda self, query, top_k=5: [])
+
+    first = client.post('/api/chat/chat', json={'message': 'How do I reset?'}).get_json()
+    again = client.post('/api/chat/chat', json={'message': 'how can I reset'}).get_json()
+    other = client.post('/api/chat/chat', json={'message': 'Something else'}).get_json()
+
+    assert 'cached' not in first
+    assert again['response'] == 'Answer 1'
+    assert again['cached']['question'] == 'How do I reset?'
+    assert other['response'] == 'Answer 2'
+    assert len(calls) == 2
+    # A follow-up depends on the conversation, so it always goes to the model
+    follow_up = client.post('/api/chat/chat', json={
+        'message': 'How do I reset?', 'chat_history': [{'role': 'user', 'content': 'hi'}]}).get_json()
+    assert follow_up['response'] == 'Answer 3'
+    stats = cache.stats()
+    assert (stats['lookups'], stats['hits'], stats['stores']) == (3, 1, 2)
@@ -0,0 +1,115 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+import app.asgi
+from app.asgi import chat_endpoint, search_endpoint
+from sb.async_database_service import AsyncDocumentService
+
+CHUNKS = [{'content': 'Refunds are issued within 14 days.', 'document_id': 'd1', 'document_name': 'policy.pdf',
+           'document_type': 'pdf', 'similarity': 0.88, 'source_link': '/files/policy.pdf'}]
+
+
+class FakeAsyncCompletions:
+    def __init__(self, parts):
+        self.parts = parts
+
+    async def create(self, model, messages, stream=False, stream_options=None):
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(self.parts)))])
+        return self.stream()
+
+    async def stream(self):
+        for part in self.parts:
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    """Replaces async retrieval; records whether each search finished or was cancelled"""
+    calls = []
+
+    async def search_similar_chunks(self, query_text, top_k=5):
+        calls.append('started')
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            calls.append('cancelled')
+            raise
+        calls.append('finished')
+        return CHUNKS
+
+    async def search_similar_chunks_many(self, query_texts, top_k=5):
+        return [CHUNKS[:top_k] for _ in query_texts]
+
+    monkeypatch.setattr(AsyncDocumentService, 'search_similar_chunks', search_similar_chunks)
+    monkeypatch.setattr(AsyncDocumentService, 'search_similar_chunks_many', search_similar_chunks_many)
+    return calls
+
+
+@pytest.fixture
+def http():
+    asgi_app = Starlette(routes=[
+        Route("/api/chat/chat", chat_endpoint, methods=["POST"]),
+        Route("/api/chat/search", search_endpoint, methods=["POST"])
+    ])
+    # Clients normally come from the lifespan; chat only needs OpenAI here
+    completions = FakeAsyncCompletions(['Within ', '14 days.'])
+    asgi_app.state.clients = SimpleNamespace(supabase=None, openai=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return TestClient(asgi_app)
+
+
+@pytest.fixture
+def answer_cache(monkeypatch):
+    """An answer cache holding one answer, looked up with a fixed query embedding"""
+    async def get_embedding_async(query_text, client, model=None):
+        return [1.0, 0.0]
+
+    cached = {'answer': 'Refunds take 14 days.', 'sources': [], 'similarity': 0.97, 'question': 'Refund policy?'}
+    cache = SimpleNamespace(lookup=lambda embedding: (cached, 3), observe=lambda hit, seconds: None,
+                            put=lambda *args: None)
+    monkeypatch.setattr(app.asgi, 'get_query_embedding_cache', lambda: SimpleNamespace(get_embedding_async=get_embedding_async))
+    monkeypatch.setattr(app.asgi, 'answer_cache_for', lambda chat_history, summary: cache)
+    return cache
+
+
+def test_chat_answers_from_retrieved_context(http, retrieval):
+    response = http.post('/api/chat/chat', json={'message': 'What is the refund policy?'})
+    body = response.json()
+    assert response.status_code == 200
+    assert body['response'] == 'Within 14 days.'
+    assert body['sources'][0]['document_name'] == 'policy.pdf'
+    assert retrieval == ['started', 'finished']
+
+
+def test_stream_matches_the_wsgi_events(http, retrieval):
+    response = http.post('/api/chat/chat', json={'message': 'What is the refund policy?', 'stream': True})
+    events = [block.split("\n")[0].removeprefix("event: ") for block in response.text.strip().split("\n\n")]
+    assert events == ['sources', 'delta', 'delta', 'done']
+    done = json.loads(response.text.strip().split("\n\n")[-1].split("data: ", 1)[1])
+    assert done['response'] == 'Within 14 days.'
+
+
+def test_answer_cache_hit_cancels_retrieval(http, retrieval, answer_cache):
+    response = http.post('/api/chat/chat', json={'message': 'What is the refund policy?'})
+    body = response.json()
+    assert body['response'] == 'Refunds take 14 days.'
+    assert body['cached']['similarity'] == 0.97
+    assert retrieval == ['started', 'cancelled']
+
+
+def test_empty_message_is_rejected(http, retrieval):
+    assert http.post('/api/chat/chat', json={'message': '  '}).status_code == 400
+    assert retrieval == []
+
+
+def test_search_single_and_batched(http, retrieval):
+    single = http.post('/api/chat/search', json={'query': 'refunds'}).json()
+    assert single['query'] == 'refunds'
+    assert single['results'] == CHUNKS
+    batched = http.post('/api/chat/search', json={'queries': ['refunds', 'returns'], 'top_k': 1}).json()
+    assert [item['query'] for item in batched['results']] == ['refunds', 'returns']
+    assert http.post('/api/chat/search', json={'queries': []}).status_code == 400
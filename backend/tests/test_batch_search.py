@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+import pytest
+import sb.database_service
+from config import Config
+from sb.database_service import DocumentService, group_batch_rows
+
+
+def test_batch_rows_are_grouped_by_query():
+    rows = [{'query_index': 1, 'id': 'b'}, {'query_index': 0, 'id': 'a'}, {'query_index': 1, 'id': 'c'}]
+    assert group_batch_rows(rows, 3) == [[{'id': 'a'}], [{'id': 'b'}, {'id': 'c'}], []]
+    assert rows[0]['query_index'] == 1  # the RPC rows are left as they were
+    assert group_batch_rows(None, 2) == [[], []]
+
+
+@pytest.fixture
+def batched_query_embeddings(monkeypatch):
+    calls = []
+    fake = SimpleNamespace(get_embedding=lambda text: calls.append([text]) or [0.0] * 8,
+                           get_embeddings=lambda texts: calls.append(list(texts)) or [[0.0] * 8 for _ in texts])
+    monkeypatch.setattr(sb.database_service, 'get_query_embedding_cache', lambda: fake)
+    return calls
+
+
+@pytest.fixture
+def indexed_document(stub_db):
+    service = DocumentService()
+    document = service.create_document({'name': 'a.txt', 'original_name': 'a.txt', 'file_path': 'uploads/a.txt',
+                                        'file_size': 1, 'file_type': 'txt', 'status': 'processed'})
+    service.insert_document_chunks(document['id'], [{'chunk_index': i, 'content': f"part {i}", 'embedding': [0.0] * 8}
+                                                    for i in range(3)])
+    return document
+
+
+def test_uncached_queries_are_embedded_in_one_request(indexed_document, batched_query_embeddings):
+    service = DocumentService()
+    service.search_similar_chunks('batch warm question', top_k=2)
+    results = service.search_similar_chunks_many(['batch first', 'batch warm question', 'batch second'], top_k=2)
+
+    assert batched_query_embeddings == [['batch warm question'], ['batch first', 'batch second']]
+    assert [len(rows) for rows in results] == [2, 2, 2]
+    assert results[0][0]['document_name'] == 'a.txt'
+    assert results[0] == service.search_similar_chunks('batch first', top_k=2)
+    assert service.search_similar_chunks_many(['batch first', 'batch second'], top_k=2) == [results[0], results[2]]
+    assert len(batched_query_embeddings) == 2
+
+
+def test_databases_without_the_batch_function_are_searched_per_query(indexed_document):
+    service = DocumentService()
+    calls = []
+    rpc = service.supabase.rpc
+
+    def without_batch(name, params):
+        calls.append(name)
+        if name == 'match_documents_batch':
+            raise RuntimeError('function match_documents_batch does not exist')
+        return rpc(name, params)
+    service.supabase = SimpleNamespace(rpc=without_batch)
+
+    grouped = service.match_documents_batch([[0.0] * 8, [1.0] * 8], 2)
+    assert calls == ['match_documents_batch', 'match_documents', 'match_documents']
+    assert [[row['chunk_index'] for row in rows] for rows in grouped] == [[0, 1], [0, 1]]
+
+
+def test_search_endpoint_accepts_a_batch(client, monkeypatch):
+    seen = []
+    monkeypatch.setattr(DocumentService, 'search_similar_chunks_many',
+                        lambda self, queries, top_k=5: seen.append((queries, top_k)) or [[{'id': q}] for q in queries])
+
+    response = client.post('/api/chat/search', json={'queries': ['one', 'two'], 'top_k': 3})
+    assert response.status_code == 200
+    assert response.get_json() == {'results': [{'query': 'one', 'results': [{'id': 'one'}]},
+                                               {'query': 'two', 'results': [{'id': 'two'}]}]}
+    assert seen == [(['one', 'two'], 3)]
+
+    assert client.post('/api/chat/search', json={'queries': ['one', ' ']}).status_code == 400
+    too_many = ['q'] * (Config.SEARCH_BATCH_MAX_QUERIES + 1)
+    assert client.post('/api/chat/search', json={'queries': too_many}).status_code == 400
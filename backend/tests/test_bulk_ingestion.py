@@ -0,0 +1,144 @@
+import io
+import tarfile
+import zipfile
+import pytest
+import rag.bulk_ingestion
+from app.uploads import iter_archive_members
+from config import Config
+from rag.bulk_ingestion import run_bulk_pipeline
+from rag.ingestion import IngestionQueue
+from sb.database_service import DocumentService
+from sb.job_service import JobService
+
+
+class FakeChunkStore:
+    """insert_chunks / delete_document_chunks that keep rows in memory, failing one batch if asked"""
+
+    def __init__(self, fail_batch=None):
+        self.rows = []
+        self.batches = 0
+        self.fail_batch = fail_batch
+
+    def insert_chunks(self, chunks):
+        self.batches += 1
+        if self.batches == self.fail_batch:
+            raise RuntimeError('insert failed')
+        self.rows += chunks
+        return chunks
+
+    def delete_document_chunks(self, document_id):
+        self.rows = [row for row in self.rows if row['document_id'] != document_id]
+
+
+@pytest.fixture
+def text_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag.bulk_ingestion, 'embed_chunks_openai', lambda chunks: [[1.0] for _ in chunks])
+    monkeypatch.setattr(rag.bulk_ingestion, 'extract_chunks',
+                        lambda path, file_type: [chunk for chunk in open(path).read().split('|') if chunk])
+    documents = []
+    for name, chunk_count in (('a', 3), ('b', 5), ('c', 2), ('d', 0)):
+        path = tmp_path / f"{name}.txt"
+        path.write_text('|'.join(f"{name} chunk {i}" for i in range(chunk_count)))
+        documents.append({'document_id': name, 'file_path': str(path), 'file_type': 'TXT'})
+    return documents
+
+
+def test_a_document_failing_mid_batch_leaves_no_chunks(text_documents, monkeypatch):
+    monkeypatch.setattr(Config, 'INGESTION_BATCH_SIZE', 4)
+    # Batches: a0-a2 b0 | b1-b4 (fails) | c0-c1
+    store = FakeChunkStore(fail_batch=2)
+    finished = {}
+    totals = run_bulk_pipeline(store, text_documents, max_workers=1,
+                               on_finished=lambda document, count, error: finished.update({document['document_id']: error}))
+
+    assert finished['a'] is None
+    assert isinstance(finished['b'], RuntimeError)
+    assert finished['c'] is None
+    assert sorted(row['content'] for row in store.rows) == ['a chunk 0', 'a chunk 1', 'a chunk 2', 'c chunk 0', 'c chunk 1']
+    assert totals['failed'] == 1
+
+
+def test_consecutive_documents_share_batches(text_documents, monkeypatch):
+    monkeypatch.setattr(Config, 'INGESTION_BATCH_SIZE', 4)
+    store = FakeChunkStore()
+    finished = []
+    totals = run_bulk_pipeline(store, text_documents, max_workers=1,
+                               on_finished=lambda document, count, error: finished.append((document['document_id'], count, error)))
+
+    assert store.batches == totals['batches'] == 3
+    assert [(row['document_id'], row['chunk_index']) for row in store.rows] == \
+        [('a', i) for i in range(3)] + [('b', i) for i in range(5)] + [('c', i) for i in range(2)]
+    assert sorted(finished) == [('a', 3, None), ('b', 5, None), ('c', 2, None), ('d', 0, None)]
+    assert totals['chunks'] == 10
+
+
+def test_archive_members_are_streamed(tmp_path):
+    members = {'docs/a.txt': b'alpha', 'b.md': b'# beta'}
+    zip_path = tmp_path / 'docs.zip'
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        archive.writestr('docs/', b'')
+        for name, data in members.items():
+            archive.writestr(name, data)
+    tar_path = tmp_path / 'docs.tar.gz'
+    with tarfile.open(tar_path, 'w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    for path in (zip_path, tar_path):
+        assert [(name, size, member.read()) for name, size, member in iter_archive_members(str(path))] == \
+            [(name, len(data), data) for name, data in members.items()]
+
+
+def test_bulk_upload_reports_every_file(client, queued_jobs):
+    existing = client.post('/api/document/upload', data={'file': (io.BytesIO(b'already stored'), 'old.txt')},
+                           content_type='multipart/form-data').get_json()['document']
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as bundle:
+        bundle.writestr('one.txt', b'first file')
+        bundle.writestr('same-as-one.txt', b'first file')
+        bundle.writestr('tool.exe', b'MZ')
+        bundle.writestr('old-copy.txt', b'already stored')
+    archive.seek(0)
+
+    response = client.post('/api/document/bulk-upload', data={'files': [
+        (io.BytesIO(b'second file'), 'two.md'), (archive, 'bundle.zip')
+    ]}, content_type='multipart/form-data')
+    body = response.get_json()
+
+    assert response.status_code == 202
+    assert body['counts'] == {'queued': 2, 'duplicate': 2, 'rejected': 1}
+    statuses = {item['name']: item for item in body['files']}
+    assert statuses['same-as-one.txt']['document_id'] == statuses['one.txt']['document_id']
+    assert statuses['old-copy.txt']['document_id'] == existing['id']
+    assert statuses['tool.exe']['error'] == "File type not allowed"
+    batch = [job for job in queued_jobs if job.get('batch_id') == body['batch_id']]
+    assert sorted(job['document_id'] for job in batch) == sorted([statuses['two.md']['document_id'],
+                                                                   statuses['one.txt']['document_id']])
+
+
+def test_batch_worker_records_each_document(stub_db, text_documents, monkeypatch):
+    monkeypatch.setattr(Config, 'BULK_EXTRACT_WORKERS', 1)
+    service = DocumentService()
+    saved = service.create_documents([
+        {'name': f"{document['document_id']}.txt", 'original_name': f"{document['document_id']}.txt",
+         'file_path': document['file_path'], 'file_size': 1, 'file_type': 'txt', 'status': 'queued'}
+        for document in text_documents
+    ])
+    jobs = JobService().create_jobs([
+        {'document_id': document['id'], 'file_path': source['file_path'], 'file_type': 'TXT'}
+        for document, source in zip(saved, text_documents)
+    ], 'batch-1')
+
+    queue = IngestionQueue(max_workers=1)
+    try:
+        queue.enqueue_batch(jobs).result()
+    finally:
+        queue.shutdown()
+
+    stored = JobService().get_batch_jobs('batch-1')
+    assert sorted((job['status'], job['chunk_count']) for job in stored) == \
+        [('completed', 0), ('completed', 2), ('completed', 3), ('completed', 5)]
+    assert {service.get_document_by_id(document['id'])['status'] for document in saved} == {'processed'}
+    assert len(stub_db.rows('document_chunks')) == 10
@@ -0,0 +1,87 @@
+import importlib
+import json
+from types import SimpleNamespace
+import pytest
+from sb.database_service import DocumentService
+
+# app.routes re-exports the blueprint as `chat`, shadowing the module
+chat_routes = importlib.import_module('app.routes.chat')
+
+CHUNKS = [{'content': 'Resets are done from the settings page.', 'document_id': 'd1', 'document_name': 'guide.pdf',
+           'document_type': 'pdf', 'similarity': 0.91, 'source_link': '/files/guide.pdf'}]
+
+
+def parse_events(body):
+    """[(event, data)] from a text/event-stream body"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class FakeCompletions:
+    def __init__(self, parts, fail_after=None):
+        self.parts = parts
+        self.fail_after = fail_after
+        self.requests = []
+
+    def create(self, model, messages, stream=False, stream_options=None):
+        self.requests.append({'messages': messages, 'stream': stream})
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(self.parts)))])
+        return self.stream()
+
+    def stream(self):
+        for count, part in enumerate(self.parts):
+            if count == self.fail_after:
+                raise RuntimeError('connection reset')
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+        usage = {'prompt_tokens': 40, 'completion_tokens': len(self.parts), 'total_tokens': 40 + len(self.parts)}
+        yield SimpleNamespace(usage=SimpleNamespace(model_dump=lambda: usage), choices=[])
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    fake = FakeCompletions(['Open ', 'settings', ', then Reset.'])
+    monkeypatch.setattr(chat_routes, 'get_openai_client', lambda: SimpleNamespace(chat=SimpleNamespace(completions=fake)))
+    monkeypatch.setattr(DocumentService, 'search_similar_chunks', lambda self, query, top_k=5: CHUNKS)
+    return fake
+
+
+def test_stream_sends_sources_deltas_then_done(client, completions):
+    response = client.post('/api/chat/chat', json={'message': 'How do I reset?', 'stream': True})
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data(as_text=True))
+
+    assert [event for event, _ in events] == ['sources', 'delta', 'delta', 'delta', 'done']
+    assert events[0][1]['sources'][0]['document_name'] == 'guide.pdf'
+    assert [data['content'] for event, data in events if event == 'delta'] == completions.parts
+    done = events[-1][1]
+    assert done['response'] == 'Open settings, then Reset.'
+    assert done['usage']['completion_tokens'] == 3
+    assert done['time_to_first_token_ms'] is not None
+
+
+def test_accept_header_selects_the_stream(client, completions):
+    response = client.post('/api/chat/chat', json={'message': 'How do I reset?'}, headers={'Accept': 'text/event-stream'})
+    assert response.mimetype == 'text/event-stream'
+    assert parse_events(response.get_data(as_text=True))[-1][0] == 'done'
+    assert completions.requests[0]['stream'] is True
+
+
+def test_json_response_is_unchanged_without_stream(client, completions):
+    response = client.post('/api/chat/chat', json={'message': 'How do I reset?'})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['response'] == 'Open settings, then Reset.'
+    assert body['sources'][0]['source_link'] == '/files/guide.pdf'
+    assert completions.requests[0]['stream'] is False
+
+
+def test_failure_mid_stream_ends_with_an_error_event(client, completions):
+    completions.fail_after = 1
+    response = client.post('/api/chat/chat', json={'message': 'How do I reset?', 'stream': True})
+    events = parse_events(response.get_data(as_text=True))
+    assert [event for event, _ in events] == ['sources', 'delta', 'error']
+    assert 'connection reset' in events[-1][1]['error']
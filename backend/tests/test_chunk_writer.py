@@ -0,0 +1,55 @@
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+import sb.chunk_writer
+from rag.vector_codec import format_pgvector, pack_vectors
+from sb.chunk_writer import ChunkWriter, is_retryable_write_error
+
+
+def make_rows(count, document_id='doc', packed=False):
+    vectors = [[float(i), 0.5] for i in range(count)]
+    embeddings = pack_vectors(vectors) if packed else [format_pgvector(vector) for vector in vectors]
+    return [{'document_id': document_id, 'chunk_index': i, 'content': f"chunk {i} " + 'x' * (i % 50),
+             'embedding': embedding} for i, embedding in enumerate(embeddings)]
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(sb.chunk_writer.time, 'sleep', lambda seconds: None)
+
+
+def test_batches_respect_row_and_byte_limits():
+    writer = ChunkWriter(supabase=object(), max_batch_rows=3, max_batch_bytes=400)
+    rows = [{'content': 'x' * size, 'embedding': ''} for size in (100, 100, 10, 10, 10, 300, 10)]
+    # 128 bytes of overhead per row
+    assert writer.plan_batches(rows) == [(0, 1), (1, 3), (3, 5), (5, 6), (6, 7)]
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_rows_come_back_in_order(stub_db, packed):
+    writer = ChunkWriter(max_batch_rows=7, concurrency=4)
+    rows = make_rows(50, packed=packed)
+    stored = writer.write(rows, packed_width=4 if packed else None)
+    assert [(row['document_id'], row['chunk_index']) for row in stored] == [('doc', i) for i in range(50)]
+    assert len({row['id'] for row in stored}) == 50
+    assert writer.stats()['batches'] == 8
+
+
+def test_retried_batches_do_not_duplicate_rows(stub_db, monkeypatch):
+    # About a third of the writes are applied but answered with a 503, as if the response was lost
+    monkeypatch.setattr(stub_db, 'fail_rate', 0.3)
+    writer = ChunkWriter(max_batch_rows=5, concurrency=4, max_retries=10)
+    stored = writer.write(make_rows(60))
+    assert all(stored)
+    assert writer.stats()['retries'] > 0
+    assert sorted(row['chunk_index'] for row in stub_db.rows('document_chunks')) == list(range(60))
+
+
+def test_error_classification():
+    assert is_retryable_write_error(httpx.ConnectError('refused'))
+    assert is_retryable_write_error(APIError({'code': '503', 'message': 'unavailable'}))
+    assert is_retryable_write_error(APIError({'code': '40P01', 'message': 'deadlock detected'}))
+    assert is_retryable_write_error(APIError({'code': '57014', 'message': 'statement timeout'}))
+    assert not is_retryable_write_error(APIError({'code': '23505', 'message': 'duplicate key'}))
+    assert not is_retryable_write_error(APIError({'code': '413', 'message': 'too large'}))
+    assert not is_retryable_write_error(ValueError())
@@ -0,0 +1,95 @@
+import pytest
+from config import Config
+from rag.chunkers import (CHUNKERS, Chunker, CodeChunker, MarkdownChunker, RowChunker, TextChunker, chunk_text,
+                          get_chunker, iter_chunks, register_chunker)
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def prose(paragraphs, sentences=6, seed=''):
+    return "\n\n".join(
+        " ".join(f"Sentence {s} of part {p}{seed} describes item {p * sentences + s} in a few plain words."
+                 for s in range(sentences))
+        for p in range(paragraphs)
+    )
+
+
+def test_streamed_chunks_match_whole_text_chunks():
+    text = prose(20)
+    segments = [text[i:i + 37] for i in range(0, len(text), 37)]
+    assert list(iter_chunks(segments, 300, 40)) == chunk_text(text, 300, 40)
+    assert chunk_text('') == []
+
+
+def test_text_chunks_stay_in_budget_and_resync_after_an_edit():
+    chunker = TextChunker(max_tokens=40, overlap_tokens=4, count_tokens=count_words)
+    original = prose(30)
+    chunks = list(chunker.iter_chunks([original]))
+    assert all(count_words(chunk) <= 40 for chunk in chunks)
+
+    edited = list(chunker.iter_chunks([original.replace("Sentence 2 of part 1 ", "Sentence two of part one ", 1)]))
+    # Boundaries are content-defined: after the edit, the rest of the document chunks the same
+    assert chunks[-len(chunks) // 2:] == edited[-len(chunks) // 2:]
+    assert len(set(chunks) & set(edited)) >= len(chunks) - 4
+
+
+def test_markdown_chunks_repeat_their_headings():
+    sections = []
+    for section in range(4):
+        sections.append(f"# Guide\n\n## Part {section}\n\n" + prose(3, seed=f"-{section}"))
+    sections.append("## Snippet\n\n```\nrun --fast\nrun --safe\n```\n")
+    chunker = MarkdownChunker(max_tokens=60, count_tokens=count_words)
+    chunks = list(chunker.iter_chunks(["\n\n".join(sections)]))
+
+    assert all(count_words(chunk) <= 60 for chunk in chunks)
+    for chunk in chunks:
+        if "of part 0-2" in chunk and not chunk.startswith("# Guide\n## Part"):
+            pytest.fail(f"chunk without its heading context: {chunk[:60]}")
+    assert any("```\nrun --fast\nrun --safe\n```" in chunk for chunk in chunks)
+
+
+def test_rows_keep_records_whole_and_repeat_the_header():
+    lines = ["id,name,notes"] + [f'{i},item {i},"line one\nline two of {i}"' for i in range(40)]
+    chunker = RowChunker(max_tokens=30, count_tokens=count_words)
+    chunks = list(chunker.iter_chunks(["\n".join(lines)]))
+    assert len(chunks) > 1
+    assert all(chunk.startswith("id,name,notes\n") for chunk in chunks)
+    records = [line for chunk in chunks for line in chunk.split("\n")[1:]]
+    assert "\n".join(records) == "\n".join(lines[1:])
+
+
+def test_code_is_cut_between_top_level_statements():
+    functions = [f"function step{i}(input) {{\n  const value = input * {i};\n  return value + {i};\n}}\n" for i in range(12)]
+    chunker = CodeChunker(max_tokens=40, count_tokens=count_words)
+    chunks = list(chunker.iter_chunks(["\n".join(functions)]))
+    assert len(chunks) > 1
+    assert all(chunk.startswith("function step") and chunk.endswith("}") for chunk in chunks)
+
+
+def test_strategies_are_picked_per_extension(monkeypatch):
+    assert isinstance(get_chunker('MD'), MarkdownChunker)
+    assert isinstance(get_chunker('csv'), RowChunker)
+    assert isinstance(get_chunker('PDF'), TextChunker)
+    assert get_chunker('md') is get_chunker('MD')
+    monkeypatch.setitem(Config.CHUNK_STRATEGIES, 'txt', 'nope')
+    with pytest.raises(ValueError):
+        get_chunker('txt')
+
+
+def test_custom_chunkers_can_be_registered(monkeypatch):
+    with pytest.raises(TypeError):
+        Chunker()
+
+    monkeypatch.setattr('rag.chunkers.CHUNKERS', dict(CHUNKERS))
+
+    @register_chunker
+    class LineChunker(Chunker):
+        name = 'lines'
+
+        def iter_chunks(self, segments):
+            yield from "".join(segments).splitlines()
+
+    monkeypatch.setitem(Config.CHUNK_STRATEGIES, 'log', 'lines')
+    assert list(get_chunker('log').iter_chunks(["a\nb", "\nc"])) == ['a', 'b', 'c']
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import httpx
+from clients import ClientRegistry, ShardedAsyncTransport, get_client_registry, init_client_registry
+
+
+def test_clients_are_built_once_per_registry():
+    registry = ClientRegistry()
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append((registry.supabase, registry.openai))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(supabase) for supabase, _ in seen}) == 1
+    assert len({id(openai) for _, openai in seen}) == 1
+    assert len(registry._http_clients) == 2
+
+    openai = registry.openai
+    registry.close()
+    assert registry._http_clients == []
+    assert registry.openai is not openai
+    registry.close()
+
+
+def test_process_registry_is_shared():
+    assert get_client_registry() is init_client_registry() is get_client_registry()
+
+
+async def body():
+    yield b'ok'
+
+
+def test_transport_spreads_requests_and_holds_slots_until_closed():
+    async def scenario():
+        transport = ShardedAsyncTransport(httpx.Limits(max_connections=4), shard_size=2)
+        served = []
+        transport._shards = [
+            httpx.MockTransport(lambda request, shard=shard: served.append(shard) or httpx.Response(200, content=body()))
+            for shard in range(len(transport._shards))
+        ]
+        assert len(transport._shards) == 2
+
+        async with httpx.AsyncClient(transport=transport, base_url='http://api.test') as client:
+            requests = [client.build_request('GET', '/') for _ in range(4)]
+            responses = [await client.send(request, stream=True) for request in requests]
+            assert sorted(served) == [0, 0, 1, 1]
+
+            # Every slot is held by an open stream, so the next request waits
+            waiting = asyncio.ensure_future(client.get('/'))
+            await asyncio.sleep(0.05)
+            assert not waiting.done()
+            await responses[0].aclose()
+            assert (await asyncio.wait_for(waiting, 1)).text == 'ok'
+            for response in responses[1:]:
+                await response.aclose()
+            assert transport._in_flight == [0, 0]
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+import uuid
+import pytest
+import sb.document_count
+from sb.database_service import DocumentService, decode_cursor, encode_cursor
+from sb.document_count import DocumentCount, get_document_count
+
+
+def test_cursor_round_trip():
+    document = {'id': str(uuid.uuid4()), 'created_at': '2025-01-01T00:00:00.123456+00:00', 'name': 'a.pdf'}
+    cursor = encode_cursor(document)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (document['created_at'], document['id'])
+
+
+@pytest.mark.parametrize('cursor', ['', 'not a cursor', encode_cursor({'created_at': 'x', 'id': 'not-a-uuid'}),
+                                    'WzEsMiwzXQ'])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_count_is_recounted_only_when_unknown_or_stale(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sb.document_count.time, 'time', lambda: now[0])
+    path = str(tmp_path / 'count.sqlite3')
+    count = DocumentCount(path, refresh_seconds=60)
+    count.add(5)  # unknown counts stay unknown
+    assert count.get(lambda: 10) == 10
+    DocumentCount(path).add(-3)  # another worker deleted three
+    assert count.get(lambda: pytest.fail('recounted')) == 7
+    now[0] += 61
+    assert count.get(lambda: 9) == 9
+    count.invalidate()
+    assert count.get(lambda: 4) == 4
+    assert count.recounts == 3
+
+
+@pytest.fixture
+def documents(stub_db):
+    get_document_count().invalidate()
+    service = DocumentService()
+    created = service.create_documents([
+        {'name': f"doc-{i}.txt", 'original_name': f"doc-{i}.txt", 'file_path': f"uploads/doc-{i}.txt",
+         'file_size': i, 'file_type': 'txt', 'status': 'processed'}
+        for i in range(7)
+    ])
+    return sorted(created, key=lambda doc: (doc['created_at'], doc['id']), reverse=True)
+
+
+def test_keyset_pages_walk_the_offset_order(documents, monkeypatch):
+    service = DocumentService()
+    counts = []
+    count_documents = service.count_documents
+    monkeypatch.setattr(service, 'count_documents', lambda: counts.append(1) or count_documents())
+
+    pages, cursor = [], None
+    for page in range(1, 4):
+        result = service.get_documents_paginated(page, 3, cursor)
+        assert result['documents'] == service.get_documents_paginated(page, 3)['documents']
+        assert (result['total'], result['total_pages']) == (7, 3)
+        pages.append([doc['id'] for doc in result['documents']])
+        cursor = result['next_cursor']
+    assert cursor is None
+    assert pages == [[doc['id'] for doc in documents[start:start + 3]] for start in (0, 3, 6)]
+    assert set(result['documents'][0]) == {'id', 'name', 'file_size', 'file_type', 'file_path', 'status', 'created_at'}
+    assert len(counts) == 1  # one exact count, then the cached one
+
+
+def test_creates_and_deletes_adjust_the_cached_count(documents, monkeypatch):
+    service = DocumentService()
+    assert service.get_documents_paginated(1, 5)['total'] == 7
+    monkeypatch.setattr(service, 'count_documents', lambda: pytest.fail('recounted'))
+    service.delete_multiple_documents([documents[0]['id'], documents[1]['id']])
+    service.create_document({'name': 'new.txt', 'original_name': 'new.txt', 'file_path': 'uploads/new.txt',
+                             'file_size': 1, 'file_type': 'txt', 'status': 'processed'})
+    assert service.get_documents_paginated(1, 5)['total'] == 6
+
+
+def test_list_route_pages_by_cursor(client, documents):
+    first = client.get('/api/document/list?per_page=4').get_json()
+    assert [doc['id'] for doc in first['documents']] == [doc['id'] for doc in documents[:4]]
+    second = client.get(f"/api/document/list?per_page=4&page=2&cursor={first['next_cursor']}").get_json()
+    assert [doc['id'] for doc in second['documents']] == [doc['id'] for doc in documents[4:]]
+    assert second['next_cursor'] is None
+    assert client.get('/api/document/list?cursor=bogus').status_code == 400
@@ -0,0 +1,143 @@
+import io
+import os
+import zipfile
+import pytest
+from config import Config
+from sb.database_service import DocumentService
+
+TEXT = b"Quarterly report: revenue grew 12 percent.\n"
+
+
+def upload(client, data, name='report.txt'):
+    return client.post('/api/document/upload', data={'file': (io.BytesIO(data), name)},
+                       content_type='multipart/form-data')
+
+
+def test_same_bytes_reuse_the_first_document(client, queued_jobs):
+    first = upload(client, TEXT)
+    assert first.status_code == 202
+    document = first.get_json()['document']
+    assert os.path.exists(queued_jobs[0]['file_path'])
+
+    second = upload(client, TEXT, name='copy-of-report.txt')
+    body = second.get_json()
+    assert second.status_code == 200
+    assert body['duplicate'] is True
+    assert body['document']['id'] == document['id']
+    assert body['job_id'] == first.get_json()['job_id']
+    assert len(queued_jobs) == 1
+    # Only the first copy is kept on disk
+    assert len(os.listdir(os.path.dirname(queued_jobs[0]['file_path']))) == 1
+
+
+def test_failed_documents_are_not_reused(client, queued_jobs):
+    document = upload(client, TEXT).get_json()['document']
+    DocumentService().update_document_status(document['id'], 'failed')
+    again = upload(client, TEXT)
+    assert again.status_code == 202
+    assert again.get_json()['document']['id'] != document['id']
+    assert len(queued_jobs) == 2
+
+
+def test_different_bytes_are_new_documents(client, queued_jobs):
+    first = upload(client, TEXT).get_json()['document']
+    other = upload(client, TEXT + b"Costs fell.\n")
+    assert other.status_code == 202
+    assert other.get_json()['document']['content_hash'] != first['content_hash']
+    assert len(queued_jobs) == 2
+
+
+def stored_files(folder):
+    return os.listdir(folder) if os.path.isdir(folder) else []
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def small_limits(monkeypatch):
+    monkeypatch.setattr(Config, 'MAX_FILE_SIZE', 1024)
+    monkeypatch.setattr(Config, 'BULK_UPLOAD_MAX_BYTES', 64 * 1024)
+
+
+def test_oversized_upload_is_rejected_and_removed(client, queued_jobs, small_limits):
+    response = upload(client, b"x" * 2048)
+    assert response.status_code == 400
+    assert 'too large' in response.get_json()['error']
+    assert stored_files(Config.UPLOAD_FOLDER) == []
+    assert queued_jobs == []
+
+
+def test_archive_limit_applies_only_on_the_bulk_route(client, queued_jobs, small_limits):
+    archive = make_zip({f"notes-{i}.txt": f"note {i} ".encode() * 80 for i in range(4)})
+    assert len(archive) > Config.MAX_FILE_SIZE
+
+    single = client.post('/api/document/upload', data={'file': (io.BytesIO(archive), 'notes.zip')},
+                         content_type='multipart/form-data')
+    assert single.status_code == 400
+    assert 'too large' in single.get_json()['error']
+
+    bulk = client.post('/api/document/bulk-upload', data={'files': [(io.BytesIO(archive), 'notes.zip')]},
+                       content_type='multipart/form-data')
+    assert bulk.status_code == 202
+    assert bulk.get_json()['counts'] == {'queued': 4, 'duplicate': 0, 'rejected': 0}
+
+
+def test_content_must_match_the_extension(client, queued_jobs):
+    response = upload(client, TEXT, name='report.pdf')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "File content does not match its extension"
+    assert upload(client, b"%PDF-1.7\n" + TEXT, name='report.txt').status_code == 400
+    assert stored_files(Config.UPLOAD_FOLDER) == []
+
+
+def replace(client, document_id, data, name='report.txt'):
+    return client.put(f'/api/document/replace/{document_id}', data={'file': (io.BytesIO(data), name)},
+                      content_type='multipart/form-data')
+
+
+@pytest.fixture
+def processed_document(client, queued_jobs):
+    document = upload(client, TEXT).get_json()['document']
+    DocumentService().update_document_status(document['id'], 'processed')
+    return document
+
+
+@pytest.mark.parametrize('fails', [False, True])
+def test_replace_swaps_the_file_only_when_the_job_succeeds(app, client, queued_jobs, processed_document,
+                                                           monkeypatch, fails):
+    def pipeline(db, document_id, path, file_type):
+        if fails:
+            raise RuntimeError('embedding failed')
+        return {'chunk_count': 2}
+    monkeypatch.setattr('rag.ingestion.run_replace_pipeline', pipeline)
+    old_path = queued_jobs[0]['file_path']
+
+    response = replace(client, processed_document['id'], TEXT + b"Costs fell.\n")
+    assert response.status_code == 202
+    queued = DocumentService().get_document_by_id(processed_document['id'])
+    assert (queued['status'], queued['content_hash']) == ('queued', processed_document['content_hash'])
+
+    job = queued_jobs[-1]
+    app.extensions['ingestion_queue']._run_job(job)
+    stored = DocumentService().get_document_by_id(processed_document['id'])
+    assert stored['status'] == 'processed'
+    if fails:
+        assert stored['content_hash'] == processed_document['content_hash']
+        assert os.path.exists(old_path) and not os.path.exists(job['file_path'])
+    else:
+        assert stored['content_hash'] == job['replacement']['document']['content_hash']
+        assert stored['file_path'] == job['replacement']['document']['file_path']
+        assert os.path.exists(job['file_path']) and not os.path.exists(old_path)
+
+
+def test_a_failed_document_is_replaced_even_by_the_same_bytes(client, queued_jobs, processed_document):
+    assert replace(client, processed_document['id'], TEXT).get_json()['message'] == 'File unchanged'
+    DocumentService().update_document_status(processed_document['id'], 'failed')
+    assert replace(client, processed_document['id'], TEXT).status_code == 202
+    assert queued_jobs[-1]['kind'] == 'replace'
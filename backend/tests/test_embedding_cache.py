@@ -0,0 +1,77 @@
+import itertools
+import sqlite3
+from types import SimpleNamespace
+import pytest
+import rag.embedding_cache
+import rag.processing
+from rag.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A time.time that advances one second per call, so last_used orders entries"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(rag.embedding_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def stored_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_hits_share_normalized_text(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'cache.sqlite3'))
+    cache.put_many('small', ['hello   world\n'], [[0.5, -1.25]])
+    assert cache.get_many('small', ['x', ' hello world', 'hello\tworld']) == {1: [0.5, -1.25], 2: [0.5, -1.25]}
+    assert cache.get_many('large', ['hello world']) == {}
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 2
+
+
+def test_row_count_follows_inserts_updates_and_evictions(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = EmbeddingCache(path, max_entries=10)
+    cache.put_many('small', [f"text {i}" for i in range(8)], [[float(i)] for i in range(8)])
+    cache.put_many('small', ['text 0', 'text 1'], [[9.0], [9.0]])  # updates, not new rows
+    assert cache.stats()['entries'] == stored_rows(path) == 8
+
+    cache.get_many('small', ['text 0'])
+    cache.put_many('small', [f"more {i}" for i in range(4)], [[1.0]] * 4)
+    # 12 rows > 10: trimmed to 9, dropping the least recently used
+    assert cache.stats()['entries'] == stored_rows(path) == 9
+    assert cache.get_many('small', ['text 0', 'text 1', 'text 2', 'text 3']) == {0: [9.0], 1: [9.0]}
+
+
+def test_existing_file_is_counted_on_open(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    EmbeddingCache(path).put_many('small', ['a', 'b', 'c'], [[1.0]] * 3)
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE meta")
+    conn.execute("DROP TRIGGER embeddings_count_insert")
+    conn.execute("DROP TRIGGER embeddings_count_delete")
+    conn.commit()
+    conn.close()
+
+    cache = EmbeddingCache(path)
+    assert cache.stats()['entries'] == 3
+    cache.put_many('small', ['d'], [[1.0]])
+    assert cache.stats()['entries'] == 4
+
+
+def test_only_uncached_distinct_chunks_are_embedded(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / 'cache.sqlite3'))
+    cache.put_many('small', ['cached'], [[9.0]])
+    embedded = []
+    engine = SimpleNamespace(model='small',
+                             embed=lambda texts: embedded.extend(texts) or [[float(len(text))] for text in texts])
+    monkeypatch.setattr(rag.processing, 'get_embedding_engine', lambda: engine)
+    monkeypatch.setattr(rag.processing, 'get_embedding_cache', lambda: cache)
+
+    vectors = rag.processing.embed_chunks_openai(['new one', 'cached', 'new  one', 'other'])
+
+    assert vectors == [[7.0], [9.0], [7.0], [5.0]]
+    assert embedded == ['new one', 'other']
+    assert cache.get_many('small', ['other']) == {0: [5.0]}
@@ -0,0 +1,83 @@
+import threading
+from types import SimpleNamespace
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError
+import rag.embeddings
+from rag.embeddings import EmbeddingEngine, is_retryable_error, retry_after_seconds
+
+
+class FakeEmbeddings:
+    """embeddings.create that returns [len(text)] per input, in reverse order, failing the first `failures` calls"""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def create(self, model, input):
+        with self.lock:
+            self.batches.append(list(input))
+            if self.failures:
+                raise self.failures.pop(0)
+        data = [SimpleNamespace(index=idx, embedding=[float(len(text))]) for idx, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])
+
+
+def status_error(status, headers=None):
+    request = httpx.Request('POST', 'http://openai.test/v1/embeddings')
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return APIStatusError('error', response=response, body=None)
+
+
+def make_engine(embeddings, **options):
+    options = {'max_batch_items': 3, 'max_batch_tokens': 1000, 'concurrency': 2, 'max_retries': 2, **options}
+    return EmbeddingEngine(client=SimpleNamespace(embeddings=embeddings), model='test-model', **options)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(rag.embeddings.time, 'sleep', delays.append)
+    return delays
+
+
+def test_batches_respect_item_and_token_limits():
+    engine = make_engine(FakeEmbeddings(), max_batch_items=3, max_batch_tokens=10)
+    engine.count_tokens = len
+    texts = ['aaaa', 'bbbb', 'ccc', 'd', 'e', 'f', 'g' * 13, 'h']
+    # An oversized text still goes out, alone
+    assert engine.plan_batches(texts) == [(0, 2), (2, 5), (5, 6), (6, 7), (7, 8)]
+
+
+def test_output_follows_input_order():
+    embeddings = FakeEmbeddings()
+    texts = [f"text {'x' * i}" for i in range(10)]
+    assert make_engine(embeddings).embed(texts) == [[float(len(text))] for text in texts]
+    assert sorted(map(len, embeddings.batches)) == [1, 3, 3, 3]
+
+
+def test_retryable_errors_are_retried(no_sleep):
+    embeddings = FakeEmbeddings([status_error(429, {'retry-after': '2'}),
+                                 APIConnectionError(request=httpx.Request('POST', 'http://openai.test'))])
+    assert make_engine(embeddings).embed(['a', 'bb']) == [[1.0], [2.0]]
+    assert len(embeddings.batches) == 3
+    assert no_sleep[0] == 2.0
+
+
+def test_client_errors_and_exhausted_retries_raise():
+    with pytest.raises(APIStatusError):
+        make_engine(FakeEmbeddings([status_error(400)])).embed(['a'])
+    embeddings = FakeEmbeddings([status_error(503)] * 3)
+    with pytest.raises(APIStatusError):
+        make_engine(embeddings, max_retries=2).embed(['a'])
+    assert len(embeddings.batches) == 3
+
+
+def test_error_classification():
+    assert is_retryable_error(status_error(429))
+    assert is_retryable_error(status_error(502))
+    assert not is_retryable_error(status_error(401))
+    assert not is_retryable_error(ValueError())
+    assert retry_after_seconds(status_error(429, {'retry-after': '1.5'})) == 1.5
+    assert retry_after_seconds(status_error(429)) is None
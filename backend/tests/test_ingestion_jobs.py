@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+import pytest
+import rag.ingestion
+from rag.ingestion import IngestionQueue
+from sb.database_service import DocumentService
+from sb.job_service import JobService
+
+
+@pytest.fixture
+def document(stub_db):
+    return DocumentService().create_document({
+        'name': 'notes.txt', 'original_name': 'notes.txt', 'file_path': 'uploads/notes.txt',
+        'file_size': 10, 'file_type': 'txt', 'status': 'queued'
+    })
+
+
+def test_a_job_is_claimed_once(document):
+    jobs = JobService()
+    job = jobs.create_job(document['id'], document['file_path'], 'TXT')
+    claimed = jobs.claim_job(job['id'])
+    assert claimed['status'] == 'processing'
+    assert claimed['attempts'] == 1
+    assert jobs.claim_job(job['id']) is None
+
+
+def test_claim_jobs_returns_only_unclaimed(document):
+    jobs = JobService()
+    created = jobs.create_jobs([{'document_id': document['id'], 'file_path': 'a', 'file_type': 'TXT'}] * 3, 'batch-1')
+    jobs.claim_job(created[0]['id'])
+    claimed = jobs.claim_jobs([job['id'] for job in created])
+    assert sorted(job['id'] for job in claimed) == sorted(job['id'] for job in created[1:])
+
+
+def test_queued_jobs_are_oldest_first(document):
+    jobs = JobService()
+    first = jobs.create_job(document['id'], 'a', 'TXT')
+    second = jobs.create_job(document['id'], 'b', 'TXT')
+    jobs.claim_job(first['id'])
+    assert [job['id'] for job in jobs.get_queued_jobs()] == [second['id']]
+
+
+def run_job(job):
+    queue = IngestionQueue(max_workers=1)
+    try:
+        queue.enqueue(job).result()
+    finally:
+        queue.shutdown()
+
+
+def test_worker_completes_job_before_marking_document_processed(document, monkeypatch):
+    events = []
+    monkeypatch.setattr(rag.ingestion, 'run_rag_pipeline', lambda db, document_id, path, file_type: 4)
+    finish_job = JobService.finish_job
+    update_status = DocumentService.update_document_status
+    monkeypatch.setattr(JobService, 'finish_job',
+                        lambda self, *args, **kwargs: events.append('job') or finish_job(self, *args, **kwargs))
+    monkeypatch.setattr(DocumentService, 'update_document_status',
+                        lambda self, document_id, status: events.append(status) or update_status(self, document_id, status))
+
+    job = JobService().create_job(document['id'], document['file_path'], 'TXT')
+    run_job(job)
+
+    stored = JobService().get_job(job['id'])
+    assert stored['status'] == 'completed'
+    assert stored['chunk_count'] == 4
+    assert DocumentService().get_document_by_id(document['id'])['status'] == 'processed'
+    assert events == ['processing', 'job', 'processed']
+
+
+def test_failed_job_drops_partial_chunks(document, stub_db, monkeypatch):
+    def failing_pipeline(db, document_id, path, file_type):
+        stub_db.rows('document_chunks').append({'id': 'c1', 'document_id': document_id, 'chunk_index': 0})
+        raise RuntimeError('embedding failed')
+    monkeypatch.setattr(rag.ingestion, 'run_rag_pipeline', failing_pipeline)
+
+    job = JobService().create_job(document['id'], document['file_path'], 'TXT')
+    run_job(job)
+
+    stored = JobService().get_job(job['id'])
+    assert stored['status'] == 'failed'
+    assert 'embedding failed' in stored['error']
+    assert DocumentService().get_document_by_id(document['id'])['status'] == 'failed'
+    assert stub_db.rows('document_chunks') == []
+
+
+def test_a_job_claimed_elsewhere_is_skipped(document, monkeypatch):
+    calls = []
+    monkeypatch.setattr(rag.ingestion, 'run_rag_pipeline', lambda *args: calls.append(args) or 1)
+    job = JobService().create_job(document['id'], document['file_path'], 'TXT')
+    JobService().claim_job(job['id'])
+    run_job(job)
+    assert calls == []
+
+
+def test_restart_resumes_every_queued_job(document, monkeypatch):
+    jobs = JobService()
+    created = jobs.create_jobs([{'document_id': document['id'], 'file_path': 'a', 'file_type': 'TXT'}] * 7, 'batch-1')
+    jobs.claim_job(created[3]['id'])
+    assert len(jobs.get_queued_jobs(page_size=2)) == 6
+
+    resumed = []
+    queue = IngestionQueue(max_workers=1)
+    monkeypatch.setattr(queue, 'enqueue', resumed.append)
+    try:
+        assert queue.resume_queued_jobs() == 6
+    finally:
+        queue.shutdown()
+    assert sorted(job['id'] for job in resumed) == sorted(job['id'] for i, job in enumerate(created) if i != 3)
+
+
+def test_restart_requeues_jobs_stuck_in_processing(document, stub_db, monkeypatch):
+    jobs = JobService()
+    stuck = jobs.create_job(document['id'], document['file_path'], 'TXT')
+    running = jobs.create_job(document['id'], document['file_path'], 'TXT')
+    jobs.claim_job(stuck['id'])
+    jobs.claim_job(running['id'])
+    with stub_db.lock:
+        row = next(row for row in stub_db.rows('ingestion_jobs') if row['id'] == stuck['id'])
+        row['updated_at'] = (datetime.now() - timedelta(hours=2)).isoformat()
+        stub_db.rows('document_chunks').append({'id': 'c1', 'document_id': document['id'], 'chunk_index': 0})
+    monkeypatch.setattr(rag.ingestion, 'run_rag_pipeline', lambda db, document_id, path, file_type: 2)
+
+    queue = IngestionQueue(max_workers=1)
+    try:
+        assert queue.resume_queued_jobs() == 1
+    finally:
+        queue.shutdown()
+    assert JobService().get_job(stuck['id'])['status'] == 'completed'
+    assert JobService().get_job(stuck['id'])['attempts'] == 2
+    assert JobService().get_job(running['id'])['status'] == 'processing'
+    assert stub_db.rows('document_chunks') == []
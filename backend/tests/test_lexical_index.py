@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+import sb.database_service
+from rag.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from sb.client import get_supabase_client
+
+
+def test_compound_identifiers_are_kept_and_split():
+    tokens = tokenize("Got ERR-1042 from public.document_chunks")
+    assert tokens == ['got', 'err-1042', 'err', '1042', 'from', 'public.document_chunks', 'public', 'document_chunks',
+                      'document', 'chunks']
+
+
+def test_rrf_orders_by_fused_rank():
+    vector = [{'id': 'a', 'similarity': 0.9}, {'id': 'b', 'similarity': 0.8}, {'id': 'c', 'similarity': 0.7}]
+    lexical = [{'id': 'c', 'lexical_score': 7.5}, {'id': 'd', 'lexical_score': 3.0}]
+    fused = reciprocal_rank_fusion(vector, lexical, top_k=3, k=60)
+    assert [row['id'] for row in fused] == ['c', 'a', 'b']
+    assert fused[0]['similarity'] == 0.7
+    assert fused[0]['lexical_score'] == 7.5
+    assert fused[0]['rrf_score'] == pytest.approx(1 / 63 + 1 / 61)
+    assert reciprocal_rank_fusion([], lexical, top_k=5)[0]['id'] == 'c'
+
+
+def random_chunks(count, seed=0):
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(400)]
+    # Zipf-like word use, so some terms are common and others rare
+    weights = 1 / np.arange(1, len(words) + 1)
+    weights /= weights.sum()
+    chunks = []
+    for i in range(count):
+        text = " ".join(rng.choice(words, size=rng.integers(5, 40), p=weights))
+        if i % 50 == 0:
+            text += f" ERR-{i}"
+        chunks.append({'id': str(i), 'document_id': f"doc-{i % 10}", 'chunk_index': i, 'content': text})
+    return chunks
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    chunks = random_chunks(3000)
+    index.add(chunks[:2500], merge=False)
+    index.merge()
+    index.add(chunks[2500:], merge=False)  # the rest stays in the delta
+    index.remove_chunk_ids([str(i) for i in range(0, 3000, 7)])
+    return index
+
+
+def test_identifiers_match_exactly(index):
+    found = index.search("what does ERR-100 mean", top_k=3)
+    assert found[0]['id'] == '100'
+    assert found[0]['lexical_score'] > 0
+    assert index.search("ERR-2950", top_k=1)[0]['id'] == '2950'  # from the delta
+    assert '700' not in [row['id'] for row in index.search("ERR-700", top_k=3)]  # deleted
+
+
+def dense_top_rows(self, view, terms, top_k):
+    """Reference scoring: every posting of every term into one accumulator"""
+    totals = np.zeros(len(view.lengths))
+    for term in terms:
+        for rows, impacts in term.sources:
+            totals[rows] += term.idf * np.asarray(impacts, dtype=np.float32)
+    totals[view.deleted] = 0
+    rows = np.argsort(-totals, kind='stable')[:top_k]
+    rows = rows[totals[rows] > 0]
+    return rows, totals[rows]
+
+
+def test_pruned_scoring_matches_exhaustive_scoring(index, monkeypatch):
+    rng = np.random.default_rng(3)
+    queries = [" ".join(f"w{word}" for word in rng.integers(0, 400, rng.integers(1, 6))) for _ in range(60)]
+    queries += ["w0 w1 ERR-150", "w399 w398 w5"]
+    pruned = [[row['lexical_score'] for row in index.search(query, top_k=10)] for query in queries]
+    monkeypatch.setattr(LexicalIndex, '_top_rows', dense_top_rows)
+    exhaustive = [[row['lexical_score'] for row in index.search(query, top_k=10)] for query in queries]
+    # Same scores up to float32 summation order
+    for found, expected in zip(pruned, exhaustive):
+        assert found == pytest.approx(expected, rel=1e-4)
+
+
+def test_removed_documents_are_not_found(index):
+    index.remove_chunks(['doc-0'])
+    assert all(row['document_id'] != 'doc-0' for row in index.search("w0 w1 w2", top_k=50))
+    assert index.search("", top_k=5) == []
+
+
+def test_searches_during_a_rebuild_fall_back_to_supabase(index, stub_db, monkeypatch):
+    index._mark_built()
+    monkeypatch.setattr(sb.database_service, 'get_lexical_index', lambda: index)
+    assert sb.database_service.match_lexical_local('ERR-100', 3)[0]['id'] == '100'
+
+    with stub_db.lock:
+        stub_db.rows('document_chunks').extend(random_chunks(200))
+    during = []
+    put_documents = index._put_documents_from_supabase
+
+    def put_documents_midway(supabase):
+        during.append(sb.database_service.match_lexical_local('ERR-100', 3))
+        put_documents(supabase)
+    monkeypatch.setattr(index, '_put_documents_from_supabase', put_documents_midway)
+    index.build_from_supabase(get_supabase_client())
+    assert during == [None]
+    assert index.search('ERR-100', 1)[0]['id'] == '100'
@@ -0,0 +1,26 @@
+import re
+import pytest
+import rag.ocr
+from rag.processing import ocr_pdf_from_bytes_pymupdf
+
+
+def ocr_pages_found(text):
+    return [(int(page), int(width)) for page, width in re.findall(r"--- OCR Page (\d+) ---\nwidth (\d+)", text)]
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_pages_come_back_in_order(make_pdf, fake_tesseract, workers):
+    widths = [100, 300, 200, 400, 150, 250, 350]
+    text = ocr_pdf_from_bytes_pymupdf(make_pdf(widths), dpi=72, max_workers=workers)
+    assert ocr_pages_found(text) == [(number + 1, width) for number, width in enumerate(widths)]
+
+
+def test_dpi_scales_the_rendered_page(make_pdf, fake_tesseract):
+    text = ocr_pdf_from_bytes_pymupdf(make_pdf([100]), dpi=144, max_workers=1)
+    assert ocr_pages_found(text) == [(1, 200)]
+
+
+def test_worker_count_defaults_to_config(monkeypatch):
+    monkeypatch.setattr(rag.ocr.Config, 'OCR_WORKERS', 5)
+    assert rag.ocr.resolve_ocr_workers() == 5
+    assert rag.ocr.resolve_ocr_workers(2) == 2
@@ -0,0 +1,40 @@
+import fitz
+import rag.processing
+from rag.processing import classify_pdf_page, extract_pdf_text_from_bytes, iter_pdf_pages
+
+TEXT = "This page has a usable text layer of more than twenty characters."
+
+
+def page_kinds(pdf_bytes):
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return [classify_pdf_page(page, page.get_text()) for page in doc]
+    finally:
+        doc.close()
+
+
+def test_pages_are_classified_individually(make_pdf):
+    assert page_kinds(make_pdf([TEXT, 120, None, "short"])) == ['text', 'ocr', 'empty', 'empty']
+
+
+def test_only_image_pages_are_ocrd(make_pdf, fake_tesseract, monkeypatch):
+    submitted = []
+    submit = rag.processing.submit_page_ocr
+    monkeypatch.setattr(rag.processing, 'submit_page_ocr', lambda page: submitted.append(page.number) or submit(page))
+
+    text = extract_pdf_text_from_bytes(make_pdf([TEXT, 120, None, TEXT.upper(), 240]))
+
+    assert submitted == [1, 4]
+    # Text and OCR output keep page order
+    positions = [text.index(part) for part in (TEXT, "--- OCR Page 2 ---", TEXT.upper(), "--- OCR Page 5 ---")]
+    assert positions == sorted(positions)
+
+
+def test_page_stats_record_each_kind(make_pdf, fake_tesseract):
+    doc = fitz.open(stream=make_pdf([TEXT, 120, None]), filetype="pdf")
+    page_stats = []
+    try:
+        list(iter_pdf_pages(doc, page_stats=page_stats))
+    finally:
+        doc.close()
+    assert [(stat['page'], stat['kind']) for stat in page_stats] == [(1, 'text'), (2, 'ocr'), (3, 'empty')]
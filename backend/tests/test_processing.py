@@ -0,0 +1,137 @@
+import pytest
+import rag.processing
+from config import Config
+from rag.processing import (extract_text, iter_batches, iter_decoded, iter_document_chunks, run_rag_pipeline,
+                            run_replace_pipeline)
+
+
+class FakeChunkStore:
+    """Records chunk rows the way DocumentService.insert_document_chunks receives them"""
+
+    def __init__(self):
+        self.batches = []
+
+    def insert_document_chunks(self, document_id, chunk_rows):
+        self.batches.append(chunk_rows)
+        return [dict(row, id=f"{document_id}-{row['chunk_index']}") for row in chunk_rows]
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Embeds each chunk as [its length], without the API or the embedding cache"""
+    calls = []
+    monkeypatch.setattr(rag.processing, 'embed_chunks_openai',
+                        lambda chunks: calls.append(list(chunks)) or [[float(len(chunk))] for chunk in chunks])
+    return calls
+
+
+@pytest.fixture
+def long_text(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text("\n\n".join(f"Paragraph {i} talks about topic {i % 7} in some detail." * 4 for i in range(60)))
+    return str(path)
+
+
+def test_iter_batches():
+    assert list(iter_batches(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_batches([], 3)) == []
+
+
+def test_decoding_in_blocks_matches_whole_file():
+    data = "naïve café — ünïcode\r\nline two\rline three\n".encode('utf-8') * 50
+    # A small block size splits multi-byte characters and CRLF pairs across blocks
+    assert "".join(iter_decoded(data, block_bytes=7)) == data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def test_pipeline_streams_batches(long_text, fake_embeddings, monkeypatch):
+    monkeypatch.setattr(Config, 'INGESTION_BATCH_SIZE', 4)
+    expected = list(iter_document_chunks(long_text, 'TXT'))
+    store = FakeChunkStore()
+
+    assert run_rag_pipeline(store, 'doc', long_text, 'TXT') == len(expected)
+
+    assert len(expected) > 8
+    assert all(len(batch) <= 4 for batch in store.batches)
+    rows = [row for batch in store.batches for row in batch]
+    assert [row['chunk_index'] for row in rows] == list(range(len(expected)))
+    assert [row['content'] for row in rows] == expected
+    assert [row['embedding'] for row in rows] == [[float(len(chunk))] for chunk in expected]
+    assert fake_embeddings == [[row['content'] for row in batch] for batch in store.batches]
+
+
+def test_extract_text_joins_the_stream(long_text):
+    with open(long_text) as f:
+        assert extract_text(long_text, 'TXT') == f.read()
+    assert extract_text(long_text + '.missing', 'TXT') == ''
+
+
+def write_version(tmp_path, name, paragraphs):
+    path = tmp_path / name
+    path.write_text("\n\n".join(paragraphs))
+    return str(path)
+
+
+def stored_chunks(stub_db, document_id):
+    return sorted((row for row in stub_db.rows('document_chunks') if row['document_id'] == document_id),
+                  key=lambda row: row['chunk_index'])
+
+
+@pytest.fixture
+def document(stub_db):
+    from sb.database_service import DocumentService
+    service = DocumentService()
+    document = service.create_document({'name': 'guide.txt', 'original_name': 'guide.txt', 'file_path': 'uploads/guide.txt',
+                                        'file_size': 1, 'file_type': 'txt', 'status': 'processed'})
+    return service, document['id']
+
+
+PARAGRAPHS = [f"Section {i} explains step {i} of the setup, including the options for topic {i}. " * 5 for i in range(12)]
+
+
+def test_replace_embeds_only_new_chunks_and_renumbers(tmp_path, stub_db, document, fake_embeddings):
+    service, document_id = document
+    run_rag_pipeline(service, document_id, write_version(tmp_path, 'v1.txt', PARAGRAPHS), 'TXT')
+    original = stored_chunks(stub_db, document_id)
+    before = {row['content']: row['id'] for row in original}
+    fake_embeddings.clear()
+
+    # New text at the start, one section edited, one removed
+    changed = ["A new introduction paragraph for the second version. " * 5] + PARAGRAPHS[:4] \
+        + [PARAGRAPHS[4].replace('setup', 'install')] + PARAGRAPHS[5:8] + PARAGRAPHS[9:]
+    v2 = write_version(tmp_path, 'v2.txt', changed)
+    counts = run_replace_pipeline(service, document_id, v2, 'TXT')
+
+    after = stored_chunks(stub_db, document_id)
+    chunks = list(iter_document_chunks(v2, 'TXT'))
+    expected = [service._clean_text_content(text) for text in chunks]  # as stored
+    assert [row['content'] for row in after] == expected
+    assert [row['chunk_index'] for row in after] == list(range(len(expected)))
+    new = [text for text in chunks if service._clean_text_content(text) not in before]
+    assert [text for batch in fake_embeddings for text in batch] == new
+    assert counts['added'] == len(new)
+    assert counts['kept'] == len(expected) - len(new)
+    assert counts['removed'] == len(original) - counts['kept']
+    # Unchanged chunks keep their rows
+    assert len({row['id'] for row in after} & {row['id'] for row in original}) == counts['kept']
+
+
+def test_failed_replace_keeps_the_previous_version(tmp_path, stub_db, document, monkeypatch):
+    service, document_id = document
+    monkeypatch.setattr(rag.processing, 'embed_chunks_openai', lambda chunks: [[1.0] for _ in chunks])
+    run_rag_pipeline(service, document_id, write_version(tmp_path, 'v1.txt', PARAGRAPHS), 'TXT')
+    before = [(row['id'], row['chunk_index'], row['content']) for row in stored_chunks(stub_db, document_id)]
+
+    batches = []
+
+    def failing_embed(chunks):
+        batches.append(chunks)
+        if len(batches) == 2:
+            raise RuntimeError('rate limited')
+        return [[2.0] for _ in chunks]
+    monkeypatch.setattr(rag.processing, 'embed_chunks_openai', failing_embed)
+    monkeypatch.setattr(Config, 'INGESTION_BATCH_SIZE', 1)
+
+    rewritten = [text.replace('options', 'choices') for text in PARAGRAPHS]
+    with pytest.raises(RuntimeError):
+        run_replace_pipeline(service, document_id, write_version(tmp_path, 'v2.txt', rewritten), 'TXT')
+    assert [(row['id'], row['chunk_index'], row['content']) for row in stored_chunks(stub_db, document_id)] == before
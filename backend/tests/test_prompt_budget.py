@@ -0,0 +1,100 @@
+import pytest
+from rag.prompt_budget import MESSAGE_OVERHEAD_TOKENS, PromptBudget, merge_overlap, summarize_turn
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def make_budget(**limits):
+    limits = {'max_tokens': 400, 'context_tokens': 200, 'history_tokens': 100, 'summary_tokens': 30, **limits}
+    return PromptBudget(count_tokens=count_words, **limits)
+
+
+def chunk(document_id, chunk_index, content):
+    return {'document_id': document_id, 'chunk_index': chunk_index, 'content': content}
+
+
+def test_merge_overlap_drops_the_shared_text():
+    left = "The quick brown fox jumps over the lazy dog near the river bank."
+    right = "over the lazy dog near the river bank. Then it rests in the shade."
+    assert merge_overlap(left, right) == left + " Then it rests in the shade."
+    assert merge_overlap("First part.", "Unrelated second part.") == "First part.\nUnrelated second part."
+
+
+def test_consecutive_chunks_merge_in_rank_order():
+    chunks = [
+        chunk('b', 7, "Beta seven."),
+        chunk('a', 2, "Alpha two, shared tail text here."),
+        chunk('a', 1, "Alpha one."),
+        chunk('a', 2, "Alpha two,  shared tail text here."),  # same text again
+        chunk('a', 5, "Alpha five."),
+    ]
+    passages, duplicates = make_budget().passages(chunks)
+    assert [text for text, _ in passages] == ["Beta seven.", "Alpha one.\nAlpha two, shared tail text here.", "Alpha five."]
+    assert [len(members) for _, members in passages] == [1, 2, 1]
+    assert duplicates == 1
+
+
+def test_documents_read_mid_replace_are_not_merged():
+    # Two chunks claim position 1: the document was renumbered between reads
+    chunks = [chunk('a', 1, "Old one."), chunk('a', 2, "New two."), chunk('a', 1, "New one.")]
+    passages, _ = make_budget().passages(chunks)
+    assert [text for text, _ in passages] == ["Old one.", "New two.", "New one."]
+
+
+def test_the_same_text_under_two_documents_is_sent_once():
+    chunks = [chunk('a', 0, "Shared paragraph about refunds."), chunk('copy', 3, "Shared paragraph about refunds.")]
+    passages, duplicates = make_budget().passages(chunks)
+    assert len(passages) == 1
+    assert duplicates == 1
+
+
+def test_context_keeps_the_best_passages_that_fit():
+    chunks = [chunk('a', 0, "word " * 50), chunk('b', 0, "term " * 200), chunk('c', 0, "item " * 40)]
+    text, tokens, used, stats = make_budget().pack_context(chunks, 100)
+    assert [c['document_id'] for c in used] == ['a', 'c']
+    assert tokens == count_words(text) + 2 <= 100
+    assert stats['dropped'] == 1
+
+    # Nothing fits: the head of the best passage is sent
+    text, tokens, used, _ = make_budget().pack_context([chunk('b', 0, "term " * 200)], 50)
+    assert 0 < tokens <= 50
+    assert len(used) == 1
+
+
+def turns(count, words=10):
+    return [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"Turn {i} says " + "x " * (words - 3)}
+            for i in range(count)]
+
+
+def test_history_that_fits_is_kept_whole():
+    history = turns(5)
+    summary, messages, tokens, stats = make_budget().pack_history(history, 100)
+    assert summary is None
+    assert messages == history
+    assert tokens == 5 * (10 + MESSAGE_OVERHEAD_TOKENS)
+    assert stats['summarized'] == 0
+
+
+@pytest.mark.parametrize('count', [7, 8, 20])
+def test_older_history_is_summarized_within_budget(count):
+    history = turns(count)
+    summary, messages, tokens, stats = make_budget().pack_history(history, 100)
+    if count * (10 + MESSAGE_OVERHEAD_TOKENS) <= 100:
+        assert stats['summarized'] == 0
+    else:
+        assert stats['summarized'] > 0
+        assert messages == history[-len(messages):]
+        assert summary['content'].splitlines()[-1] == summarize_turn(history[-len(messages) - 1])
+    assert tokens <= 100
+
+
+def test_prompt_stays_within_the_total_budget():
+    budget = make_budget(max_tokens=150, context_tokens=120, history_tokens=120)
+    messages, used, accounting = budget.build("Context:\n{context}", "What is the refund window?", turns(30),
+                                              [chunk('a', i, "policy " * 30) for i in range(6)])
+    assert accounting['total'] <= 150
+    assert accounting['total'] == sum(count_words(m['content']) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    assert messages[-1] == {'role': 'user', 'content': "What is the refund window?"}
+    assert budget.stats()['requests'] == 1
@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import rag.query_cache
+from rag.query_cache import QueryEmbeddingCache, TTLLRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rag.query_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """A get_embedding_engine stand-in that records every text sent to the API"""
+    embedded = []
+    fake = SimpleNamespace(model='small', embed=lambda texts: embedded.extend(texts) or [[float(len(text))] for text in texts])
+    monkeypatch.setattr(rag.query_cache, 'get_embedding_engine', lambda: fake)
+    return embedded
+
+
+class FakeAsyncEmbeddings:
+    def __init__(self):
+        self.calls = []
+        self.release = None
+
+    async def create(self, model, input):
+        self.calls.append(list(input))
+        if self.release is not None:
+            await self.release.wait()
+        return SimpleNamespace(data=[SimpleNamespace(index=idx, embedding=[float(len(text))])
+                                     for idx, text in enumerate(input)])
+
+
+def test_entries_expire_and_least_recent_is_evicted(clock):
+    cache = TTLLRUCache(max_entries=2, ttl_seconds=10)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.stats()['evictions'] == 1
+
+    clock[0] += 11
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 1
+
+
+def test_tiers_are_filled_on_a_miss(tmp_path, engine):
+    disk_path = str(tmp_path / 'queries.sqlite3')
+    cache = QueryEmbeddingCache(disk_path=disk_path)
+    assert cache.get_embedding('What is RAG?') == [12.0]
+    assert cache.get_embedding(' What  is RAG?') == [12.0]
+    assert engine == ['What is RAG?']
+
+    # A new process finds it on disk
+    assert QueryEmbeddingCache(disk_path=disk_path).get_embedding('What is RAG?') == [12.0]
+    assert engine == ['What is RAG?']
+
+
+def test_batch_lookup_embeds_each_missing_query_once(engine):
+    cache = QueryEmbeddingCache()
+    cache.get_embedding('known')
+    assert cache.get_embeddings(['a', 'known', 'bb', 'a']) == [[1.0], [5.0], [2.0], [1.0]]
+    assert engine == ['known', 'a', 'bb']
+
+
+def test_concurrent_async_lookups_share_one_call():
+    async def scenario():
+        cache = QueryEmbeddingCache()
+        embeddings = FakeAsyncEmbeddings()
+        embeddings.release = asyncio.Event()
+        client = SimpleNamespace(embeddings=embeddings)
+
+        waiters = [asyncio.ensure_future(cache.get_embedding_async('same question', client, 'small')) for _ in range(5)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()  # one caller going away does not cancel the shared load
+        embeddings.release.set()
+        results = await asyncio.gather(*waiters[1:])
+
+        assert embeddings.calls == [['same question']]
+        assert results == [[13.0]] * 4
+        assert await cache.get_embedding_async('same question', client, 'small') == [13.0]
+        assert len(embeddings.calls) == 1
+        assert cache._inflight == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import sb.async_database_service
+import sb.database_service
+from rag.retrieval_cache import CorpusVersion, RetrievalCache, get_retrieval_cache
+from sb.async_database_service import AsyncDocumentService
+from sb.database_service import DocumentService
+
+
+def test_version_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'version.sqlite3')
+    first, second = CorpusVersion(path), CorpusVersion(path)
+    assert first.current() == second.current() == 0
+    assert first.bump() == 1
+    assert second.current() == 1
+
+
+def test_keys_normalize_queries_and_follow_the_version(tmp_path):
+    path = str(tmp_path / 'version.sqlite3')
+    cache = RetrievalCache(CorpusVersion(path))
+    key = cache.key('How do  I reset?', 5, 'small')
+    assert key == cache.key(' How do I reset? ', 5, 'small')
+    assert key != cache.key('How do I reset?', 3, 'small')
+    assert cache.keys(['How do I reset?', 'x'], 5, 'small')[0] == key
+
+    cache.put(key, [{'content': 'a'}])
+    results = cache.get(key)
+    results.append({'content': 'b'})  # callers get their own list
+    assert cache.get(key) == [{'content': 'a'}]
+
+    # Another process bumping the version makes the entry unreachable here too
+    CorpusVersion(path).bump()
+    assert cache.get(cache.key('How do I reset?', 5, 'small')) is None
+
+
+@pytest.fixture
+def counted_query_embeddings(monkeypatch):
+    calls = []
+    fake = SimpleNamespace(get_embedding=lambda text: calls.append(text) or [0.0] * 1536)
+    monkeypatch.setattr(sb.database_service, 'get_query_embedding_cache', lambda: fake)
+    return calls
+
+
+def test_corpus_changes_invalidate_search_results(stub_db, counted_query_embeddings):
+    service = DocumentService()
+    document = service.create_document({'name': 'a.txt', 'original_name': 'a.txt', 'file_path': 'uploads/a.txt',
+                                        'file_size': 1, 'file_type': 'txt', 'status': 'processed'})
+    version = get_retrieval_cache().corpus_version.current()
+    service.search_similar_chunks('what changed?')
+    service.search_similar_chunks('what  changed?')
+    assert counted_query_embeddings == ['what changed?']
+
+    service.delete_document_chunks(document['id'])
+    assert get_retrieval_cache().corpus_version.current() > version
+    service.search_similar_chunks('what changed?')
+    assert len(counted_query_embeddings) == 2
+
+
+def test_async_search_checks_the_cache_before_embedding(stub_db, monkeypatch):
+    calls = []
+
+    async def get_embedding_async(text, client):
+        calls.append(text)
+        return [0.0] * 1536
+
+    async def execute():
+        return SimpleNamespace(data=[])
+
+    fake = SimpleNamespace(get_embedding_async=get_embedding_async)
+    monkeypatch.setattr(sb.async_database_service, 'get_query_embedding_cache', lambda: fake)
+    clients = SimpleNamespace(supabase=SimpleNamespace(rpc=lambda name, params: SimpleNamespace(execute=execute)),
+                              openai=None)
+    service = AsyncDocumentService(clients)
+    get_retrieval_cache().corpus_version.bump()  # no results cached by earlier tests
+
+    assert asyncio.run(service.search_similar_chunks('what is cached?')) == []
+    assert asyncio.run(service.search_similar_chunks('what  is cached?')) == []
+    assert calls == ['what is cached?']
@@ -0,0 +1,104 @@
+import importlib
+from types import SimpleNamespace
+import pytest
+import rag.session_store
+from rag.prompt_budget import PromptBudget, summarize_turn
+from rag.session_store import SessionStore
+from sb.database_service import DocumentService
+
+chat_routes = importlib.import_module('app.routes.chat')
+
+
+def count_words(text):
+    return len(text.split())
+
+
+@pytest.fixture
+def budget():
+    return PromptBudget(max_tokens=400, context_tokens=200, history_tokens=100, summary_tokens=30, count_tokens=count_words)
+
+
+@pytest.fixture
+def store(tmp_path, budget):
+    return SessionStore(str(tmp_path / 'sessions.sqlite3'), ttl_seconds=60, max_turns=8, max_sessions=3,
+                        prompt_budget=budget)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rag.session_store.time, 'time', lambda: now[0])
+    return now
+
+
+def exchange(i):
+    return [{'role': 'user', 'content': f"Question {i} asks about " + "topic " * 8},
+            {'role': 'assistant', 'content': f"Answer {i} explains that. " + "detail " * 8}]
+
+
+def test_old_turns_fold_into_a_bounded_summary(store, budget):
+    session_id = store.create()
+    for i in range(10):
+        assert store.append(session_id, exchange(i))
+
+    session, tail = store.history(session_id)
+    assert session['turn_count'] == 20
+    assert sum(turn['tokens'] for turn in tail) <= budget.history_tokens - budget.summary_tokens
+    assert tail[-1]['content'].startswith("Answer 9")
+    assert session['summary_tokens'] <= budget.summary_tokens
+    # The newest summary line is the last turn folded out of the tail
+    folded = [msg for i in range(10) for msg in exchange(i)][:20 - len(tail)]
+    assert session['summary'].splitlines()[-1] == summarize_turn(folded[-1])
+
+    # A chat turn packs the stored state without recounting or re-summarizing
+    summary, messages, tokens, stats = budget.pack_history(tail, budget.history_tokens, session['summary'],
+                                                           session['summary_tokens'])
+    assert stats['summarized'] == 0
+    assert len(messages) == len(tail)
+    assert tokens <= budget.history_tokens
+
+
+def test_only_summarized_turns_past_the_limit_are_dropped(store):
+    session_id = store.create()
+    for i in range(10):
+        store.append(session_id, exchange(i))
+    stored = store.turns(session_id, limit=100)
+    assert len(stored) == 8
+    assert [turn['seq'] for turn in stored] == list(range(20, 12, -1))
+    assert [turn['seq'] for turn in store.turns(session_id, limit=2, before=15)] == [14, 13]
+
+
+def test_sessions_expire_and_are_pruned(store, clock):
+    first = store.create()
+    clock[0] += 30
+    others = [store.create() for _ in range(3)]
+    assert store.prune() == 1  # over max_sessions: the least recently used goes
+    assert store.get(first) is None
+    clock[0] += 61
+    assert store.get(others[0]) is None
+    assert store.append(others[0], exchange(0)) is False
+    assert store.prune() == 3
+    assert store.delete(others[1]) is False
+
+
+def test_chat_route_keeps_the_conversation(client, monkeypatch):
+    prompts = []
+
+    def create(model, messages, stream=False, stream_options=None):
+        prompts.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Reply {len(prompts)}"))])
+    openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(chat_routes, 'get_openai_client', lambda: openai)
+    monkeypatch.setattr(DocumentService, 'search_similar_chunks', lambda self, query, top_k=5: [])
+
+    first = client.post('/api/chat/chat', json={'message': 'Hello there', 'session_id': None}).get_json()
+    session_id = first['session_id']
+    client.post('/api/chat/chat', json={'message': 'And then?', 'session_id': session_id,
+                                         'chat_history': [{'role': 'user', 'content': 'ignored'}]})
+
+    assert [msg['content'] for msg in prompts[1][1:]] == ['Hello there', 'Reply 1', 'And then?']
+    session = client.get(f"/api/chat/sessions/{session_id}").get_json()
+    assert session['turn_count'] == 4
+    assert [turn['content'] for turn in session['turns']] == ['Reply 2', 'And then?', 'Reply 1', 'Hello there']
+    assert client.delete(f"/api/chat/sessions/{session_id}").status_code == 200
+    assert client.post('/api/chat/chat', json={'message': 'Hi', 'session_id': session_id}).status_code == 404
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from rag.vector_codec import (_bitwise_count, format_pgvector, hamming_scores, int8_scores, pack_vectors,
+                              quantize_binary, quantize_int8, unpack_vector)
+from rag.vector_index import VectorIndex
+
+
+@pytest.fixture
+def matrix():
+    return np.random.default_rng(0).standard_normal((50, 32)).astype(np.float32)
+
+
+def test_packed_vectors_round_trip(matrix):
+    assert all(np.array_equal(unpack_vector(packed), row) for packed, row in zip(pack_vectors(matrix), matrix))
+    halves = [unpack_vector(packed, 'float16') for packed in pack_vectors(matrix, 'float16')]
+    assert np.allclose(halves, matrix, atol=2e-3)
+    assert len(pack_vectors(matrix, 'float16')[0]) < len(pack_vectors(matrix)[0]) < len(format_pgvector(matrix[0]))
+
+
+def test_int8_scores_approximate_inner_products(matrix):
+    codes, scales = quantize_int8(matrix)
+    query = matrix[0]
+    assert np.allclose(int8_scores(codes, scales, query, block_rows=7), matrix @ query, rtol=0.05, atol=0.2)
+    zero_codes, zero_scales = quantize_int8(np.zeros((1, 4), dtype=np.float32))
+    assert zero_scales[0] == 1.0 and not zero_codes.any()
+
+
+def test_hamming_fallback_matches_bit_counts(matrix):
+    codes = quantize_binary(matrix)
+    values = np.arange(256, dtype=np.uint8)
+    assert [int(count) for count in _bitwise_count(values)] == [bin(value).count('1') for value in range(256)]
+    signs = matrix > 0
+    expected = -(signs != signs[3]).sum(axis=1)
+    assert np.array_equal(hamming_scores(codes, matrix[3]), expected)
+    assert hamming_scores(codes, matrix[3]).argmax() == 3
+
+
+@pytest.mark.parametrize('quantization', ['int8', 'binary'])
+def test_quantized_index_reranks_to_exact_results(tmp_path, quantization):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((600, 64)).astype(np.float32)
+    chunks = [{'id': str(i), 'document_id': 'doc', 'chunk_index': i, 'content': ''} for i in range(len(vectors))]
+    exact, quantized = VectorIndex(str(tmp_path / 'exact')), VectorIndex(str(tmp_path / 'q'), quantization=quantization)
+    exact.add(chunks, vectors)
+    quantized.add(chunks, vectors)
+    assert quantized._current().codes is not None
+
+    for query in vectors[:20] + 0.1 * rng.standard_normal((20, 64)).astype(np.float32):
+        found = quantized.search(query, top_k=1)
+        assert found[0]['id'] == exact.search(query, top_k=1)[0]['id']
+        assert found[0]['similarity'] == pytest.approx(exact.search(query, top_k=1)[0]['similarity'], abs=1e-5)
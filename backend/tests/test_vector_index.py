@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+import sb.database_service
+from rag.vector_index import VectorIndex
+from sb.client import get_supabase_client
+
+
+def make_chunks(count, dims=16, seed=0, document_id='doc'):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dims)).astype(np.float32)
+    chunks = [{'id': f"{document_id}-{i}", 'document_id': document_id, 'chunk_index': i, 'content': f"chunk {i}"}
+              for i in range(count)]
+    return chunks, vectors
+
+
+def brute_force(chunks, vectors, query, top_k):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    return [chunks[i]['id'] for i in np.argsort(-scores)[:top_k]]
+
+
+def test_exact_search_matches_brute_force(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    chunks, vectors = make_chunks(300)
+    index.put_document({'id': 'doc', 'name': 'a.pdf', 'file_path': 'uploads/a.pdf', 'file_type': 'pdf'})
+    index.add(chunks[:100], vectors[:100])
+    index.add(chunks[100:], vectors[100:])
+
+    query = np.random.default_rng(1).standard_normal(16)
+    found = index.search(query, top_k=5)
+    assert [row['id'] for row in found] == brute_force(chunks, vectors, query, 5)
+    assert found[0]['document_name'] == 'a.pdf'
+    assert found[0]['similarity'] >= found[-1]['similarity']
+
+
+def test_ivf_search_probing_every_list_is_exact(tmp_path, monkeypatch):
+    monkeypatch.setattr(VectorIndex, 'MIN_IVF_ROWS', 200)
+    index = VectorIndex(str(tmp_path), nlist=8, nprobe=8)
+    chunks, vectors = make_chunks(400)
+    index.add(chunks, vectors)
+    assert index.stats()['lists'] == 8
+
+    for seed in range(5):
+        query = np.random.default_rng(seed + 10).standard_normal(16)
+        assert [row['id'] for row in index.search(query, top_k=10)] == brute_force(chunks, vectors, query, 10)
+
+
+def test_deletes_upserts_and_compaction(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    chunks, vectors = make_chunks(10)
+    index.add(chunks, vectors)
+
+    index.remove_chunk_ids(['doc-0', 'doc-1'])
+    assert index.stats()['live_rows'] == 8
+    assert 'doc-0' not in [row['id'] for row in index.search(vectors[0], top_k=10)]
+
+    # Re-adding an id replaces the old copy
+    index.add([chunks[2]], [vectors[9]])
+    assert index.search(vectors[9], top_k=2)[0]['id'] in ('doc-2', 'doc-9')
+    assert len(index.search(vectors[9], top_k=10)) == 8
+
+    index.remove_chunk_ids([f"doc-{i}" for i in range(3, 8)])  # over half dead: compacted
+    stats = index.stats()
+    assert stats['rows'] == stats['live_rows'] == 3
+    assert sorted(row['id'] for row in index.search(vectors[8], top_k=10)) == ['doc-2', 'doc-8', 'doc-9']
+
+
+def test_other_instances_see_writes(tmp_path):
+    writer, reader = VectorIndex(str(tmp_path)), VectorIndex(str(tmp_path))
+    chunks, vectors = make_chunks(5)
+    assert reader.search(vectors[0]) == []
+    writer.add(chunks, vectors)
+    assert reader.search(vectors[3], top_k=1)[0]['id'] == 'doc-3'
+    writer.remove_chunks(['doc'])
+    assert reader.search(vectors[3]) == []
+
+
+def test_renumbering_follows_the_given_order(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    chunks, vectors = make_chunks(3)
+    index.add(chunks, vectors)
+    index.renumber_chunks(['doc-2', 'doc-0', 'doc-1'])
+    assert index.search(vectors[2], top_k=1)[0]['chunk_index'] == 0
+    assert index.search(vectors[1], top_k=1)[0]['chunk_index'] == 2
+
+
+def test_invalid_input_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        VectorIndex(str(tmp_path), quantization='pq')
+    index = VectorIndex(str(tmp_path))
+    index.add(*make_chunks(2, dims=16))
+    with pytest.raises(ValueError):
+        index.add(*make_chunks(2, dims=8, document_id='other'))
+
+
+@pytest.mark.parametrize('min_ivf_rows, quantization', [(4096, 'none'), (200, 'none'), (200, 'int8')])
+def test_search_many_matches_search(tmp_path, monkeypatch, min_ivf_rows, quantization):
+    monkeypatch.setattr(VectorIndex, 'MIN_IVF_ROWS', min_ivf_rows)
+    monkeypatch.setattr(VectorIndex, 'BATCH_SCORE_ELEMENTS', 400 * 4)  # a few queries per scored block
+    index = VectorIndex(str(tmp_path), nlist=8, nprobe=3, quantization=quantization, rerank=4)
+    chunks, vectors = make_chunks(400)
+    index.add(chunks, vectors)
+    index.remove_chunk_ids([f"doc-{i}" for i in range(0, 400, 7)])
+    assert index.stats()['lists'] == (8 if min_ivf_rows < 400 else 0)
+
+    queries = np.random.default_rng(3).standard_normal((12, 16))
+    batched = index.search_many(queries, top_k=8)
+    assert len(batched) == 12
+    for query, rows in zip(queries, batched):
+        single = index.search(query, top_k=8)
+        assert [row['id'] for row in rows] == [row['id'] for row in single]
+        assert [row['similarity'] for row in rows] == pytest.approx([row['similarity'] for row in single], rel=1e-5)
+
+    assert index.search_many([], top_k=8) == []
+    if min_ivf_rows > 400:
+        assert [len(rows) for rows in index.search_many(queries[:2], top_k=500)] == [342, 342]
+
+
+def test_searches_during_a_rebuild_fall_back_to_supabase(tmp_path, stub_db, monkeypatch):
+    index = VectorIndex(str(tmp_path))
+    chunks, vectors = make_chunks(5)
+    index.add(chunks, vectors)
+    index._mark_built()
+    monkeypatch.setattr(sb.database_service, 'get_vector_index', lambda: index)
+    assert len(sb.database_service.match_documents_local(vectors[0], 3)) == 3
+
+    with stub_db.lock:
+        stub_db.rows('document_chunks').extend(dict(chunk, embedding=vector.tolist()) for chunk, vector in zip(chunks, vectors))
+    during = []
+    put_documents = index._put_documents_from_supabase
+
+    def put_documents_midway(supabase):
+        during.append(sb.database_service.match_documents_local(vectors[0], 3))
+        put_documents(supabase)
+    monkeypatch.setattr(index, '_put_documents_from_supabase', put_documents_midway)
+    index.build_from_supabase(get_supabase_client())
+    assert during == [None]
+    assert index.search(vectors[0], 1)[0]['id'] == chunks[0]['id']
@@ -15,6 +15,7 @@ function ChatInterface() {
   const [inputValue, setInputValue] = useState('')
   const [isTyping, setIsTyping] = useState(false)
   const messagesEndRef = useRef(null)
+  const sessionIdRef = useRef(null)
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -46,12 +47,8 @@ function ChatInterface() {
 
     // Send message to backend RAG pipeline
     try {
-      const chatHistory = messages.map(msg => ({
-        role: msg.sender === 'user' ? 'user' : 'assistant',
-        content: msg.text
-      }))
-      
-      const response = await sendChatMessage(inputValue, chatHistory)
+      const response = await sendChatMessage(inputValue, sessionIdRef.current)
+      sessionIdRef.current = response.session_id
       
       const botResponse = {
         id: Date.now() + 1,
@@ -64,6 +61,10 @@ function ChatInterface() {
       setMessages(prev => [...prev, botResponse])
     } catch (error) {
       console.error('Chat error:', error)
+      if (error.status === 404) {
+        // Session expired on the server; the next message starts a new one
+        sessionIdRef.current = null
+      }
       const errorResponse = {
         id: Date.now() + 1,
         text: `Sorry, I encountered an error: ${error.message}. Please try again.`,
@@ -154,7 +155,11 @@ function ChatInterface() {
                                 <div key={index} className="text-xs text-gray-500 flex items-center space-x-2">
                                   <span className="w-2 h-2 bg-blue-500 rounded-full"></span>
                                   <span>{source.document_name}</span>
-                                  <span className="text-gray-400">({Math.round(source.similarity * 100)}% match)</span>
+                                  {source.similarity != null ? (
+                                    <span className="text-gray-400">({Math.round(source.similarity * 100)}% match)</span>
+                                  ) : (
+                                    <span className="text-gray-400">(keyword match)</span>
+                                  )}
                                 </div>
                               ))}
                             </div>
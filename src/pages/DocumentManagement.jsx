@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { Upload, FileText, Trash2, Search, Plus, FolderOpen, Download } from 'lucide-react'
 import * as api from '../services/api'
 
@@ -27,6 +27,8 @@ function DocumentManagement() {
   const [pendingDeleteMessage, setPendingDeleteMessage] = useState('')
   const [failedUploads, setFailedUploads] = useState([])
   const [showFailedUploadsDialog, setShowFailedUploadsDialog] = useState(false)
+  // Keyset cursor of each page reached by paging forward (page number -> cursor)
+  const pageCursors = useRef({})
 
   // Helpers
   const formatBytes = (bytes) => {
@@ -40,11 +42,13 @@ function DocumentManagement() {
   }
 
   // Load documents from backend
-  const loadDocuments = async (page = currentPage, perPage = itemsPerPage) => {
+  const loadDocuments = async (page = currentPage, perPage = itemsPerPage, resetCursors = false) => {
     try {
       setLoading(true)
       setError(null)
-      const response = await api.getDocuments(page, perPage)
+      if (resetCursors) pageCursors.current = {}
+      const response = await api.getDocuments(page, perPage, pageCursors.current[page])
+      if (response.next_cursor) pageCursors.current[page + 1] = response.next_cursor
       setDocuments(response.documents || [])
       setTotalPages(response.total_pages || 1)
       setTotalDocuments(response.total || 0)
@@ -228,8 +232,8 @@ function DocumentManagement() {
       setDeleteComplete(true)
       setTimeout(() => setDeleteComplete(false), 3000)
       
-      // Reload the document list to show updated data
-      loadDocuments(currentPage, itemsPerPage)
+      // Reload the document list to show updated data (page boundaries have moved)
+      loadDocuments(currentPage, itemsPerPage, true)
     } catch (err) {
       // Rollback optimistic update on error
       setIsDeleting(false)
@@ -450,6 +454,7 @@ function DocumentManagement() {
   }
 
   const handleItemsPerPageChange = (newItemsPerPage) => {
+    pageCursors.current = {} // Cursors belong to the old page size
     setItemsPerPage(newItemsPerPage)
     setCurrentPage(1) // Reset to first page
     setSelectedDocuments([]) // Clear selection
@@ -27,7 +27,9 @@ apiClient.interceptors.response.use(
     if (error.response) {
       // Server responded with error status
       const errorMessage = error.response.data?.error || `Request failed with status ${error.response.status}`
-      throw new Error(errorMessage)
+      const serverError = new Error(errorMessage)
+      serverError.status = error.response.status
+      throw serverError
     } else if (error.request) {
       // Request was made but no response received
       throw new Error('Network error - no response from server')
@@ -53,12 +55,13 @@ export const uploadFile = async (file, onUploadProgress) => {
   return response.data
 }
 
-// Get documents with pagination
-export const getDocuments = async (page = 1, perPage = 5) => {
+// Get documents with pagination; cursor is the next_cursor of the previous page (faster than page offsets)
+export const getDocuments = async (page = 1, perPage = 5, cursor = null) => {
   const response = await apiClient.get('/api/document/list', {
     params: {
       page,
-      per_page: perPage
+      per_page: perPage,
+      cursor
     }
   })
   return response.data
@@ -92,11 +95,11 @@ export const downloadDocument = async (documentId) => {
   return response.data
 }
 
-// Chat with RAG
-export const sendChatMessage = async (message, chatHistory = []) => {
+// Chat with RAG; the server keeps the history of session_id (null starts a new session)
+export const sendChatMessage = async (message, sessionId = null) => {
   const response = await apiClient.post('/api/chat/chat', {
     message,
-    chat_history: chatHistory
+    session_id: sessionId
   })
   return response.data
 }